@@ -0,0 +1,224 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+import enum
+import threading
+from typing import Protocol, cast
+
+from langchain_core.messages import HumanMessage
+from loguru import logger
+
+from src.backend.agent import DEADLINE_EXCEEDED_ANSWER, AgentState
+from src.backend.request_context import CancellationToken, remaining_seconds, request_deadline
+from src.utils.logger import sampled
+
+BUSY_ANSWER = "Sorry, I'm answering too many questions right now. Please try again in a moment."
+
+_SHED_LOG_SAMPLE_RATE = 0.1
+""" requests are shed in bursts, log only some of them, shed_count has the exact number """
+
+
+class AdmittedAgent(Protocol):
+    """Agent answering the admitted requests, e.g. PremierLeagueAgent or WorkerSession"""
+
+    async def answer_from_cache(self, user_query: str, session_id: str | None = None) -> str | None: ...
+
+    async def send_message(self, user_message: HumanMessage, deadline_seconds: float | None = None,
+                           cancellation: CancellationToken | None = None,
+                           session_id: str | None = None) -> tuple[str, AgentState]: ...
+
+
+class AdmissionLevel(enum.StrEnum):
+    """How a request was handled by the AdmissionController"""
+    ADMITTED = "admitted"
+    """ answered by the agent, possibly after waiting in the queue """
+    CACHED = "cached"
+    """ the service was overloaded, answered from the cache without the model """
+    SHED = "shed"
+    """ the service was overloaded and the answer wasn't cached, rejected with BUSY_ANSWER """
+
+
+@dataclass(frozen=True)
+class AdmissionStats:
+    """ snapshot of the AdmissionController counters, for monitoring """
+    in_flight: int
+    queue_depth: int
+    admitted_count: int
+    cached_count: int
+    shed_count: int
+    max_queue_depth: int
+    """ the deepest the queue has been """
+
+
+class _Waiter:
+    """Request waiting in the queue, it's granted a slot from the thread of the request which finished"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.granted = self.loop.create_future()
+
+
+class AdmissionController:
+    """Admission control in front of PremierLeagueAgent.send_message, shared by all sessions of the process.
+    At most max_in_flight requests are answered by the agents at once, the others wait in a bounded queue.
+    The queue is served round-robin by user, so a user sending many messages doesn't delay the other users.
+    When the queue is deeper than degrade_queue_depth the questions answered by agent.answer_from_cache skip it,
+    and when it's full or the user has too many queued messages the rest is rejected right away with BUSY_ANSWER.
+    It's safe to share between threads and event loops (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, max_in_flight: int = 16, max_queued: int = 64, max_queued_per_user: int = 2,
+                 degrade_queue_depth: int | None = None):
+        """
+        Args:
+            max_in_flight: maximum number of requests answered by the agents at once
+            max_queued: maximum number of requests waiting for the agents
+            max_queued_per_user: maximum number of requests of a single user waiting for the agents
+            degrade_queue_depth: queue depth from which the cached answers skip the queue, by default half of max_queued
+        """
+        self._max_in_flight = max_in_flight
+        self._max_queued = max_queued
+        self._max_queued_per_user = max_queued_per_user
+        self._degrade_queue_depth = max_queued // 2 if degrade_queue_depth is None else degrade_queue_depth
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queues: dict[str, deque[_Waiter]] = {}
+        """ waiting requests per user, the dict order is the round-robin order of the users """
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._counts = {level: 0 for level in AdmissionLevel}
+
+    def stats(self) -> AdmissionStats:
+        with self._lock:
+            return AdmissionStats(in_flight=self._in_flight, queue_depth=self._queue_depth,
+                                  admitted_count=self._counts[AdmissionLevel.ADMITTED],
+                                  cached_count=self._counts[AdmissionLevel.CACHED],
+                                  shed_count=self._counts[AdmissionLevel.SHED],
+                                  max_queue_depth=self._max_queue_depth)
+
+    async def send_message(self, agent: AdmittedAgent, user_id: str, user_message: HumanMessage,
+                           deadline_seconds: float | None = None,
+                           cancellation: CancellationToken | None = None,
+                           session_id: str | None = None) -> tuple[str, AgentState]:
+        """Send the message to the agent if the service isn't overloaded, see PremierLeagueAgent.send_message
+
+        Args:
+            agent: agent of the conversation
+            user_id: user sending the message, the queue is fair between the users
+            user_message: user message
+            deadline_seconds: time limit of the whole request including the time spent in the queue
+            cancellation: token which cancels the request
+            session_id: conversation to continue, see PremierLeagueAgent.send_message
+
+        Returns:
+            tuple[str, AgentState]: answer and agent state, BUSY_ANSWER if the request was shed
+        """
+        user_query = cast(str, user_message.content)
+        with request_deadline(deadline_seconds):
+            admitted, waiter = self._try_admit(user_id, self._degrade_queue_depth)
+            if not admitted and waiter is None:
+                if answer := await agent.answer_from_cache(user_query, session_id):
+                    self._count(AdmissionLevel.CACHED)
+                    return answer, AgentState(user_query=user_query, answer=answer, valid=True, success=True)
+                admitted, waiter = self._try_admit(user_id, self._max_queued)
+            if not admitted and waiter is None:
+                self._count(AdmissionLevel.SHED)
+                sampled(_SHED_LOG_SAMPLE_RATE).warning('request of {} shed, {}', user_id, self.stats())
+                return BUSY_ANSWER, AgentState(user_query=user_query, answer=BUSY_ANSWER)
+
+            if waiter is not None and not await self._wait(user_id, waiter):
+                logger.warning('request deadline of {}s exceeded in the admission queue', deadline_seconds)
+                return DEADLINE_EXCEEDED_ANSWER, AgentState(user_query=user_query, answer=DEADLINE_EXCEEDED_ANSWER)
+            self._count(AdmissionLevel.ADMITTED)
+            try:
+                return await agent.send_message(user_message, cancellation=cancellation, session_id=session_id)
+            finally:
+                self._release()
+
+    def _try_admit(self, user_id: str, max_queue_depth: int) -> tuple[bool, _Waiter | None]:
+        """Take a free slot or join the queue if it's not deeper than max_queue_depth
+
+        Returns:
+            tuple[bool, _Waiter | None]: True if a slot was taken, the waiter if the request joined the queue,
+                (False, None) if the service is overloaded
+        """
+        with self._lock:
+            if self._in_flight < self._max_in_flight and self._queue_depth == 0:
+                self._in_flight += 1
+                return True, None
+            queue = self._queues.get(user_id)
+            if self._queue_depth >= max_queue_depth or (queue and len(queue) >= self._max_queued_per_user):
+                return False, None
+            waiter = _Waiter()
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            return False, waiter
+
+    async def _wait(self, user_id: str, waiter: _Waiter) -> bool:
+        """Wait for a slot until the request deadline
+
+        Returns:
+            bool: True if the slot was granted, False if the deadline passed first
+        """
+        try:
+            async with asyncio.timeout(remaining_seconds()):
+                await waiter.granted
+            return True
+        except (TimeoutError, asyncio.CancelledError):
+            with self._lock:
+                queue = self._queues.get(user_id)
+                if queue is not None and waiter in queue:
+                    self._remove(user_id, waiter)
+                    granted = False
+                else:
+                    # the slot was granted in the meantime
+                    granted = True
+            if granted:
+                self._release()
+            current_task = asyncio.current_task()
+            if current_task and current_task.cancelling():
+                raise
+            return False
+
+    def _release(self) -> None:
+        """Pass the slot to the first waiting request of the next user or free it"""
+        with self._lock:
+            if not self._queues:
+                self._in_flight -= 1
+                return
+            user_id = next(iter(self._queues))
+            waiter = self._queues[user_id][0]
+            self._remove(user_id, waiter)
+            if self._queues.get(user_id):
+                # the user goes to the end of the round
+                self._queues[user_id] = self._queues.pop(user_id)
+        waiter.loop.call_soon_threadsafe(_grant, waiter)
+
+    def _remove(self, user_id: str, waiter: _Waiter) -> None:
+        queue = self._queues[user_id]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[user_id]
+        self._queue_depth -= 1
+
+    def _count(self, level: AdmissionLevel) -> None:
+        with self._lock:
+            self._counts[level] += 1
+
+
+def _grant(waiter: _Waiter) -> None:
+    if not waiter.granted.done():
+        waiter.granted.set_result(None)
+
+
+_shared_admission_controller: AdmissionController | None = None
+
+
+def get_shared_admission_controller(max_in_flight: int = 16, max_queued: int = 64,
+                                    max_queued_per_user: int = 2) -> AdmissionController:
+    """Return the admission controller shared by all sessions of the process, the limits are set by the first call"""
+    global _shared_admission_controller
+    if _shared_admission_controller is None:
+        _shared_admission_controller = AdmissionController(max_in_flight, max_queued, max_queued_per_user)
+    return _shared_admission_controller
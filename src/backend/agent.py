@@ -1,4 +1,8 @@
-from dataclasses import dataclass
+import asyncio
+from collections.abc import AsyncIterator, Iterable, Sequence
+from dataclasses import dataclass, field, replace
+from datetime import date
+import enum
 from random import randint
 from typing import cast
 from langchain_core.runnables.config import RunnableConfig
@@ -6,149 +10,550 @@ from langgraph.types import Command
 from loguru import logger
 
 from langgraph.graph import StateGraph, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import HumanMessage
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_openai import ChatOpenAI
 
-from src.backend.prompts.formulate_answer import build_formulate_answer_prompt
-from src.backend.prompts.clarify_team_name import CLARIFY_TEAM_NAME_PROMPT
+from src.backend.answer_store import AnswerStore, match_template, render_template_answer
+from src.backend.prompts.formulate_answer import build_formulate_answer_prompt, render_squad_markdown
+from src.backend.prompts.clarify_team_name import CLARIFY_TEAM_NAME_PROMPT, build_clarification_request
 from src.backend.prompts.interpret_user_clarification import INTERPRET_USER_CLARIFICATION_PROMPT
 from src.backend.premier_league_api.base import IPremierLeagueApi
-from src.backend.squad import Squad
+from src.backend.premier_league_api.exceptions import APIError, TeamNotFound
+from src.backend.league_table import LeagueTable, parse_league_question
+from src.backend.query_classifier import QueryDecision, QueryPreClassifier
+from src.backend.request_context import CancellationToken, check_deadline, remaining_seconds, request_deadline
+from src.backend.rate_limiter import AdaptiveRateLimiter, Priority, background_traffic, get_shared_rate_limiter
+from src.backend.squad_cache import SquadCache
+from src.backend.team_matcher import TeamMatcher
+from src.configuration import NodeModelConfig
 
 
 # TODO find a better way to handle Nones or add checking everywhere
 # TODO consider using UpdateCommands instead of returning AgentState
 @dataclass(kw_only=True)
 class AgentState:
-    """ Agent state """
-    user_query: HumanMessage # TODO use plain string to avoid multiple casting
+    """ Agent state, it's saved by the checkpointer after every node so keep it small """
+    user_query: str
     team_name: str | None = None
-    squad: Squad | None = None
+    squad_version: int | None = None
+    """ version of the team squad in the squad cache, the squad itself is resolved from the cache """
     answer: str | None = None
     clarification_request: str | None = None
+    clarification_candidates: list[str] = field(default_factory=list)
+    """ team names offered in the clarification request, in the presented order """
     clarification_response: str | None = None
     team_found: bool = False
     valid: bool = False
     success: bool = False
     """ set to True if the team was found and the answer was formulated """
+    last_team_name: str | None = None
+    """ team of the last answered question in the conversation, used by follow-up questions """
+    last_squad_version: int | None = None
+    """ None if the last answer was materialized, the squad is fetched by a follow-up """
+    league_question: bool = False
+    """ set by Route for league-wide questions, e.g. "Which clubs have the most goalkeepers?" """
 
 
-# TODO Replace hardcoded Nodes and Edges names and messages with constants/enums
+class AgentNode(enum.StrEnum):
+    """ Names of the graph nodes """
+    ROUTE = "Route"
+    """ serves materialized answers and sends follow-up questions straight to FormulateResponse """
+    VALIDATE = "Validate"
+    EXTRACT_TEAM = "ExtractTeam"
+    CLARIFY = "Clarify"
+    USER_CLARIFY = "UserClarify"
+    GET_SQUAD = "GetSquad"
+    FORMULATE_RESPONSE = "FormulateResponse"
+    JOIN = "Join"
+    """ joins the parallel branches of GraphTopology.PARALLEL """
+    LEAGUE_STATS = "LeagueStats"
+    """ answers league-wide questions from the LeagueTable without the model """
+
+
+_NODE_PRIORITIES = {AgentNode.FORMULATE_RESPONSE: Priority.HIGH}
+""" priority of the model calls, other nodes use Priority.NORMAL """
+
+
+class GraphTopology(enum.StrEnum):
+    """ Shape of the agent graph """
+    SEQUENTIAL = "sequential"
+    """ Validate -> ExtractTeam -> GetSquad -> FormulateResponse """
+    PARALLEL = "parallel"
+    """ Validate runs in parallel with ExtractTeam, which speculatively fetches the squad,
+    both branches are joined before FormulateResponse """
+
+
+@dataclass(frozen=True)
+class BatchAnswer:
+    """ Answer to a single query of the batch """
+    query: str
+    answer: str
+    success: bool
+
+
+INVALID_QUERY_ANSWER = "I cannot help you with that. Please ask a question regarding Premier League teams."
+TEAM_NOT_FOUND_ANSWER = "Sorry, I could not find the team you were asking about."
+API_ERROR_ANSWER = "Sorry, I cannot connect to the API. Please try again later."
+DEADLINE_EXCEEDED_ANSWER = "Sorry, it took too long to answer your question. Please try again."
+CANCELLED_ANSWER = "The question was cancelled."
+
+_DEFAULT_BATCH_CONCURRENCY = 8
+""" maximum number of concurrent LLM calls made by answer_batch """
+_CHARS_PER_TOKEN = 4
+_ESTIMATED_COMPLETION_TOKENS = 256
+
+
+# TODO Replace hardcoded Edges names and messages with constants/enums
 # TODO consider creating Nodes class and moving prompts to this classes
 class PremierLeagueAgent:
     """A class which implements a logic of responding to user queries about Premier League teams squads."""
     
-    def __init__(self, model_name: str, squad_api: IPremierLeagueApi):
+    def __init__(self, model_name: str, squad_api: IPremierLeagueApi, model: BaseChatModel | None = None,
+                 rate_limiter: AdaptiveRateLimiter | None = None,
+                 topology: GraphTopology = GraphTopology.SEQUENTIAL,
+                 node_models: dict[str, NodeModelConfig] | None = None,
+                 answer_store: AnswerStore | None = None,
+                 checkpointer: BaseCheckpointSaver | None = None,
+                 squad_cache: SquadCache | None = None):
         """ Initialize the agent with a model name and a squad API 
         To better understand the flow of the agent check the /docs folder. Especialy the graph.png file.
         
         Args:
-            model_name: name of the OpenAI model to use
+            model_name: name of the OpenAI model used by nodes without their own model settings
             squad_api: squad API to use
+            model: chat model used by all nodes instead of the OpenAI models, e.g. a fake model in tests
+            rate_limiter: limiter of the model calls, by default the limiter shared by all agents of the process
+            topology: shape of the graph, PARALLEL fetches the squad while the query is still being validated
+            node_models: model settings per node name, e.g. a small model for Validate
+            answer_store: materialized answers of the most common questions, served without the model
+            checkpointer: store of the conversations, by default in memory of the process,
+                a SharedCheckpointSaver lets many worker processes continue the same conversations
+            squad_cache: cache of the squads fetched from squad_api, e.g. a SharedSquadCache of the workers
         """
-        self._model = ChatOpenAI(model=model_name, temperature=0.1)
+        self._node_models = node_models or {}
+        self._models = self._create_models(model_name, model)
+        self._rate_limiter = rate_limiter or get_shared_rate_limiter()
         self._squad_api = squad_api
+        self._squad_cache = squad_cache or SquadCache(squad_api)
+        self._query_classifier = QueryPreClassifier(squad_api.get_teams())
+        self._team_matcher = TeamMatcher(squad_api.get_teams())
+        self._answer_store = answer_store
+        self._squad_markdowns: dict[str, tuple[int, str]] = {}
+        """ rendered squads, team name -> (squad version, markdown) """
+        self._league_table: tuple[tuple[int, ...], LeagueTable] | None = None
+        """ (squad versions of all teams, table built from them) """
         self._config: RunnableConfig = {"configurable": {"thread_id": str(randint(0, 1000))}} 
         graph = StateGraph(AgentState)
-        memory = MemorySaver()
+        memory = checkpointer or MemorySaver()
         
         # Nodes:
-        graph.add_node("Validate", self._validate_query)
-        graph.add_node("ExtractTeam", self._extract_team)
-        graph.add_node("Clarify", self._ask_for_clarification)
-        graph.add_node("UserClarify", self._handle_user_clarification)
-        graph.add_node("GetSquad", self._search_squad)
-        graph.add_node("FormulateResponse", self._formulate_response)
-        graph.set_entry_point("Validate")
+        graph.add_node(AgentNode.ROUTE, self._route_query)
+        graph.add_node(AgentNode.CLARIFY, self._ask_for_clarification)
+        graph.add_node(AgentNode.USER_CLARIFY, self._handle_user_clarification)
+        graph.add_node(AgentNode.GET_SQUAD, self._search_squad)
+        graph.add_node(AgentNode.FORMULATE_RESPONSE, self._formulate_response)
+        graph.add_node(AgentNode.LEAGUE_STATS, self._answer_league_question)
         
         # Edges:
         # TODO refactor to make it cleaner
-        graph.add_conditional_edges("Validate", 
-            lambda state: "valid" if state.valid else "invalid",
-            {
-                "valid": "ExtractTeam",
-                "invalid": END
-            })
+        if topology == GraphTopology.PARALLEL:
+            new_query_nodes = self._add_parallel_entry(graph)
+        else:
+            new_query_nodes = self._add_sequential_entry(graph)
         
-        graph.add_conditional_edges("ExtractTeam", 
-            lambda state: "team_found" if state.team_found else "not_found",
-            {
-                "team_found": "GetSquad",
-                "not_found": "Clarify"
-            })
+        graph.set_entry_point(AgentNode.ROUTE)
+        def route(state: AgentState) -> Sequence[str]:
+            if state.answer:
+                return [END]
+            if state.league_question:
+                return [AgentNode.LEAGUE_STATS]
+            if state.team_found:
+                return [AgentNode.FORMULATE_RESPONSE] if state.squad_version is not None else [AgentNode.GET_SQUAD]
+            return new_query_nodes
+        
+        graph.add_conditional_edges(AgentNode.ROUTE, route,
+            [END, AgentNode.LEAGUE_STATS, AgentNode.FORMULATE_RESPONSE, AgentNode.GET_SQUAD, *new_query_nodes])
+        graph.add_edge(AgentNode.LEAGUE_STATS, END)
         
-        graph.add_edge("Clarify", "UserClarify") 
+        graph.add_edge(AgentNode.CLARIFY, AgentNode.USER_CLARIFY) 
         
-        graph.add_conditional_edges("UserClarify", 
+        graph.add_conditional_edges(AgentNode.USER_CLARIFY, 
             lambda state: "team_found" if state.team_found else "unknown",
             {
-                "team_found": "GetSquad",
+                "team_found": AgentNode.GET_SQUAD,
                 "unknown": END
             }
         )
         
-        graph.add_edge("GetSquad", "FormulateResponse")
-        graph.set_finish_point("FormulateResponse")
+        graph.add_edge(AgentNode.GET_SQUAD, AgentNode.FORMULATE_RESPONSE)
+        graph.set_finish_point(AgentNode.FORMULATE_RESPONSE)
         
-        self._graph = graph.compile(checkpointer=memory, interrupt_before=['UserClarify'])
+        self._graph = graph.compile(checkpointer=memory, interrupt_before=[AgentNode.USER_CLARIFY])
        
-    async def send_message(self, user_message: HumanMessage) -> tuple[str, AgentState]:
+    def _add_sequential_entry(self, graph: StateGraph) -> list[AgentNode]:
+        """Validate -> ExtractTeam -> GetSquad or Clarify
+        
+        Returns:
+            list[AgentNode]: nodes which start handling of a new query
+        """
+        graph.add_node(AgentNode.VALIDATE, self._validate_query)
+        graph.add_node(AgentNode.EXTRACT_TEAM, self._extract_team)
+        
+        graph.add_conditional_edges(AgentNode.VALIDATE, 
+            lambda state: "valid" if state.valid else "invalid",
+            {
+                "valid": AgentNode.EXTRACT_TEAM,
+                "invalid": END
+            })
+        
+        graph.add_conditional_edges(AgentNode.EXTRACT_TEAM, 
+            lambda state: "team_found" if state.team_found else "not_found",
+            {
+                "team_found": AgentNode.GET_SQUAD,
+                "not_found": AgentNode.CLARIFY
+            })
+        return [AgentNode.VALIDATE]
+
+    def _add_parallel_entry(self, graph: StateGraph) -> list[AgentNode]:
+        """Validate || ExtractTeam (with squad prefetch) -> Join -> FormulateResponse, GetSquad or Clarify
+        
+        Returns:
+            list[AgentNode]: nodes which start handling of a new query
+        """
+        graph.add_node(AgentNode.VALIDATE, self._validate_branch)
+        graph.add_node(AgentNode.EXTRACT_TEAM, self._extract_team_and_prefetch)
+        graph.add_node(AgentNode.JOIN, self._join_branches)
+        graph.add_edge([AgentNode.VALIDATE, AgentNode.EXTRACT_TEAM], AgentNode.JOIN)
+        
+        def route(state: AgentState) -> str:
+            if not state.valid:
+                return "invalid"
+            if not state.team_found:
+                return "not_found"
+            return "prefetched" if state.squad_version is not None else "team_found"
+        
+        graph.add_conditional_edges(AgentNode.JOIN, route,
+            {
+                "prefetched": AgentNode.FORMULATE_RESPONSE,
+                "team_found": AgentNode.GET_SQUAD,
+                "not_found": AgentNode.CLARIFY,
+                "invalid": END
+            })
+        return [AgentNode.VALIDATE, AgentNode.EXTRACT_TEAM]
+
+    async def send_message(self, user_message: HumanMessage,
+                           deadline_seconds: float | None = None,
+                           cancellation: CancellationToken | None = None,
+                           session_id: str | None = None) -> tuple[str, AgentState]:
         """
         Send a message to the agent and return the agent response.
         The response can be either final answer or clarification request.
+        A request which exceeds the deadline or is cancelled stops all its model and API calls right away,
+        the conversation continues from the last completed node, e.g. a pending clarification stays pending.
         
         Args:
             user_message: user message
+            deadline_seconds: time limit of the whole request, None means no limit
+            cancellation: token which cancels the request, e.g. when the user sends a new message
+            session_id: conversation to continue, None means the conversation of this agent,
+                the messages of one conversation have to be sent one at a time
         
         Returns:
             tuple[str, AgentState]: final answer or clarification request and agent state, 
                 the agent state is used only during evaluation
         """
-        logger.debug(f'user_message: {user_message}')
+        config = self._session_config(session_id)
+        with request_deadline(deadline_seconds):
+            # the request runs in its own task so the token cancels only the request, not the caller
+            task = asyncio.ensure_future(self._handle_message(user_message, config))
+            if cancellation:
+                cancellation.bind(task)
+            try:
+                async with asyncio.timeout(remaining_seconds()):
+                    return await task
+            except TimeoutError:
+                logger.warning('request deadline of {}s exceeded', deadline_seconds)
+                return DEADLINE_EXCEEDED_ANSWER, await self._finish_interrupted_run(DEADLINE_EXCEEDED_ANSWER, config)
+            except asyncio.CancelledError:
+                current_task = asyncio.current_task()
+                if not cancellation or not cancellation.cancelled or (current_task and current_task.cancelling()):
+                    raise
+                logger.debug('request cancelled')
+                return CANCELLED_ANSWER, await self._finish_interrupted_run(CANCELLED_ANSWER, config)
+
+    def _session_config(self, session_id: str | None) -> RunnableConfig:
+        if session_id is None:
+            return self._config
+        return {"configurable": {"thread_id": session_id}}
+
+    async def _finish_interrupted_run(self, answer: str, config: RunnableConfig) -> AgentState:
+        """Leave the checkpoint of a timed out or cancelled run in a consistent state.
+        A run stopped in the middle of the graph is finished with the answer, so the next message
+        starts a new query instead of resuming the stopped nodes. A pending clarification stays pending.
+        
+        Returns:
+            AgentState: state of the conversation after the stopped run
+        """
+        snapshot = await self._graph.aget_state(config)
+        if snapshot.next and AgentNode.USER_CLARIFY not in snapshot.next:
+            await self._graph.aupdate_state(config, {"answer": answer, "clarification_request": None},
+                                            as_node=AgentNode.FORMULATE_RESPONSE)
+            snapshot = await self._graph.aget_state(config)
+        return replace(AgentState(**snapshot.values), answer=answer)
+
+    async def _handle_message(self, user_message: HumanMessage, config: RunnableConfig) -> tuple[str, AgentState]:
+        logger.debug('user_message: {}', user_message)
         
         # Handle the clarification Flow - TODO consider extracting to a separate method
-        graph_states = self._graph.get_state(self._config).values
+        graph_states = (await self._graph.aget_state(config)).values
         clarification_needed = not graph_states.get('answer', None) and graph_states.get("clarification_request", None)
-        logger.debug(f'clarification_needed: {clarification_needed}')
+        logger.debug('clarification_needed: {}', clarification_needed)
         
         if clarification_needed:
-            self._graph.update_state(self._config, {"clarification_response": user_message.content})
-            result = await self._graph.ainvoke(Command(resume=user_message.content), config=self._config)
+            await self._graph.aupdate_state(config, {"clarification_response": user_message.content})
+            result = await self._graph.ainvoke(Command(resume=user_message.content), config=config)
             result = AgentState(**result)
-            logger.debug(f'answer: {result.answer}')
+            logger.debug('answer: {}', result.answer)
             return cast(str, result.answer), result
         
         # Handle the normal Flow
-        result = await self._invoke(user_message)
-        logger.debug(f'result: {result}')
+        result = await self._invoke(cast(str, user_message.content), config)
+        logger.debug('result: {}', result)
         if result.clarification_request:
             return result.clarification_request, result
         
-        logger.debug(f'answer: {result.answer}')
+        logger.debug('answer: {}', result.answer)
         return cast(str, result.answer), result
 
+    async def answer_from_cache(self, user_query: str, session_id: str | None = None) -> str | None:
+        """Answer the query only from the materialized answers and the squads which are already cached,
+        without any model or API call, e.g. when the service is overloaded.
+        The team of the answer becomes the context of the follow-up questions of the conversation,
+        as if the agent answered it. A pending clarification is never answered from the cache.
+        
+        Args:
+            user_query: user query
+            session_id: conversation of the query, see send_message
+        
+        Returns:
+            str | None: answer, None if the query needs the model or a squad which isn't cached
+        """
+        teams = self._squad_api.get_teams()
+        if question := parse_league_question(user_query, teams):
+            league_table = self._get_cached_league_table()
+            return league_table.answer(question, date.today()) if league_table else None
+        if materialized := self._get_materialized_answer(user_query):
+            (team_name, answer), version = materialized, None
+        else:
+            match = match_template(user_query, teams)
+            cached = self._squad_cache.peek(match[1]) if match else None
+            if match is None or cached is None:
+                return None
+            team_name, version, answer = match[1], cached[0], render_template_answer(match[0], cached[1])
+
+        config = self._session_config(session_id)
+        snapshot = await self._graph.aget_state(config)
+        if snapshot.next:
+            # the message answers the clarification or the previous run was stopped, it needs the graph
+            return None
+        await self._graph.aupdate_state(config, {"user_query": user_query, "answer": answer, "team_name": team_name,
+                                                 "squad_version": version, "clarification_request": None,
+                                                 "last_team_name": team_name, "last_squad_version": version},
+                                        as_node=AgentNode.FORMULATE_RESPONSE)
+        return answer
+
+    async def answer_batch(self, queries: Iterable[str], 
+                           max_concurrency: int = _DEFAULT_BATCH_CONCURRENCY) -> AsyncIterator[BatchAnswer]:
+        """
+        Answer many independent queries at once, the answers are yielded as soon as they are ready.
+        Identical queries are answered once, each squad is fetched and rendered once per batch 
+        and the LLM calls run concurrently. Queries which would need clarification are answered 
+        with TEAM_NOT_FOUND_ANSWER, the batch doesn't touch the conversation state.
+        
+        Args:
+            queries: user queries, duplicates are answered once
+            max_concurrency: maximum number of concurrent LLM calls
+        
+        Yields:
+            BatchAnswer: answer for every unique query, in order of completion
+        """
+        unique_queries = list(dict.fromkeys(query.strip() for query in queries))
+        logger.info('answering batch of {} unique queries', len(unique_queries))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        squad_markdowns: dict[str, asyncio.Task[str]] = {}
+        
+        async def answer(query: str) -> BatchAnswer:
+            # batch is a background traffic, interactive sessions are served first
+            with background_traffic():
+                return await answer_query(query)
+        
+        async def answer_query(query: str) -> BatchAnswer:
+            state = AgentState(user_query=query)
+            if parse_league_question(query, self._squad_api.get_teams()):
+                state = await self._answer_league_question(state)
+                return BatchAnswer(query=query, answer=cast(str, state.answer), success=state.success)
+            if materialized := self._get_materialized_answer(query):
+                return BatchAnswer(query=query, answer=materialized[1], success=True)
+            
+            async with semaphore:
+                state = await self._validate_query(state)
+            if not state.valid:
+                return BatchAnswer(query=query, answer=cast(str, state.answer), success=False)
+            
+            async with semaphore:
+                state = await self._extract_team(state)
+            if not state.team_found:
+                return BatchAnswer(query=query, answer=TEAM_NOT_FOUND_ANSWER, success=False)
+            
+            team_name = cast(str, state.team_name)
+            if team_name not in squad_markdowns:
+                squad_markdowns[team_name] = asyncio.create_task(self._get_squad_markdown(team_name))
+            try:
+                squad_markdown = await squad_markdowns[team_name]
+            except TeamNotFound:
+                return BatchAnswer(query=query, answer=TEAM_NOT_FOUND_ANSWER, success=False)
+            except APIError:
+                return BatchAnswer(query=query, answer=API_ERROR_ANSWER, success=False)
+            
+            async with semaphore:
+                prompt = build_formulate_answer_prompt(squad_markdown, query)
+                response = await self._call_model(prompt, AgentNode.FORMULATE_RESPONSE)
+            return BatchAnswer(query=query, answer=cast(str, response.content), success=True)
+        
+        tasks = [asyncio.create_task(answer(query)) for query in unique_queries]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # the caller can stop consuming the answers early
+            for task in [*tasks, *squad_markdowns.values()]:
+                task.cancel()
+
     def save_graph_as_image(self, name: str = "graph.png"):
         """Save graph as image """
         bytes = self._graph.get_graph(xray=True).draw_mermaid_png()
         with open(name, "wb") as f:
             f.write(bytes)
     
-    async def _invoke(self, user_query: HumanMessage) -> AgentState:
+    async def _invoke(self, user_query: str, config: RunnableConfig) -> AgentState:
         """Invoke the agent with a user query
 
         Args:
             user_query: user query which should be about Premier League team squad
+            config: config of the conversation
         
         Returns:
             AgentState: agent state
         """
-        logger.debug(f'user_query: {user_query}')
-        result = await self._graph.ainvoke(AgentState(user_query=user_query), config=self._config)
+        logger.debug('user_query: {}', user_query)
+        # the conversation context survives between the queries, the rest of the state is reset
+        previous_state = (await self._graph.aget_state(config)).values
+        state = AgentState(
+            user_query=user_query,
+            last_team_name=previous_state.get("last_team_name"),
+            last_squad_version=previous_state.get("last_squad_version"),
+        )
+        result = await self._graph.ainvoke(state, config=config)
         return AgentState(**result)
       
-    def _validate_query(self, state: AgentState) -> AgentState:
+    def _create_models(self, model_name: str, model: BaseChatModel | None) -> dict[AgentNode, BaseChatModel]:
+        """Create a model client for every node, nodes with the same settings share the client"""
+        models: dict[AgentNode, BaseChatModel] = {}
+        clients: dict[tuple, BaseChatModel] = {}
+        for node in AgentNode:
+            if model:
+                models[node] = model
+                continue
+            settings = self._node_models.get(node, NodeModelConfig())
+            key = (settings.MODEL_NAME or model_name, settings.MAX_TOKENS, settings.TIMEOUT_SECONDS)
+            if key not in clients:
+                # retries of 429 responses are handled by the rate limiter
+                clients[key] = ChatOpenAI(model=key[0], temperature=0.1, max_retries=0, 
+                                          max_completion_tokens=key[1], timeout=key[2])
+            models[node] = clients[key]
+        return models
+
+    async def _call_model(self, prompt: str, node: AgentNode) -> BaseMessage:
+        """Call the model of the node through the shared rate limiter"""
+        settings = self._node_models.get(node, NodeModelConfig())
+        completion_tokens = settings.MAX_TOKENS or _ESTIMATED_COMPLETION_TOKENS
+        estimated_tokens = len(prompt) // _CHARS_PER_TOKEN + completion_tokens
+        
+        async def call() -> BaseMessage:
+            # waiting for the rate limiter could use up the rest of the request deadline
+            check_deadline()
+            return await self._models[node].ainvoke(prompt)
+        
+        return await self._rate_limiter.call(
+            call,
+            estimated_tokens=estimated_tokens,
+            priority=_NODE_PRIORITIES.get(node, Priority.NORMAL),
+            usage=lambda response: (getattr(response, "usage_metadata", None) or {}).get("total_tokens"),
+        )
+
+    async def _get_squad_markdown(self, team_name: str, version: int | None = None) -> str:
+        """Return the rendered squad of the team, the squad is rendered once per squad version"""
+        version, squad = await self._squad_cache.resolve(team_name, version)
+        cached = self._squad_markdowns.get(team_name)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        squad_markdown = render_squad_markdown(squad)
+        self._squad_markdowns[team_name] = (version, squad_markdown)
+        return squad_markdown
+      
+    def _route_query(self, state: AgentState) -> AgentState:
+        """It detects follow-up questions about the previously discussed team, e.g. "And who are their defenders?".
+        A follow-up is answered straight from the cached squad, without validation, team extraction and squad fetch.
+        League-wide questions, e.g. "Which clubs have the most goalkeepers?", are sent to LeagueStats.
+        
+        Args:
+            state: agent state
+        
+        Returns:
+            AgentState: agent state with the previous team set as found if the query is a follow-up
+        """
+        if parse_league_question(state.user_query, self._squad_api.get_teams()):
+            logger.debug('league-wide question')
+            state.league_question = True
+            state.valid = True
+        elif answer := self._get_materialized_answer(state.user_query):
+            team_name, state.answer = answer
+            logger.debug('materialized answer about {}', team_name)
+            state.team_name = team_name
+            state.valid = state.team_found = state.success = True
+            state.last_team_name = team_name
+            state.last_squad_version = None
+        elif state.last_team_name and self._query_classifier.is_follow_up(state.user_query):
+            logger.debug('follow-up question about {}', state.last_team_name)
+            state.team_name = state.last_team_name
+            state.squad_version = state.last_squad_version
+            state.team_found = True
+            state.valid = True
+        return state
+
+    def _get_materialized_answer(self, query: str) -> tuple[str, str] | None:
+        """Return the team name and the materialized answer if the query matches an answer template.
+        The answers are served only if the API serves the squads they were rendered from,
+        an API which doesn't track the squads version (None) can't prove it, e.g. a live API."""
+        if self._answer_store is None:
+            return None
+        squads_version = self._squad_api.get_squads_version()
+        if squads_version is None or self._answer_store.version != squads_version:
+            return None
+        match = match_template(query, self._squad_api.get_teams())
+        if match is None:
+            return None
+        template, team_name = match
+        answer = self._answer_store.get(team_name, template)
+        return (team_name, answer) if answer else None
+
+    async def _validate_query(self, state: AgentState) -> AgentState:
         """It validates if the user query is about a Premier League team squad.
+        Clear cases are decided by the local pre-classifier, the model is asked only about the rest.
         
         Args:
             state: agent state
@@ -156,23 +561,30 @@ class PremierLeagueAgent:
         Returns:
             AgentState: agent state with valid flag
         """
-        query = state.user_query.content
-        teams = self._squad_api.get_teams()
-        VALIDATE_PROMPT_TEMPALTE = """
-            Having a list of teams: {teams}
-            Determine if user is asking about a Premier League team squad.
-            User Query: {query}
-            Answer only YES or NO.
-        """
-        prompt = VALIDATE_PROMPT_TEMPALTE.format(teams=teams, query=query)
-        response = self._model.invoke(prompt)
-        logger.debug(f'response: {response.content}')
+        query = state.user_query
+        decision = self._query_classifier.classify(query)
+        logger.debug('pre-classifier decision: {}', decision)
+        
+        if decision == QueryDecision.UNSURE:
+            teams = self._squad_api.get_teams()
+            VALIDATE_PROMPT_TEMPALTE = """
+                Having a list of teams: {teams}
+                Determine if user is asking about a Premier League team squad.
+                User Query: {query}
+                Answer only YES or NO.
+            """
+            prompt = VALIDATE_PROMPT_TEMPALTE.format(teams=teams, query=query)
+            response = await self._call_model(prompt, AgentNode.VALIDATE)
+            logger.debug('response: {}', response.content)
+            is_valid = "yes" in cast(str, response.content).lower()
+        else:
+            is_valid = decision == QueryDecision.RELEVANT
         
-        if "yes" in cast(str, response.content).lower():
+        if is_valid:
             state.valid = True
         else:
             state.valid = False
-            state.answer = "I cannot help you with that. Please ask a question regarding Premier League teams."
+            state.answer = INVALID_QUERY_ANSWER
         return state
 
     async def _extract_team(self, state: AgentState) -> AgentState:
@@ -185,28 +597,66 @@ class PremierLeagueAgent:
         Returns:
             AgentState: agent state with extracted team name and team found flag
         """
-        query = state.user_query.content
+        query = state.user_query
         
         # TODO imrpove using team list and better prompt
         system_prompt = """
         Extract the team names from user query if any.
         Just output the team name, no extra words.
         """
-        response = self._model.invoke(f"{system_prompt}\nUser Query: {query}")
+        response = await self._call_model(f"{system_prompt}\nUser Query: {query}", AgentNode.EXTRACT_TEAM)
         
         team_name = cast(str, response.content).strip().lower()
-        logger.debug(f'team_name: {team_name}')
+        logger.debug('team_name: {}', team_name)
 
         is_found = team_name in self._squad_api.get_teams()
-        logger.debug(f'is_found: {is_found}')
+        logger.debug('is_found: {}', is_found)
         
         state.team_name = team_name
         state.team_found = is_found
         return state
 
-    def _ask_for_clarification(self, state: AgentState) -> AgentState:
+    async def _validate_branch(self, state: AgentState) -> dict:
+        """Validate node of the parallel graph, it updates only its own fields 
+        because ExtractTeam updates the state at the same time"""
+        state = await self._validate_query(replace(state))
+        return {"valid": state.valid, "answer": state.answer}
+
+    async def _extract_team_and_prefetch(self, state: AgentState) -> dict:
+        """ExtractTeam node of the parallel graph.
+        It extracts the team and speculatively fetches its squad before the query is validated.
+        
+        Args:
+            state: agent state
+        
+        Returns:
+            dict: update of the team fields of the agent state
+        """
+        if self._query_classifier.classify(state.user_query) == QueryDecision.IRRELEVANT:
+            # Validate will reject it without calling the model, don't waste the extraction call
+            return {"team_found": False}
+        
+        state = await self._extract_team(replace(state))
+        update = {"team_name": state.team_name, "team_found": state.team_found}
+        if state.team_found:
+            try:
+                version, _ = await self._squad_cache.get(cast(str, state.team_name))
+                update["squad_version"] = version
+            except (TeamNotFound, APIError) as e:
+                # GetSquad will fetch the squad again and report the error if the query is valid
+                logger.warning('speculative squad fetch failed: {}', e)
+        return update
+
+    def _join_branches(self, state: AgentState) -> dict:
+        """Join the Validate and ExtractTeam branches, the speculative work is discarded if the query is invalid"""
+        if state.valid:
+            return {}
+        return {"team_name": None, "team_found": False, "squad_version": None}
+
+    async def _ask_for_clarification(self, state: AgentState) -> AgentState:
         """If the team is not found, it asks for clarification.
         It tries guess the most likely team name from the user query.
+        The candidates are matched locally, the model is asked only if nothing similar was found.
         
         Args:
             state: agent state
@@ -214,15 +664,24 @@ class PremierLeagueAgent:
         Returns:
             AgentState: agent state with clarification request
         """
+        candidates = self._team_matcher.rank_candidates(state.user_query)
+        logger.debug('clarification candidates: {}', candidates)
+        if candidates:
+            state.clarification_candidates = [candidate.team_name for candidate in candidates]
+            state.clarification_request = build_clarification_request(state.clarification_candidates)
+            return state
+        
         clubs = self._squad_api.get_teams()
-        prompt = CLARIFY_TEAM_NAME_PROMPT.format(clubs=clubs, user_prompt=state.user_query.content)
-        response = self._model.invoke(prompt)
+        prompt = CLARIFY_TEAM_NAME_PROMPT.format(clubs=clubs, user_prompt=state.user_query)
+        response = await self._call_model(prompt, AgentNode.CLARIFY)
         state.clarification_request = cast(str, response.content)
         return state
     
-    def _handle_user_clarification(self, state: AgentState) -> AgentState:
+    async def _handle_user_clarification(self, state: AgentState) -> AgentState:
         """It handles the user clarification.
         Based on the clarification request and the clarification response it tries to guess the most likely team name.
+        Common responses (confirmation, candidate number, club name) are resolved locally, 
+        the model is asked only about the rest.
         If the team is not found, it save the answer and finish the flow.
         
         Args:
@@ -231,16 +690,25 @@ class PremierLeagueAgent:
         Returns:
             AgentState: agent state with clarification request
         """
-        prompt = INTERPRET_USER_CLARIFICATION_PROMPT.format(
-            clarification_request=state.clarification_request,
-            clarification_response=state.clarification_response
-        )
-        response = self._model.invoke(prompt)
-        state.team_name = cast(str, response.content).strip().lower()
+        clarification_response = state.clarification_response or ""
+        team_name = self._team_matcher.resolve_clarification(clarification_response, state.clarification_candidates)
+        logger.debug('locally resolved team: {}', team_name)
+        
+        if team_name:
+            state.team_name = team_name
+        elif self._team_matcher.is_rejection(clarification_response):
+            state.team_name = None
+        else:
+            prompt = INTERPRET_USER_CLARIFICATION_PROMPT.format(
+                clarification_request=state.clarification_request,
+                clarification_response=clarification_response
+            )
+            response = await self._call_model(prompt, AgentNode.USER_CLARIFY)
+            state.team_name = cast(str, response.content).strip().lower()
         state.team_found = state.team_name in self._squad_api.get_teams()
         
         if not state.team_found:
-            state.answer = "Sorry, I could not find the team you were asking about."
+            state.answer = TEAM_NOT_FOUND_ANSWER
             state.success = False
             return state
         
@@ -250,19 +718,63 @@ class PremierLeagueAgent:
         if not state.team_name:
             raise ValueError('Something went wrong. The team name should be set in this node.')
         
-        squad = await self._squad_api.get_team_squad(state.team_name)
-        logger.trace(f'squad: {squad}')
-        state.squad = squad
+        version, squad = await self._squad_cache.get(state.team_name)
+        logger.trace('squad: {}', squad)
+        state.squad_version = version
         return state
     
+    async def _answer_league_question(self, state: AgentState) -> AgentState:
+        """It answers a league-wide question with vectorized aggregates over all squads, without the model.
+        
+        Args:
+            state: agent state
+        
+        Returns:
+            AgentState: agent state with the answer
+        """
+        question = parse_league_question(state.user_query, self._squad_api.get_teams())
+        if question is None:
+            raise ValueError('Something went wrong. The question should be a league-wide question.')
+        
+        try:
+            league_table = await self._get_league_table()
+        except APIError:
+            state.answer = API_ERROR_ANSWER
+            return state
+        state.answer = league_table.answer(question, date.today())
+        state.success = True
+        return state
+    
+    async def _get_league_table(self) -> LeagueTable:
+        """Return the table of all squads, it's rebuilt only when any squad version changes"""
+        entries = await asyncio.gather(*(self._squad_cache.get(team) for team in self._squad_api.get_teams()))
+        versions = tuple(version for version, _ in entries)
+        if self._league_table is None or self._league_table[0] != versions:
+            self._league_table = (versions, LeagueTable(squad for _, squad in entries))
+            logger.debug('league table built from {} squads', len(entries))
+        return self._league_table[1]
+    
+    def _get_cached_league_table(self) -> LeagueTable | None:
+        """Return the table of all squads if it was built from the squads which are cached now"""
+        if self._league_table is None:
+            return None
+        entries = [self._squad_cache.peek(team) for team in self._squad_api.get_teams()]
+        if any(entry is None for entry in entries):
+            return None
+        versions = tuple(entry[0] for entry in entries if entry)
+        return self._league_table[1] if versions == self._league_table[0] else None
+    
     # TODO stream the response
-    def _formulate_response(self, state: AgentState) -> AgentState:
-        if not state.squad:
+    async def _formulate_response(self, state: AgentState) -> AgentState:
+        if not state.team_name or state.squad_version is None:
             raise ValueError('Something went wrong. The squad should be set in this node.')
         
-        prompt = build_formulate_answer_prompt(state.squad, cast(str, state.user_query.content))
-        response = self._model.invoke(prompt)
+        squad_markdown = await self._get_squad_markdown(state.team_name, state.squad_version)
+        prompt = build_formulate_answer_prompt(squad_markdown, state.user_query)
+        response = await self._call_model(prompt, AgentNode.FORMULATE_RESPONSE)
         
         state.answer = cast(str, response.content)
         state.success = True
+        state.last_team_name = state.team_name
+        state.last_squad_version = state.squad_version
         return state
\ No newline at end of file
@@ -0,0 +1,209 @@
+from datetime import date
+import enum
+import json
+from pathlib import Path
+
+from loguru import logger
+
+from src.backend.premier_league_api.base import IPremierLeagueApi
+from src.backend.squad import ALL_PLAYER_GROUPS, Player, PlayersGroup, Squad
+from src.backend.squad_sync import write_json_atomically
+from src.backend.teams import TEAM_ALIASES, find_team_mentions, normalize_text
+
+
+class AnswerTemplate(enum.StrEnum):
+    """ The most common questions, their answers depend only on the squad """
+    SQUAD = "squad"
+    GOALKEEPERS = "goalkeepers"
+    DEFENDERS = "defenders"
+    MIDFIELDERS = "midfielders"
+    FORWARDS = "forwards"
+    MANAGER = "manager"
+    YOUNGEST = "youngest"
+    OLDEST = "oldest"
+    PLAYER_COUNT = "player_count"
+
+
+_TEMPLATE_GROUPS = {
+    AnswerTemplate.GOALKEEPERS: PlayersGroup.Goalkeepers,
+    AnswerTemplate.DEFENDERS: PlayersGroup.Defenders,
+    AnswerTemplate.MIDFIELDERS: PlayersGroup.Midfielders,
+    AnswerTemplate.FORWARDS: PlayersGroup.Forwards,
+}
+_TEMPLATE_TERMS = {
+    AnswerTemplate.GOALKEEPERS: {"goalkeeper", "goalkeepers", "keeper", "keepers", "goalies"},
+    AnswerTemplate.DEFENDERS: {"defender", "defenders", "defence", "defense"},
+    AnswerTemplate.MIDFIELDERS: {"midfielder", "midfielders", "midfield"},
+    AnswerTemplate.FORWARDS: {"forward", "forwards", "attackers"},
+    AnswerTemplate.MANAGER: {"manager", "coach", "boss"},
+    AnswerTemplate.YOUNGEST: {"youngest"},
+    AnswerTemplate.OLDEST: {"oldest"},
+    AnswerTemplate.PLAYER_COUNT: {"many", "number", "count"},
+}
+_SQUAD_TERMS = {"squad", "players", "player", "roster", "lineup", "members", "team",
+                "skład", "sklad", "squadra", "rosa", "plantilla", "kader", "effectif", "elenco", "склад"}
+_FILLER_WORDS = {
+    "what", "who", "whos", "which", "is", "are", "was", "the", "of", "for", "in", "at", "on", "s", "a", "an",
+    "list", "show", "me", "give", "tell", "please", "all", "current", "currently", "senior", "club", "fc",
+    "men", "mens", "does", "do", "have", "has", "there", "how", "their", "its", "playing", "play", "plays",
+    "can", "you", "i", "know", "want", "to", "see", "full", "whole", "entire", "season", "now",
+    "could", "would", "d", "like", "provide", "first", "side", "football", "soccer", "jaki", "jest",
+}
+""" words which don't change the meaning of a template question """
+
+
+def match_template(query: str, teams: list[str]) -> tuple[AnswerTemplate, str] | None:
+    """Match a question to one of the answer templates.
+    The match is conservative, every word of the question has to be a team name, a template word
+    or a filler word, so e.g. "Who are the defenders of Arsenal born after 2000?" is not matched.
+
+    Example:
+        "Who are the defenders of Arsenal?" -> (AnswerTemplate.DEFENDERS, "arsenal")
+
+    Args:
+        query: user query
+        teams: team names, lowercase with spaces
+
+    Returns:
+        tuple[AnswerTemplate, str] | None: template and team name, None if the question doesn't match
+    """
+    mentioned = find_team_mentions(query, teams)
+    if len(mentioned) != 1:
+        return None
+    team = mentioned[0]
+    team_tokens = set(team.split())
+    team_tokens |= {token for alias, alias_team in TEAM_ALIASES.items() if alias_team == team for token in alias.split()}
+    words = {token for token in normalize_text(query).split()} - team_tokens - _FILLER_WORDS
+
+    templates = {template for template, terms in _TEMPLATE_TERMS.items() if words & terms}
+    known_words = _SQUAD_TERMS.union(*(_TEMPLATE_TERMS[template] for template in templates))
+    if not words or words - known_words or len(templates) > 1:
+        return None
+    template = templates.pop() if templates else AnswerTemplate.SQUAD
+    return template, team
+
+
+def render_template_answer(template: AnswerTemplate, squad: Squad) -> str:
+    """Render the answer of a template question from the squad
+
+    Args:
+        template: answer template
+        squad: squad of the team
+
+    Returns:
+        str: answer in markdown
+    """
+    team = squad.name.title()
+    groups = squad.get_player_group()
+    players = [player for player in squad.players if player not in groups.get(PlayersGroup.Manager, [])]
+
+    if template == AnswerTemplate.SQUAD:
+        lines = [f"**{team} squad**"]
+        for group in ALL_PLAYER_GROUPS:
+            if group in groups:
+                lines += ["", f"{group}:"] + [_render_player(player) for player in groups[group]]
+        return "\n".join(lines)
+
+    if template in _TEMPLATE_GROUPS:
+        group = _TEMPLATE_GROUPS[template]
+        if group not in groups:
+            return f"I don't have information about {group.lower()} of {team}."
+        return "\n".join([f"**{team} {group.lower()}**", ""] + [_render_player(player) for player in groups[group]])
+
+    if template == AnswerTemplate.MANAGER:
+        managers = groups.get(PlayersGroup.Manager)
+        if not managers:
+            return f"I don't have information about the manager of {team}."
+        return f"The manager of {team} is {' and '.join(manager.name for manager in managers)}."
+
+    if template in (AnswerTemplate.YOUNGEST, AnswerTemplate.OLDEST):
+        born = [player for player in players if player.date_of_birth]
+        if not born:
+            return f"I don't have information about dates of birth of {team} players."
+        pick = max if template == AnswerTemplate.YOUNGEST else min
+        player = pick(born, key=lambda player: player.date_of_birth or date.min)
+        return (f"The {template} player of {team} is {player.name} ({player.position}), "
+                f"born on {player.date_of_birth}.")
+
+    counts = ", ".join(f"{len(groups[group])} {group.lower()}" for group in ALL_PLAYER_GROUPS
+                       if group in groups and group != PlayersGroup.Manager)
+    return f"{team} has {len(players)} players in the senior squad: {counts}."
+
+
+def _render_player(player: Player) -> str:
+    born = player.date_of_birth or "date of birth unknown"
+    return f"- {player.name} ({born}) - {player.position}"
+
+
+class AnswerStore:
+    """Store of materialized answers keyed by team and template.
+    It's optionally backed by a JSON file, which is reloaded when the materialization job replaces it,
+    so the agents of all processes serve the same answers.
+    """
+
+    def __init__(self, path: Path | None = None):
+        """
+        Args:
+            path: JSON file of the store, None keeps the answers only in memory
+        """
+        self._path = path
+        self._version: int | None = None
+        self._answers: dict[str, str] = {}
+        self._modified_at: int | None = None
+        self._reload_if_changed()
+
+    @property
+    def version(self) -> int | None:
+        """ squads version the answers were rendered from, None if the store is empty """
+        self._reload_if_changed()
+        return self._version
+
+    def get(self, team_name: str, template: AnswerTemplate) -> str | None:
+        """Return the materialized answer, None if it's not materialized"""
+        self._reload_if_changed()
+        return self._answers.get(self._key(team_name, template))
+
+    def replace(self, version: int, answers: dict[tuple[str, AnswerTemplate], str]) -> None:
+        """Replace all answers at once, the file is replaced atomically"""
+        self._version = version
+        self._answers = {self._key(team, template): answer for (team, template), answer in answers.items()}
+        if self._path:
+            write_json_atomically(self._path, {"version": version, "answers": self._answers})
+            self._modified_at = self._path.stat().st_mtime_ns
+
+    def _reload_if_changed(self) -> None:
+        if not self._path or not self._path.exists():
+            return
+        modified_at = self._path.stat().st_mtime_ns
+        if modified_at == self._modified_at:
+            return
+        data = json.loads(self._path.read_text(encoding="utf-8"))
+        self._version, self._answers, self._modified_at = data["version"], data["answers"], modified_at
+        logger.debug('answer store reloaded, version: {}', self._version)
+
+    @staticmethod
+    def _key(team_name: str, template: AnswerTemplate) -> str:
+        return f"{team_name}/{template}"
+
+
+async def materialize_answers(squad_api: IPremierLeagueApi, store: AnswerStore, version: int) -> bool:
+    """Render the answers of all templates for every team, only if the squads version changed
+
+    Args:
+        squad_api: source of the squads
+        store: store of the answers
+        version: current squads version, e.g. read_squads_version() of the synced squads file
+
+    Returns:
+        bool: True if the answers were rendered again
+    """
+    if store.version == version:
+        return False
+    answers = {}
+    for team in squad_api.get_teams():
+        squad = await squad_api.get_team_squad(team)
+        for template in AnswerTemplate:
+            answers[(team, template)] = render_template_answer(template, squad)
+    store.replace(version, answers)
+    logger.info('materialized {} answers for squads version {}', len(answers), version)
+    return True
@@ -0,0 +1,208 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date
+import enum
+
+import numpy as np
+
+from src.backend.squad import ALL_PLAYER_GROUPS, POSITION_TO_PLAYER_GROUP, PlayersGroup, Squad
+from src.backend.teams import find_team_mentions, normalize_text
+
+_UNKNOWN_DAY = -1
+""" day number of unknown dates of birth """
+_DAYS_PER_YEAR = 365.2425
+_AGE_BINS = (0, 21, 24, 27, 30, 33, 100)
+_AGE_BIN_LABELS = ("under 21", "21-23", "24-26", "27-29", "30-32", "33 and older")
+_DEFAULT_LIMIT = 5
+
+_LEAGUE_CUES = {"league", "clubs", "teams", "across", "each", "every", "per", "epl", "premier"}
+""" a question without any team mention and with one of them is about the whole league """
+_LEAGUE_PHRASES = {("which", "club"), ("which", "team"), ("what", "club"), ("what", "team")}
+""" "the team" or "their club" refer to the previous team, only these phrases ask about all of them """
+_GROUP_TERMS = {
+    PlayersGroup.Goalkeepers: {"goalkeeper", "goalkeepers", "keeper", "keepers", "goalies"},
+    PlayersGroup.Defenders: {"defender", "defenders", "defence", "defense"},
+    PlayersGroup.Midfielders: {"midfielder", "midfielders", "midfield"},
+    PlayersGroup.Forwards: {"forward", "forwards", "striker", "strikers", "winger", "wingers", "attackers"},
+    PlayersGroup.Manager: {"manager", "managers", "coach", "coaches"},
+}
+_DISTRIBUTION_TERMS = {"distribution", "histogram", "spread", "breakdown"}
+_AVERAGE_TERMS = {"average", "mean", "avg"}
+_SQUAD_AGE_TERMS = {"squad", "squads", "team", "teams", "club", "clubs", "side", "sides"}
+_COUNT_TERMS = {"most", "fewest", "least", "many", "number", "count"}
+_AGE_TERMS = {"age", "ages", "youngest", "oldest"}
+_PLAYER_TERMS = {"player", "players", "squad", "squads"}
+_FILLER_WORDS = {
+    "what", "who", "whos", "which", "is", "are", "the", "of", "in", "at", "for", "on", "by", "s", "a", "an",
+    "has", "have", "does", "do", "there", "how", "me", "show", "list", "give", "tell", "please", "all", "club", "team",
+}
+""" words which don't change the meaning of a league question """
+_KNOWN_WORDS = (_LEAGUE_CUES | _DISTRIBUTION_TERMS | _AVERAGE_TERMS | _SQUAD_AGE_TERMS | _COUNT_TERMS
+                | _AGE_TERMS | _PLAYER_TERMS | _FILLER_WORDS).union(*_GROUP_TERMS.values())
+_GROUP_SUBJECTS = {group: group.value.lower() for group in PlayersGroup} | {PlayersGroup.Manager: "managers"}
+
+
+class LeagueMetric(enum.StrEnum):
+    AVERAGE_AGE = "average_age"
+    """ average age per club """
+    PLAYER_COUNT = "player_count"
+    """ number of players per club """
+    AGE_DISTRIBUTION = "age_distribution"
+    """ league-wide histogram of ages """
+    YOUNGEST = "youngest"
+    """ youngest players of the league """
+    OLDEST = "oldest"
+
+
+@dataclass(frozen=True)
+class LeagueQuestion:
+    metric: LeagueMetric
+    group: PlayersGroup | None = None
+    """ None means all players without managers """
+    ascending: bool = False
+    """ order of the clubs, e.g. the youngest squads or the fewest goalkeepers first """
+
+
+def parse_league_question(query: str, teams: list[str]) -> LeagueQuestion | None:
+    """Recognize league-wide questions which are answered from the LeagueTable
+
+    Example:
+        "Which clubs have the most goalkeepers?" -> LeagueQuestion(PLAYER_COUNT, Goalkeepers)
+        "Average squad age per club" -> LeagueQuestion(AVERAGE_AGE)
+
+    Args:
+        query: user query
+        teams: team names, questions mentioning a team are not league-wide
+
+    Returns:
+        LeagueQuestion | None: None if the question is not a league-wide question
+    """
+    words = normalize_text(query).split()
+    tokens = set(words)
+    has_league_cue = bool(tokens & _LEAGUE_CUES) or any(pair in _LEAGUE_PHRASES for pair in zip(words, words[1:]))
+    if not has_league_cue or find_team_mentions(query, teams):
+        return None
+    # the match is conservative like match_template, a qualifier or another entity, e.g. "born after 2000",
+    # "English players" or "Serie A", changes the question and it's left to the model
+    if tokens - _KNOWN_WORDS:
+        return None
+    group = next((group for group, terms in _GROUP_TERMS.items() if tokens & terms), None)
+
+    if tokens & _DISTRIBUTION_TERMS and tokens & {"age", "ages"}:
+        return LeagueQuestion(LeagueMetric.AGE_DISTRIBUTION, group)
+    is_youngest, is_oldest = "youngest" in tokens, "oldest" in tokens
+    # "the youngest squad" is about the average age, "the youngest player" about a single player
+    is_squad_age = (is_youngest or is_oldest) and tokens & _SQUAD_AGE_TERMS and "player" not in tokens
+    if tokens & _AVERAGE_TERMS or is_squad_age:
+        return LeagueQuestion(LeagueMetric.AVERAGE_AGE, group, ascending=is_youngest)
+    if is_youngest:
+        return LeagueQuestion(LeagueMetric.YOUNGEST, group)
+    if is_oldest:
+        return LeagueQuestion(LeagueMetric.OLDEST, group)
+    if tokens & _COUNT_TERMS and (group or tokens & {"players", "player", "squad", "squads"}):
+        return LeagueQuestion(LeagueMetric.PLAYER_COUNT, group, ascending=bool(tokens & {"fewest", "least"}))
+    return None
+
+
+class LeagueTable:
+    """Columnar table of all players of the league.
+    Dates of birth are stored as day numbers and positions as codes of the player groups,
+    so the league-wide aggregates are computed with vectorized NumPy operations.
+    """
+
+    def __init__(self, squads: Iterable[Squad]):
+        """
+        Args:
+            squads: squads of the league clubs
+        """
+        self.teams: list[str] = []
+        team_codes, names, birth_days, group_codes = [], [], [], []
+        group_index = {group: code for code, group in enumerate(ALL_PLAYER_GROUPS)}
+        for team_code, squad in enumerate(squads):
+            self.teams.append(squad.name)
+            for player in squad.players:
+                team_codes.append(team_code)
+                names.append(player.name)
+                birth_days.append(player.date_of_birth.toordinal() if player.date_of_birth else _UNKNOWN_DAY)
+                group_codes.append(group_index[POSITION_TO_PLAYER_GROUP.get(player.position, PlayersGroup.Others)])
+
+        self.team_codes = np.array(team_codes, dtype=np.int16)
+        self.names = np.array(names, dtype=object)
+        self.birth_days = np.array(birth_days, dtype=np.int32)
+        self.group_codes = np.array(group_codes, dtype=np.int8)
+
+    def ages(self, today: date, group: PlayersGroup | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Ages in years of the players with known dates of birth
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: team codes and ages of the players
+        """
+        mask = self._group_mask(group) & (self.birth_days != _UNKNOWN_DAY)
+        return self.team_codes[mask], (today.toordinal() - self.birth_days[mask]) / _DAYS_PER_YEAR
+
+    def average_age(self, today: date, group: PlayersGroup | None = None) -> dict[str, float]:
+        """Average age per club, clubs without players of the group are skipped"""
+        team_codes, ages = self.ages(today, group)
+        counts = np.bincount(team_codes, minlength=len(self.teams))
+        sums = np.bincount(team_codes, weights=ages, minlength=len(self.teams))
+        return {self.teams[code]: float(sums[code] / counts[code]) for code in np.flatnonzero(counts)}
+
+    def player_count(self, group: PlayersGroup | None = None) -> dict[str, int]:
+        """Number of players per club"""
+        counts = np.bincount(self.team_codes[self._group_mask(group)], minlength=len(self.teams))
+        return {team: int(count) for team, count in zip(self.teams, counts)}
+
+    def age_distribution(self, today: date, group: PlayersGroup | None = None) -> dict[str, int]:
+        """Number of players of the league per age bin"""
+        _, ages = self.ages(today, group)
+        counts, _ = np.histogram(ages, bins=_AGE_BINS)
+        return dict(zip(_AGE_BIN_LABELS, (int(count) for count in counts)))
+
+    def extreme_ages(self, today: date, group: PlayersGroup | None = None, youngest: bool = True,
+                     limit: int = _DEFAULT_LIMIT) -> list[tuple[str, str, float]]:
+        """The youngest or the oldest players of the league
+
+        Returns:
+            list[tuple[str, str, float]]: player name, team name and age
+        """
+        mask = self._group_mask(group) & (self.birth_days != _UNKNOWN_DAY)
+        indices = np.flatnonzero(mask)
+        order = np.argsort(self.birth_days[indices], kind="stable")
+        selected = indices[order[::-1][:limit] if youngest else order[:limit]]
+        today_day = today.toordinal()
+        return [(str(self.names[i]), self.teams[self.team_codes[i]],
+                 (today_day - int(self.birth_days[i])) / _DAYS_PER_YEAR)
+                for i in selected]
+
+    def answer(self, question: LeagueQuestion, today: date) -> str:
+        """Render the answer to a league-wide question as markdown"""
+        subject = "players" if question.group is None else _GROUP_SUBJECTS[question.group]
+        if question.metric == LeagueMetric.AVERAGE_AGE:
+            values = self.average_age(today, question.group)
+            rows = sorted(values.items(), key=lambda item: item[1], reverse=not question.ascending)
+            return _render_table(f"Average age of {subject} per club", ("Club", "Average age"),
+                                 [(team.title(), f"{age:.1f}") for team, age in rows])
+        if question.metric == LeagueMetric.PLAYER_COUNT:
+            counts = self.player_count(question.group)
+            rows = sorted(counts.items(), key=lambda item: item[1], reverse=not question.ascending)
+            return _render_table(f"Number of {subject} per club", ("Club", "Count"),
+                                 [(team.title(), str(count)) for team, count in rows])
+        if question.metric == LeagueMetric.AGE_DISTRIBUTION:
+            distribution = self.age_distribution(today, question.group)
+            return _render_table(f"Age distribution of {subject} in the league", ("Age", "Count"),
+                                 [(label, str(count)) for label, count in distribution.items()])
+        youngest = question.metric == LeagueMetric.YOUNGEST
+        players = self.extreme_ages(today, question.group, youngest=youngest)
+        return _render_table(f"The {question.metric.value} {subject} in the league", ("Player", "Club", "Age"),
+                             [(name, team.title(), f"{age:.1f}") for name, team, age in players])
+
+    def _group_mask(self, group: PlayersGroup | None) -> np.ndarray:
+        if group is None:
+            return self.group_codes != ALL_PLAYER_GROUPS.index(PlayersGroup.Manager)
+        return self.group_codes == ALL_PLAYER_GROUPS.index(group)
+
+
+def _render_table(title: str, header: tuple[str, ...], rows: list[tuple[str, ...]]) -> str:
+    lines = [f"**{title}**", "", f"| {' | '.join(header)} |", f"|{'---|' * len(header)}"]
+    lines += [f"| {' | '.join(row)} |" for row in rows]
+    return "\n".join(lines)
@@ -26,3 +26,11 @@ class IPremierLeagueApi(ABC):
             Squad: Squad of the team
         """
         pass
+
+    def get_squads_version(self) -> int | None:
+        """ Returns version of the squads, it changes when any squad changes
+        
+        Returns:
+            int | None: squads version, None if the API doesn't track it, e.g. a live API
+        """
+        return None
@@ -0,0 +1,36 @@
+from typing import NotRequired, TypedDict
+
+from pydantic import TypeAdapter, ValidationError
+
+from src.backend.premier_league_api.exceptions import APIError
+from src.backend.squad import Player, Squad
+
+
+class _SquadResponse(TypedDict):
+    """TheSportsDB list/players response, only the players are read"""
+    list: NotRequired[list[Player] | None]
+
+
+_SQUAD_RESPONSE = TypeAdapter(_SquadResponse)
+
+
+def decode_squad(team_name: str, content: bytes) -> Squad:
+    """Decode TheSportsDB list/players response into a Squad.
+    The JSON is validated straight into the Player models by pydantic-core, the other fields of the players
+    (descriptions, images, social media...) are skipped without creating Python objects for them.
+    The squad is built without revalidating the players.
+
+    Args:
+        team_name: Name of the team, lowercase with spaces
+        content: raw response body
+
+    Returns:
+        Squad: Squad of the team, without players if the response doesn't contain them
+    Raises:
+        APIError: If the response is not a valid squad response
+    """
+    try:
+        response = _SQUAD_RESPONSE.validate_json(content)
+    except ValidationError as error:
+        raise APIError(f"Invalid squad response for team {team_name}: {error}") from error
+    return Squad.model_construct(name=team_name, players=response.get("list") or [])
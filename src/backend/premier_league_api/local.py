@@ -1,14 +1,18 @@
-from datetime import date
 import json
+from pathlib import Path
+from typing import cast
 
 from loguru import logger
 
 from src.backend.premier_league_api.base import IPremierLeagueApi
 from src.backend.premier_league_api.exceptions import TeamNotFound
 from src.backend.squad import Player, Squad
+from src.backend.squad_sync import read_squads_version, state_path_for
 
 class LocalPremierLeagueApi(IPremierLeagueApi):
-    """Local Premier League API that loads squads from a cached JSON file."""
+    """Local Premier League API that loads squads from a cached JSON file.
+    The file is loaded again when SquadSync writes a new squads version.
+    """
 
     def __init__(self, json_path: str):
         """Load squads from a JSON file.
@@ -18,8 +22,16 @@ class LocalPremierLeagueApi(IPremierLeagueApi):
         """
 
         self._json_path = json_path
-        with open(json_path, "r", encoding="utf-8") as fp:
-            self._data: dict[str, list[dict]] = json.load(fp)
+        self._state_path = state_path_for(Path(json_path))
+        self._state_modified_at: int | None = -1
+        """ -1 loads the squads on the first call, None means the file was never synced """
+        self._version: int | None = None
+        self._reload_if_synced()
+
+    def get_squads_version(self) -> int:
+        """Return the squads version of the last sync, 0 if the file was never synced."""
+        self._reload_if_synced()
+        return cast(int, self._version)
 
     def get_teams(self) -> list[str]:
         """Return list of available Premier League team names."""
@@ -35,6 +47,7 @@ class LocalPremierLeagueApi(IPremierLeagueApi):
         Raises:
             TeamNotFound: If the team is not present in the JSON file.
         """
+        self._reload_if_synced()
         players_raw = self._data.get(team_name)
         if players_raw is None:
             msg = f"Team {team_name} not found in local data"
@@ -44,9 +57,26 @@ class LocalPremierLeagueApi(IPremierLeagueApi):
         players = [
             Player(
                 name=p["name"],
-                date_of_birth=date.fromisoformat(p["date_of_birth"]),
+                date_of_birth=p.get("date_of_birth"),
                 position=p["position"],
             )
             for p in players_raw
         ]
-        return Squad(name=team_name, players=players)
\ No newline at end of file
+        return Squad(name=team_name, players=players)
+
+    def _load(self) -> None:
+        with open(self._json_path, "r", encoding="utf-8") as fp:
+            self._data: dict[str, list[dict]] = json.load(fp)
+
+    def _reload_if_synced(self) -> None:
+        # the sync state is written after the squads file on every sync, the squads are reloaded only on a new version
+        modified_at = self._state_path.stat().st_mtime_ns if self._state_path.exists() else None
+        if modified_at == self._state_modified_at:
+            return
+        self._state_modified_at = modified_at
+        version = read_squads_version(Path(self._json_path))
+        if version != self._version:
+            self._load()
+            if self._version is not None:
+                logger.info('squads reloaded, version: {}', version)
+            self._version = version
@@ -1,4 +1,4 @@
-from datetime import date
+from dataclasses import dataclass
 from http import HTTPStatus
 
 import httpx
@@ -6,8 +6,19 @@ from httpx_retries import Retry, RetryTransport
 from loguru import logger
 
 from src.backend.premier_league_api.base import IPremierLeagueApi
+from src.backend.premier_league_api.decoder import decode_squad
 from src.backend.premier_league_api.exceptions import APIError, TeamNotFound
-from src.backend.squad import Player, Squad
+from src.backend.request_context import cap_timeout, check_deadline
+from src.backend.squad import Squad
+
+
+@dataclass(frozen=True)
+class ConditionalResponse:
+    """Response of a conditional request"""
+    content: bytes | None
+    """ raw response body, None if the resource was not modified """
+    etag: str | None
+    last_modified: str | None
 
 
 class SportDBApi(IPremierLeagueApi):
@@ -47,7 +58,8 @@ class SportDBApi(IPremierLeagueApi):
     def __init__(self, api_key: str, 
                  timeout_seconds: int = 2, 
                  max_retries: int = 3, 
-                 backoff_factor: float = 0.5):
+                 backoff_factor: float = 0.5,
+                 base_url: str = "https://www.thesportsdb.com/api/v2/json"):
         """Initialize the API client
         
         Args:
@@ -55,8 +67,9 @@ class SportDBApi(IPremierLeagueApi):
             timeout_seconds (int, optional): Timeout in seconds. Defaults to 2.
             max_retries (int, optional): Maximum number of retries. Defaults to 3.
             backoff_factor (float, optional): Backoff, retries over a longer period of time, Defaults to 0.5.
+            base_url (str, optional): API base URL, changed only in tests.
         """
-        self._base_url = "https://www.thesportsdb.com/api/v2/json"
+        self._base_url = base_url
         self._timeout_seconds = timeout_seconds
         self._max_retries = max_retries
         self._backoff_factor = backoff_factor
@@ -93,37 +106,76 @@ class SportDBApi(IPremierLeagueApi):
         url = self.Endpoints.TEAM_SQUAD.format(team_id=team_id)
         response = await self._base_request(url)
         
-        players = response.get("list", [])
-        if not players:
+        squad = decode_squad(team_name, response.content)
+        if not squad.players:
             msg = f'Players for team {team_name} not found'
             logger.error(msg)
             raise APIError(msg)
-        
-        squad = Squad(name=team_name, players=[Player(
-            name=player.get("strPlayer", ""),
-            date_of_birth=date.fromisoformat(player.get("dateBorn", "")),
-            position=player.get("strPosition", ""),
-        ) for player in players])
         return squad
     
-    async def _base_request(self, endpoint: str) -> dict:
+    async def fetch_team_squad(self, team_name: str,
+                               etag: str | None = None,
+                               last_modified: str | None = None) -> ConditionalResponse:
+        """ Fetches the raw squad response of a team only if it changed since the previous fetch
+        
+        Args:
+            team_name (str): Name of the team, lowercase with spaces
+            etag (str | None): ETag header of the previous response
+            last_modified (str | None): Last-Modified header of the previous response
+        
+        Returns:
+            ConditionalResponse: Response without content if the squad was not modified
+        Raises:
+            TeamNotFound: If the team is not a Premier League team
+            APIError: If the request fails
+        """
+        team_id = self._PREMIERE_LEAGUE_TEAMS_TO_ID.get(team_name)
+        if not team_id:
+            raise TeamNotFound(f"Team {team_name} not found")
+        
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        
+        url = self.Endpoints.TEAM_SQUAD.format(team_id=team_id)
+        response = await self._base_request(url, headers)
+        not_modified = response.status_code == HTTPStatus.NOT_MODIFIED
+        return ConditionalResponse(content=None if not_modified else response.content,
+                                   etag=response.headers.get("ETag", etag),
+                                   last_modified=response.headers.get("Last-Modified", last_modified))
+    
+    async def _base_request(self, endpoint: str, headers: dict[str, str] | None = None) -> httpx.Response:
         """Base request to the API with retry
         
+        Args:
+            endpoint (str): Endpoint relative to the base URL
+            headers (dict[str, str] | None): Additional headers, e.g. conditional request headers
+        
         Returns:
-            dict: Response from the API
+            httpx.Response: Response with status 200, or 304 for conditional requests
         Raises:
             APIError: If the request fails
+            DeadlineExceeded: If the request deadline passed, the timeout never outlives the deadline
         """
         url = f"{self._base_url}/{endpoint}"
-        logger.trace(f"Fetching team squad from {url}")
+        logger.trace("Fetching team squad from {}", url)
+        check_deadline()
         
         transport = RetryTransport(retry=Retry(total=self._max_retries, backoff_factor=self._backoff_factor))
-        async with httpx.AsyncClient(transport=transport) as client:
-            response = await client.get(url, headers=self._headers, timeout=self._timeout_seconds)
+        try:
+            async with httpx.AsyncClient(transport=transport) as client:
+                response = await client.get(url, headers={**self._headers, **(headers or {})},
+                                            timeout=cap_timeout(self._timeout_seconds))
+        except httpx.HTTPError as error:
+            msg = f'Failed to fetch team squad from {url}: {error!r}'
+            logger.error(msg)
+            raise APIError(msg) from error
         
-        if response.status_code != HTTPStatus.OK:
+        if response.status_code not in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
             msg = f'Failed to fetch team squad from {url}, status code: {response.status_code}'
             logger.error(msg)
             raise APIError(msg)
         
-        return response.json()
+        return response
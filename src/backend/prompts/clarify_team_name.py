@@ -27,3 +27,16 @@ Output format:
 
 """)
 # Be strict about using only the provided club list.
+
+
+def build_clarification_request(candidates: list[str]) -> str:
+    """Builds a clarification request listing locally matched clubs, in the same format as CLARIFY_TEAM_NAME_PROMPT.
+    Args:
+        candidates (list[str]): Team names, best match first.
+    Returns:
+        str: The clarification request shown to the user.
+    """
+    if len(candidates) == 1:
+        return f"I believe you mean: {candidates[0]}. Can you please confirm?"
+    clubs = ", ".join(f"{position}. {club}" for position, club in enumerate(candidates, start=1))
+    return f"Possible clubs: {clubs}. Could you please confirm which one you mean? You can answer with the number."
@@ -4,27 +4,7 @@ from langchain.prompts import PromptTemplate
 
 from src.backend.squad import ALL_PLAYER_GROUPS, PlayersGroup, Squad
 
-def build_formulate_answer_prompt(squad: Squad, user_question: str) -> str:
-    """Builds a prompt for the model to formulate an answer to the user question based on the squad data.
-    Args:
-        squad (Squad): The squad data.
-        user_question (str): The user question.
-    Returns:
-        str: The prompt for the model.
-    """
-    markdown_parts = ["# Squad\n"]
-    for section in ALL_PLAYER_GROUPS:
-        if section in squad.get_player_group():
-            markdown_parts.append(f"## {section}")
-            for player in squad.get_player_group()[section]:
-                if section == PlayersGroup.Manager:
-                    markdown_parts.append(f"- {player.name} ({player.date_of_birth})")
-                else:
-                    markdown_parts.append(f"- {player.name} ({player.date_of_birth}) - {player.position}")
-
-    squad_markdown = "\n".join(markdown_parts)
-
-    prompt_template = PromptTemplate.from_template("""
+FORMULATE_ANSWER_PROMPT = PromptTemplate.from_template("""
     You are a football squad expert assistant.
 
     You have access to the following squad:
@@ -46,10 +26,40 @@ def build_formulate_answer_prompt(squad: Squad, user_question: str) -> str:
     {user_question}
     """)
 
-    prompt = prompt_template.format(
+def render_squad_markdown(squad: Squad) -> str:
+    """Renders the squad as markdown grouped by players positions.
+    The result doesn't depend on the user question, so it can be rendered once per squad.
+    Args:
+        squad (Squad): The squad data.
+    Returns:
+        str: The squad in markdown format.
+    """
+    player_groups = squad.get_player_group()
+    markdown_parts = ["# Squad\n"]
+    for section in ALL_PLAYER_GROUPS:
+        if section in player_groups:
+            markdown_parts.append(f"## {section}")
+            for player in player_groups[section]:
+                born = player.date_of_birth or "date of birth unknown"
+                if section == PlayersGroup.Manager:
+                    markdown_parts.append(f"- {player.name} ({born})")
+                else:
+                    markdown_parts.append(f"- {player.name} ({born}) - {player.position}")
+
+    return "\n".join(markdown_parts)
+
+def build_formulate_answer_prompt(squad_markdown: str, user_question: str) -> str:
+    """Builds a prompt for the model to formulate an answer to the user question based on the squad data.
+    Args:
+        squad_markdown (str): The squad data rendered by render_squad_markdown.
+        user_question (str): The user question.
+    Returns:
+        str: The prompt for the model.
+    """
+    prompt = FORMULATE_ANSWER_PROMPT.format(
         squad_markdown=squad_markdown,
         user_question=user_question,
         today=date.today().isoformat()
     )
 
-    return prompt
\ No newline at end of file
+    return prompt
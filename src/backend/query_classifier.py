@@ -0,0 +1,117 @@
+from difflib import get_close_matches
+import enum
+
+from src.backend.teams import TEAM_ALIASES, find_team_mentions, normalize_text
+
+SQUAD_TERMS = {
+    "squad", "squads", "roster", "rosters", "lineup", "players", "player", "members", "senior",
+    "goalkeeper", "goalkeepers", "keeper", "keepers", "defender", "defenders", "midfielder", "midfielders",
+    "forward", "forwards", "striker", "strikers", "winger", "wingers", "manager", "coach", "youngest", "oldest",
+    # other languages
+    "skład", "sklad", "squadra", "rosa", "plantilla", "kader", "effectif", "elenco", "склад",
+}
+""" words used in questions about a squad, a team mention together with one of them is a clear relevant query """
+
+FOOTBALL_TERMS = {
+    "football", "soccer", "club", "clubs", "team", "teams", "league", "premier", "epl", "season",
+    "play", "plays", "playing", "position", "positions", "born", "age", "ages", "transfer", "transfers",
+}
+""" football words which are not enough to accept the query but are enough to not reject it """
+
+FOLLOW_UP_CUES = {"their", "they", "them", "theirs", "its", "those", "also", "same"}
+""" words referring to the team from the previous question, e.g. "and who are their defenders?" """
+FOLLOW_UP_OPENINGS = ("and ", "also ", "what about ", "how about ", "and what about ")
+_FOLLOW_UP_FILLER_WORDS = {
+    "and", "what", "about", "how", "who", "whos", "whose", "which", "is", "are", "was", "were", "the", "a", "an",
+    "of", "for", "in", "at", "on", "with", "by", "s", "me", "tell", "show", "list", "give", "please", "all", "any",
+    "do", "does", "did", "have", "has", "there", "many", "much", "number", "count", "name", "names", "current",
+    "currently", "now", "this", "after", "before", "since", "than", "older", "younger", "over", "under", "year",
+    "years", "old", "most", "more", "fewer", "least", "each", "every", "can", "could", "i", "you", "see", "want",
+    "to", "know",
+}
+""" words of a follow-up question which don't name anything, every other word could name another club """
+
+_FOLLOW_UP_WORDS = SQUAD_TERMS | FOOTBALL_TERMS | FOLLOW_UP_CUES | _FOLLOW_UP_FILLER_WORDS
+
+_MIN_FUZZY_TOKEN_LENGTH = 5
+""" shorter tokens are compared exactly, e.g. "name" would be too close to "man" """
+_FUZZY_CUTOFF = 0.75
+
+
+class QueryDecision(enum.StrEnum):
+    RELEVANT = "relevant"
+    IRRELEVANT = "irrelevant"
+    UNSURE = "unsure"
+    """ the model has to decide """
+
+
+class QueryPreClassifier:
+    """Cheap local classifier run before the validation model call.
+    It accepts queries which clearly ask about a squad of a known team, rejects queries without
+    any football or team related word, and leaves everything else to the model.
+    """
+
+    def __init__(self, teams: list[str]):
+        """
+        Args:
+            teams: Premier League team names, lowercase with spaces
+        """
+        self._teams = teams
+        self._team_tokens = {token for team in teams for token in team.split()}
+        self._team_tokens |= {token for alias, team in TEAM_ALIASES.items() if team in teams for token in alias.split()}
+        self._team_tokens -= {"and"}
+        self._fuzzy_team_tokens = [token for token in self._team_tokens if len(token) >= _MIN_FUZZY_TOKEN_LENGTH]
+
+    def classify(self, query: str) -> QueryDecision:
+        """Classify the user query
+
+        Args:
+            query: user query
+
+        Returns:
+            QueryDecision: RELEVANT or IRRELEVANT if the decision is confident, UNSURE otherwise
+        """
+        tokens = normalize_text(query).split()
+        has_squad_term = any(token in SQUAD_TERMS for token in tokens)
+
+        if has_squad_term and find_team_mentions(query, self._teams):
+            return QueryDecision.RELEVANT
+
+        if has_squad_term or any(token in FOOTBALL_TERMS for token in tokens):
+            return QueryDecision.UNSURE
+
+        if any(self._is_team_hint(token) for token in tokens):
+            return QueryDecision.UNSURE
+
+        return QueryDecision.IRRELEVANT
+
+    def is_follow_up(self, query: str) -> bool:
+        """Check if the query continues the conversation about the previously discussed team.
+        It's a follow-up if it doesn't name any team but asks about a squad or refers to the previous team.
+        The match is conservative, every word has to be a squad, football, follow-up or filler word or a number,
+        any other word could name another club, e.g. "the squad of Barcelona" or "the bayern players".
+        Irrelevant queries are never follow-ups, e.g. "And how are you?".
+
+        Example:
+            "And who are their defenders?", "Who is the manager?"
+        """
+        normalized = normalize_text(query)
+        tokens = normalized.split()
+        if any(self._is_team_hint(token) for token in tokens):
+            return False
+        if any(not token.isdigit() and token not in _FOLLOW_UP_WORDS for token in tokens):
+            return False
+        if self.classify(query) == QueryDecision.IRRELEVANT:
+            return False
+
+        has_squad_term = any(token in SQUAD_TERMS for token in tokens)
+        has_cue = any(token in FOLLOW_UP_CUES for token in tokens) or normalized.startswith(FOLLOW_UP_OPENINGS)
+        return has_squad_term or has_cue
+
+    def _is_team_hint(self, token: str) -> bool:
+        """Check if the token looks like a part of a team name, including typos e.g. "manshesterr" """
+        if token in self._team_tokens:
+            return True
+        if len(token) < _MIN_FUZZY_TOKEN_LENGTH:
+            return False
+        return bool(get_close_matches(token, self._fuzzy_team_tokens, n=1, cutoff=_FUZZY_CUTOFF))
@@ -0,0 +1,254 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import enum
+import heapq
+from itertools import count
+import threading
+import time
+from typing import TypeVar
+
+from src.utils.logger import sampled
+
+T = TypeVar("T")
+
+_POLL_INTERVAL_SECONDS = 0.05
+""" how often a waiting call checks if it's its turn """
+_RATE_LIMITED_LOG_SAMPLE_RATE = 0.1
+""" 429 responses come in bursts, log only some of them, rate_limited_count has the exact number """
+
+_background_traffic: ContextVar[bool] = ContextVar("background_traffic", default=False)
+
+
+class Priority(enum.IntEnum):
+    """Priority of a model call, lower value is served first"""
+    HIGH = 0
+    """ the user is waiting for the final answer """
+    NORMAL = 1
+    """ interactive classification calls (validation, team extraction, clarification) """
+    LOW = 2
+    """ background jobs and evaluation """
+
+
+@contextmanager
+def background_traffic() -> Iterator[None]:
+    """All model calls made inside this context are served with the LOW priority
+
+    Example:
+        with background_traffic():
+            await agent.send_message(message)
+    """
+    token = _background_traffic.set(True)
+    try:
+        yield
+    finally:
+        _background_traffic.reset(token)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check if the error is a 429 response, works for openai.RateLimitError and httpx errors"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429
+
+
+class TokenBucket:
+    """Token bucket refilled continuously with a per minute rate"""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        """
+        Args:
+            per_minute: refill rate per minute
+            burst_seconds: the bucket capacity expressed in seconds of the refill rate
+        """
+        self._burst_seconds = burst_seconds
+        self._per_minute = per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    @property
+    def per_minute(self) -> float:
+        return self._per_minute
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self._per_minute / 60 * self._burst_seconds)
+
+    def set_rate(self, per_minute: float) -> None:
+        self._refill()
+        self._per_minute = per_minute
+        self._tokens = min(self._tokens, self.capacity)
+
+    def drain(self) -> None:
+        """Drop the accumulated burst, used after 429 responses"""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def delay(self, amount: float) -> float:
+        """Seconds to wait until the amount can be consumed"""
+        self._refill()
+        missing = min(amount, self.capacity) - self._tokens
+        return max(0.0, missing / (self._per_minute / 60))
+
+    def consume(self, amount: float) -> None:
+        """Consume tokens, the bucket can go into debt when the real usage exceeds the estimation"""
+        self._refill()
+        self._tokens -= amount
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self._per_minute / 60)
+        self._updated_at = now
+
+
+class AdaptiveRateLimiter:
+    """Rate limiter shared by all model calls of the process.
+    It limits both requests and tokens per minute, serves calls by priority and adapts the rates
+    to 429 responses using AIMD: the rates are halved after a 429 and slowly increased after successes.
+    It's safe to share between threads and event loops (e.g. Streamlit sessions).
+    """
+
+    def __init__(self,
+                 requests_per_minute: float = 500,
+                 tokens_per_minute: float = 30_000,
+                 burst_seconds: float = 1.0,
+                 max_retries: int = 3,
+                 decrease_factor: float = 0.5,
+                 increase_fraction: float = 0.02,
+                 min_fraction: float = 0.05):
+        """
+        Args:
+            requests_per_minute: maximum number of requests per minute
+            tokens_per_minute: maximum number of tokens (prompt + completion) per minute
+            burst_seconds: how many seconds of the rate can be sent at once
+            max_retries: how many times a call is retried after a 429 response
+            decrease_factor: the rates are multiplied by it after a 429 response
+            increase_fraction: fraction of the maximum rates added after every successful call
+            min_fraction: the rates never drop below this fraction of the maximum rates
+        """
+        self._max_requests_per_minute = requests_per_minute
+        self._max_tokens_per_minute = tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute, burst_seconds)
+        self._tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self._max_retries = max_retries
+        self._decrease_factor = decrease_factor
+        self._increase_fraction = increase_fraction
+        self._min_fraction = min_fraction
+        self._rate_fraction = 1.0
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[int, int]] = []
+        """ heap of (priority, ticket) """
+        self._cancelled: set[int] = set()
+        self._tickets = count()
+        self.rate_limited_count = 0
+        """ number of 429 responses, for monitoring """
+
+    @property
+    def rate_fraction(self) -> float:
+        """Current rates as a fraction of the maximum rates"""
+        return self._rate_fraction
+
+    async def call(self, fn: Callable[[], Awaitable[T]],
+                   estimated_tokens: int,
+                   priority: Priority = Priority.NORMAL,
+                   usage: Callable[[T], int | None] | None = None) -> T:
+        """Call fn when the rate limits allow it, retry it after 429 responses
+
+        Args:
+            fn: function making the model call
+            estimated_tokens: estimated number of prompt and completion tokens
+            priority: priority of the call, overridden to LOW inside background_traffic()
+            usage: function returning the real number of tokens used from the result
+
+        Returns:
+            T: result of fn
+        """
+        if _background_traffic.get():
+            priority = Priority.LOW
+
+        retries = 0
+        while True:
+            await self._acquire(estimated_tokens, priority)
+            try:
+                result = await fn()
+            except Exception as error:
+                if not is_rate_limit_error(error) or retries == self._max_retries:
+                    raise
+                self._on_rate_limited()
+                retries += 1
+                continue
+
+            used_tokens = usage(result) if usage else None
+            self._on_success(estimated_tokens, used_tokens)
+            return result
+
+    async def _acquire(self, tokens: int, priority: Priority) -> None:
+        with self._lock:
+            ticket = next(self._tickets)
+            heapq.heappush(self._waiters, (priority, ticket))
+
+        granted = False
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_grant(ticket, tokens)
+                    granted = delay == 0
+                if granted:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            if not granted:
+                # cancelled while waiting
+                with self._lock:
+                    self._cancelled.add(ticket)
+
+    def _try_grant(self, ticket: int, tokens: int) -> float:
+        """Grant the call if it's first in the queue and the buckets allow it, otherwise return the delay"""
+        while self._waiters and self._waiters[0][1] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._waiters)[1])
+
+        if self._waiters[0][1] != ticket:
+            return _POLL_INTERVAL_SECONDS
+
+        delay = max(self._requests.delay(1), self._tokens.delay(tokens))
+        if delay > 0:
+            return min(delay, _POLL_INTERVAL_SECONDS)
+
+        heapq.heappop(self._waiters)
+        self._requests.consume(1)
+        self._tokens.consume(tokens)
+        return 0
+
+    def _on_rate_limited(self) -> None:
+        with self._lock:
+            self.rate_limited_count += 1
+            self._set_rate_fraction(self._rate_fraction * self._decrease_factor)
+            self._requests.drain()
+            self._tokens.drain()
+        sampled(_RATE_LIMITED_LOG_SAMPLE_RATE).warning('model call rate limited, decreasing the rate to {:.0%}',
+                                                       self._rate_fraction)
+
+    def _on_success(self, estimated_tokens: int, used_tokens: int | None) -> None:
+        with self._lock:
+            if used_tokens is not None:
+                self._tokens.consume(used_tokens - estimated_tokens)
+            if self._rate_fraction < 1.0:
+                self._set_rate_fraction(self._rate_fraction + self._increase_fraction)
+
+    def _set_rate_fraction(self, fraction: float) -> None:
+        self._rate_fraction = min(1.0, max(self._min_fraction, fraction))
+        self._requests.set_rate(self._max_requests_per_minute * self._rate_fraction)
+        self._tokens.set_rate(self._max_tokens_per_minute * self._rate_fraction)
+
+
+_shared_rate_limiter: AdaptiveRateLimiter | None = None
+
+
+def get_shared_rate_limiter(requests_per_minute: float = 500, tokens_per_minute: float = 30_000) -> AdaptiveRateLimiter:
+    """Return the rate limiter shared by all agents of the process, the limits are set by the first call"""
+    global _shared_rate_limiter
+    if _shared_rate_limiter is None:
+        _shared_rate_limiter = AdaptiveRateLimiter(requests_per_minute, tokens_per_minute)
+    return _shared_rate_limiter
@@ -0,0 +1,88 @@
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+""" time.monotonic() deadline of the request handled by the current task """
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request deadline passed before the work started"""
+    pass
+
+
+@contextmanager
+def request_deadline(seconds: float | None) -> Iterator[None]:
+    """All the work started inside this context shares the deadline, nested deadlines can only shorten it
+
+    Example:
+        with request_deadline(30):
+            await agent.send_message(message)
+    """
+    deadline = _deadline.get()
+    if seconds is not None:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> float | None:
+    """Seconds left until the request deadline, None if the request has no deadline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded if the request deadline passed, called before starting expensive work
+    e.g. a model call or an HTTP request"""
+    remaining = remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+
+
+def cap_timeout(timeout_seconds: float) -> float:
+    """Timeout of a single call which doesn't outlive the request deadline"""
+    remaining = remaining_seconds()
+    return timeout_seconds if remaining is None else max(0.0, min(timeout_seconds, remaining))
+
+
+class CancellationToken:
+    """Cancels the request it's bound to, it's safe to call cancel from any thread
+
+    Example:
+        token = CancellationToken()
+        answer, _ = await agent.send_message(message, cancellation=token)
+        # another thread, e.g. when the user sends a new message
+        token.cancel()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def bind(self, task: asyncio.Task) -> None:
+        """Bind the token to the task handling the request, the task is cancelled right away
+        if the token was already cancelled"""
+        with self._lock:
+            self._task, self._loop = task, asyncio.get_running_loop()
+            if self._cancelled:
+                task.cancel()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            if self._task is not None and self._loop is not None and not self._task.done():
+                self._loop.call_soon_threadsafe(self._task.cancel)
@@ -0,0 +1,199 @@
+import asyncio
+from collections.abc import AsyncIterator, Sequence
+import math
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, cast
+
+from langchain_core.runnables.config import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+from loguru import logger
+
+from src.backend.premier_league_api.base import IPremierLeagueApi
+from src.backend.squad import Squad
+from src.backend.squad_cache import SquadCache
+
+_BUSY_TIMEOUT_SECONDS = 30.0
+""" how long a process waits for the write lock held by another process """
+_CONVERSATION_MAX_AGE_SECONDS = 7 * 24 * 60 * 60.0
+""" conversations idle for longer are deleted when a worker opens the store """
+_SQUAD_MAX_AGE_SECONDS = 24 * 60 * 60.0
+""" the squads change only in the transfer windows and when a player is injured, a day old squad is fine """
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Open the store shared by the worker processes.
+    WAL lets the readers of all processes work while one of them writes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the connection is used from the threads of asyncio.to_thread, the users serialize it with a lock
+    conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # a committed transaction can be lost only on a power failure, it's fine for conversations and caches
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SharedCheckpointSaver(SqliteSaver):
+    """Checkpointer of the conversations shared by the worker processes, so any worker can continue
+    any conversation, e.g. resume a pending clarification asked by another worker.
+    The async methods run the SqliteSaver queries in a thread, unlike AsyncSqliteSaver the saver isn't
+    bound to the event loop which created it, so it works with asyncio.run per Streamlit rerun.
+    Only the latest checkpoint of a conversation is kept, the agent never goes back in its history,
+    and the idle conversations are pruned, so the file doesn't grow with every message.
+
+    Example:
+        checkpointer = SharedCheckpointSaver.open(Path("shared_store.sqlite"))
+        agent = PremierLeagueAgent(model_name, squad_api, checkpointer=checkpointer)
+    """
+
+    @classmethod
+    def open(cls, path: Path,
+             conversation_max_age_seconds: float = _CONVERSATION_MAX_AGE_SECONDS) -> "SharedCheckpointSaver":
+        """Open the saver and delete the conversations idle for longer than conversation_max_age_seconds"""
+        saver = cls(connect(path))
+        saver.prune(conversation_max_age_seconds)
+        return saver
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS thread_activity (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                )""")
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        # the metadata is saved as JSON, the writes of the step are only informational and they hold the AgentState
+        metadata = cast(CheckpointMetadata, {key: value for key, value in metadata.items() if key != "writes"})
+        saved_config = super().put(config, checkpoint, metadata, new_versions)
+        configurable = saved_config.get("configurable", {})
+        key = (configurable["thread_id"], configurable["checkpoint_ns"], configurable["checkpoint_id"])
+        with self.cursor() as cur:
+            # the checkpoint ids grow with time
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", key)
+            cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", key)
+            cur.execute("INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                        "ON CONFLICT (thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                        (key[0], time.time()))
+        return saved_config
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete the conversations which weren't continued for max_age_seconds
+
+        Returns:
+            int: number of deleted conversations
+        """
+        with self.cursor() as cur:
+            thread_ids = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (time.time() - max_age_seconds,))]
+        for thread_id in thread_ids:
+            self.delete_thread(thread_id)
+        if thread_ids:
+            logger.info('pruned {} idle conversations', len(thread_ids))
+        return len(thread_ids)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class SharedSquadCache(SquadCache):
+    """Squad cache shared by the worker processes through a SQLite table.
+    Every squad is fetched from the API once for all the processes and the squad versions are global,
+    so a squad reference saved in a checkpoint by one worker is resolved to the same squad by another one.
+    Squads found in the table are also kept in memory of the process. An expired squad is fetched again
+    by the first process which needs it and replaced with a new version for all of them,
+    the same happens to the squads of an older squads version of the API.
+    """
+
+    def __init__(self, squad_api: IPremierLeagueApi, path: Path, max_age_seconds: float = _SQUAD_MAX_AGE_SECONDS):
+        """
+        Args:
+            squad_api: API used to fetch squads which are not in the table yet
+            path: SQLite file shared by the workers, it can be the file of the SharedCheckpointSaver
+            max_age_seconds: squads fetched longer ago are fetched again, also after a restart
+        """
+        super().__init__(squad_api, max_age_seconds)
+        self._conn = connect(path)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock, self._conn:
+            # AUTOINCREMENT never reuses the versions of invalidated squads
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS squads (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    team_name TEXT NOT NULL UNIQUE,
+                    squad TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    squads_version INTEGER
+                )""")
+
+    async def _fetch(self, team_name: str) -> tuple[int, Squad, float]:
+        entry = await asyncio.to_thread(self._read, team_name)
+        if entry:
+            return entry
+        squad = await self._squad_api.get_team_squad(team_name)
+        return await asyncio.to_thread(self._insert, team_name, squad, time.time())
+
+    def invalidate(self, team_name: str | None = None) -> None:
+        """Remove a squad from the cache of all the processes, if team_name is None the whole cache is cleared.
+        Other processes still serve the squads they keep in memory until they invalidate them too.
+        """
+        super().invalidate(team_name)
+        with self._conn_lock, self._conn:
+            if team_name is None:
+                self._conn.execute("DELETE FROM squads")
+            else:
+                self._conn.execute("DELETE FROM squads WHERE team_name = ?", (team_name,))
+
+    def _read(self, team_name: str) -> tuple[int, Squad, float] | None:
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT version, squad, fetched_at, squads_version FROM squads WHERE team_name = ?",
+                (team_name,)).fetchone()
+        if row is None or self._is_expired(row[2]) or row[3] != self._squads_version:
+            return None
+        return row[0], Squad.model_validate_json(row[1]), row[2]
+
+    def _insert(self, team_name: str, squad: Squad, fetched_at: float) -> tuple[int, Squad, float]:
+        expired_before = -math.inf if self._max_age_seconds is None else fetched_at - self._max_age_seconds
+        with self._conn_lock, self._conn:
+            self._conn.execute("DELETE FROM squads WHERE team_name = ? AND (fetched_at < ? OR squads_version IS NOT ?)",
+                               (team_name, expired_before, self._squads_version))
+            # another process could fetch the same squad in the meantime, the first one wins
+            self._conn.execute("INSERT OR IGNORE INTO squads (team_name, squad, fetched_at, squads_version) "
+                               "VALUES (?, ?, ?, ?)",
+                               (team_name, squad.model_dump_json(), fetched_at, self._squads_version))
+            row = self._conn.execute("SELECT version, squad, fetched_at FROM squads WHERE team_name = ?",
+                                     (team_name,)).fetchone()
+        logger.debug('shared squad of {}, version: {}', team_name, row[0])
+        return row[0], Squad.model_validate_json(row[1]), row[2]
@@ -2,7 +2,9 @@ from collections import defaultdict
 import enum
 
 from datetime import date   
-from pydantic import BaseModel
+from typing import Annotated, Any
+
+from pydantic import AliasChoices, BaseModel, Field, ValidatorFunctionWrapHandler, WrapValidator
 
 class PlayersGroup(enum.StrEnum):
     Goalkeepers = "Goalkeepers"
@@ -29,10 +31,23 @@ POSITION_TO_PLAYER_GROUP = {
     "Left Wing": PlayersGroup.Forwards,
 }
 
+_MISSING_DATES = {"", "0000-00-00"}
+""" placeholders sent by TheSportsDB for an unknown date """
+
+def _date_or_none(value: Any, handler: ValidatorFunctionWrapHandler) -> date | None:
+    """The placeholder dates are None, other invalid dates are still validation errors"""
+    if isinstance(value, str) and value.strip() in _MISSING_DATES:
+        return None
+    return handler(value)
+
+
 class Player(BaseModel):
-    name: str
-    date_of_birth: date
-    position: str
+    """The aliases are TheSportsDB field names, the API responses are validated straight into the players"""
+    name: str = Field(validation_alias=AliasChoices("name", "strPlayer"))
+    date_of_birth: Annotated[date | None, WrapValidator(_date_or_none)] = Field(
+        default=None, validation_alias=AliasChoices("date_of_birth", "dateBorn"))
+    """ None if the source doesn't know it """
+    position: str = Field(validation_alias=AliasChoices("position", "strPosition"))
 
 class Squad(BaseModel):
     name: str
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from src.backend.premier_league_api.base import IPremierLeagueApi
+from src.backend.squad import Squad
+
+
+class SquadCache:
+    """In-memory cache of team squads.
+    The agent state keeps only a reference to a squad (team name and squad version),
+    the squad itself is resolved from this cache when a node needs it.
+    The cached squads are dropped when the squads version of the API changes, e.g. after SquadSync.
+    """
+
+    def __init__(self, squad_api: IPremierLeagueApi, max_age_seconds: float | None = None):
+        """
+        Args:
+            squad_api: API used to fetch squads which are not cached yet
+            max_age_seconds: squads fetched longer ago are fetched again with a new version, None keeps them forever
+        """
+        self._squad_api = squad_api
+        self._max_age_seconds = max_age_seconds
+        self._entries: dict[str, tuple[int, Squad]] = {}
+        self._fetched_at: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last_version = 0
+        self._squads_version = squad_api.get_squads_version()
+        """ squads version of the API the cached squads were fetched from """
+
+    async def get(self, team_name: str) -> tuple[int, Squad]:
+        """Return the cached squad of a team, fetch it from the API if it's not cached yet.
+
+        Args:
+            team_name: name of the team, lowercase with spaces
+
+        Returns:
+            tuple[int, Squad]: squad version and squad
+        """
+        entry = self.peek(team_name)
+        if entry:
+            return entry
+
+        lock = self._locks.setdefault(team_name, asyncio.Lock())
+        async with lock:
+            # another coroutine could fetch the squad while we were waiting for the lock
+            entry = self.peek(team_name)
+            if entry:
+                return entry
+
+            version, squad, fetched_at = await self._fetch(team_name)
+            self._entries[team_name] = (version, squad)
+            self._fetched_at[team_name] = fetched_at
+            logger.debug('cached squad of {}, version: {}', team_name, version)
+            return version, squad
+
+    async def _fetch(self, team_name: str) -> tuple[int, Squad, float]:
+        """Fetch the squad of a team which is not cached in memory and assign it a new version
+
+        Returns:
+            tuple[int, Squad, float]: squad version, squad and time.time() when it was fetched from the API
+        """
+        squad = await self._squad_api.get_team_squad(team_name)
+        self._last_version += 1
+        return self._last_version, squad, time.time()
+
+    def peek(self, team_name: str) -> tuple[int, Squad] | None:
+        """Return the squad if it's cached in memory and not expired, it never calls the API"""
+        self._check_squads_version()
+        entry = self._entries.get(team_name)
+        if entry and self._is_expired(self._fetched_at[team_name]):
+            return None
+        return entry
+
+    def _check_squads_version(self) -> None:
+        """Drop the squads cached in memory if the squads changed since they were fetched"""
+        squads_version = self._squad_api.get_squads_version()
+        if squads_version == self._squads_version:
+            return
+        logger.info('squads version changed from {} to {}, the cached squads are dropped',
+                    self._squads_version, squads_version)
+        self._squads_version = squads_version
+        self._entries.clear()
+        self._fetched_at.clear()
+
+    def _is_expired(self, fetched_at: float) -> bool:
+        return self._max_age_seconds is not None and time.time() - fetched_at > self._max_age_seconds
+
+    async def resolve(self, team_name: str, version: int | None) -> tuple[int, Squad]:
+        """Resolve a squad reference stored in the agent state.
+        If the referenced version is not cached anymore the current squad is returned.
+
+        Args:
+            team_name: name of the team, lowercase with spaces
+            version: squad version saved in the agent state
+
+        Returns:
+            tuple[int, Squad]: current squad version and squad
+        """
+        current_version, squad = await self.get(team_name)
+        if version is not None and version != current_version:
+            logger.debug('squad version {} of {} is outdated, using version {}', version, team_name, current_version)
+        return current_version, squad
+
+    def invalidate(self, team_name: str | None = None) -> None:
+        """Remove a squad from the cache, if team_name is None the whole cache is cleared."""
+        if team_name is None:
+            self._entries.clear()
+            self._fetched_at.clear()
+        else:
+            self._entries.pop(team_name, None)
+            self._fetched_at.pop(team_name, None)
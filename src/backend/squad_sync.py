@@ -0,0 +1,173 @@
+import asyncio
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+from loguru import logger
+
+from src.backend.premier_league_api.decoder import decode_squad
+from src.backend.premier_league_api.exceptions import APIError
+from src.backend.premier_league_api.sportdb import SportDBApi
+from src.backend.squad import Squad
+
+_DEFAULT_CONCURRENCY = 4
+
+
+@dataclass
+class TeamSyncState:
+    """What is known about the stored squad of a team"""
+    content_hash: str
+    """ hash of the stored players, an unchanged squad with a new ETag is not rewritten """
+    version: int
+    """ squads version in which the squad changed last time """
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+@dataclass
+class SyncResult:
+    version: int
+    """ squads version after the sync, it changes only if any squad changed """
+    changed: list[str] = field(default_factory=list)
+    not_modified: list[str] = field(default_factory=list)
+    """ the API answered 304 """
+    unchanged: list[str] = field(default_factory=list)
+    """ the API sent the squad again but its content is the same """
+    failed: list[str] = field(default_factory=list)
+    """ the previous squad is kept """
+
+
+def squad_rows(squad: Squad) -> list[dict]:
+    """Squad in the squads file format, see LocalPremierLeagueApi"""
+    return [{"name": player.name,
+             "date_of_birth": player.date_of_birth.isoformat() if player.date_of_birth else None,
+             "position": player.position}
+            for player in squad.players]
+
+
+def content_hash(rows: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(rows, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def state_path_for(squads_path: Path) -> Path:
+    """Path of the sync state stored next to the squads file, e.g. squads.sync.json"""
+    return squads_path.with_suffix(".sync.json")
+
+
+def read_squads_version(squads_path: Path) -> int:
+    """Version of the squads file, 0 if it was never synced.
+    Caches of squads (SquadCache, materialized answers...) compare it with the version they were built from.
+    """
+    state_path = state_path_for(squads_path)
+    if not state_path.exists():
+        return 0
+    return json.loads(state_path.read_text(encoding="utf-8"))["version"]
+
+
+def write_json_atomically(path: Path, data: object) -> None:
+    """Write JSON to a temporary file and move it over the path, readers never see a partially written file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False) as fp:
+        json.dump(data, fp, indent=4, ensure_ascii=False)
+    os.replace(fp.name, path)
+
+
+class SquadSync:
+    """Incremental sync of the squads file (see LocalPremierLeagueApi) with TheSportsDB.
+    Every team is fetched with a conditional request (ETag / Last-Modified of the previous response),
+    a squad is stored only if the content hash of its players changed. The squads file is rewritten atomically
+    and only if any squad changed, the squads version is increased at the same time.
+    """
+
+    def __init__(self, api: SportDBApi, squads_path: Path, max_concurrency: int = _DEFAULT_CONCURRENCY):
+        """
+        Args:
+            api: TheSportsDB client
+            squads_path: path of the squads file, the sync state is stored next to it
+            max_concurrency: maximum number of concurrent requests
+        """
+        self._api = api
+        self._squads_path = squads_path
+        self._state_path = state_path_for(squads_path)
+        self._max_concurrency = max_concurrency
+
+    async def sync(self) -> SyncResult:
+        """Fetch changed squads and store them
+
+        Returns:
+            SyncResult: new squads version and what happened to every team
+        """
+        squads: dict[str, list[dict]] = {}
+        if self._squads_path.exists():
+            squads = json.loads(self._squads_path.read_text(encoding="utf-8"))
+        version, teams_state = self._load_state()
+        # squads downloaded before the sync state existed have no hash yet
+        for team, rows in squads.items():
+            if team not in teams_state:
+                teams_state[team] = TeamSyncState(content_hash=content_hash(rows), version=version)
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def fetch(team: str):
+            async with semaphore:
+                # without the stored squad a 304 would be useless
+                state = teams_state.get(team) if team in squads else None
+                etag, last_modified = (state.etag, state.last_modified) if state else (None, None)
+                try:
+                    return team, await self._api.fetch_team_squad(team, etag, last_modified)
+                except APIError as error:
+                    return team, error
+
+        result = SyncResult(version=version)
+        changed_rows: dict[str, list[dict]] = {}
+        for team, response in await asyncio.gather(*(fetch(team) for team in self._api.get_teams())):
+            if isinstance(response, APIError):
+                result.failed.append(team)
+                continue
+            if response.content is None:
+                result.not_modified.append(team)
+                continue
+            try:
+                squad = decode_squad(team, response.content)
+            except APIError:
+                result.failed.append(team)
+                continue
+            if not squad.players:
+                logger.warning('players of {} not found, keeping the previous squad', team)
+                result.failed.append(team)
+                continue
+
+            rows = squad_rows(squad)
+            new_hash = content_hash(rows)
+            previous = teams_state.get(team)
+            if previous and previous.content_hash == new_hash and team in squads:
+                result.unchanged.append(team)
+            else:
+                result.changed.append(team)
+                changed_rows[team] = rows
+            teams_state[team] = TeamSyncState(content_hash=new_hash,
+                                              version=previous.version if previous else version,
+                                              etag=response.etag, last_modified=response.last_modified)
+
+        if changed_rows:
+            result.version = version + 1
+            for team in changed_rows:
+                teams_state[team].version = result.version
+            write_json_atomically(self._squads_path, {**squads, **changed_rows})
+        # the state is written even without changes to remember new ETags
+        write_json_atomically(self._state_path, {
+            "version": result.version,
+            "teams": {team: vars(state) for team, state in teams_state.items()},
+        })
+        logger.info('squads synced, version: {}, changed: {}, not modified: {}, unchanged: {}, failed: {}',
+                    result.version, result.changed, len(result.not_modified), len(result.unchanged), result.failed)
+        return result
+
+    def _load_state(self) -> tuple[int, dict[str, TeamSyncState]]:
+        if not self._state_path.exists():
+            return 0, {}
+        state = json.loads(self._state_path.read_text(encoding="utf-8"))
+        return state["version"], {team: TeamSyncState(**team_state) for team, team_state in state["teams"].items()}
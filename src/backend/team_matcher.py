@@ -0,0 +1,176 @@
+from dataclasses import dataclass
+
+from src.backend.query_classifier import FOOTBALL_TERMS, SQUAD_TERMS
+from src.backend.teams import TEAM_ALIASES, find_team_mentions, normalize_text
+
+_GENERIC_TOKENS = {"united", "city", "and", "the", "fc", "afc"}
+""" tokens shared by many clubs names, they don't identify a club on their own """
+_STOP_WORDS = {"what", "who", "which", "whose", "please", "tell", "show", "list", "give", "provide", "about",
+               "for", "from", "with", "are", "was", "were", "you", "can", "could", "would", "current", "currently",
+               "all", "full", "their", "them", "they", "this", "that", "one", "men", "mens", "women", "side", "first",
+               "second", "third", "mean", "meant"} | SQUAD_TERMS | FOOTBALL_TERMS
+""" common words which should never be fuzzy matched to a club, e.g. "please" sounds like "palace" """
+_MIN_TOKEN_LENGTH = 3
+_MIN_SCORE = 0.7
+_EXACT_SCORE = 1.0
+_PREFIX_SCORE = 0.8
+_PHONETIC_SCORE = 0.75
+_TIE_MARGIN = 0.1
+""" candidates scored lower than the best one by more than this are dropped """
+
+_CONFIRMATIONS = {"yes", "y", "yeah", "yep", "yup", "sure", "correct", "right", "ok", "okay", "exactly", "confirm",
+                  "tak", "si", "oui", "ja", "da", "да", "так"}
+_REJECTIONS = {"no", "nope", "nah", "wrong", "neither", "none", "nie", "non", "nein", "нет", "ні"}
+_ORDINALS = {"first": 1, "second": 2, "third": 3, "1st": 1, "2nd": 2, "3rd": 3}
+
+
+@dataclass(frozen=True)
+class TeamCandidate:
+    team_name: str
+    score: float
+    """ 1.0 for exact match of a name or an alias """
+
+
+def levenshtein_distance(a: str, b: str) -> int:
+    """Number of single character edits needed to change a into b"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def soundex(word: str) -> str:
+    """Phonetic key of the word, words which sound similar have the same key e.g. "arsenal" and "arsnal" """
+    codes = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+             "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
+    word = "".join(char for char in word.lower() if char.isascii() and char.isalpha())
+    if not word:
+        return ""
+    key = word[0]
+    previous = codes.get(word[0], "")
+    for char in word[1:]:
+        code = codes.get(char, "")
+        if code and code != previous:
+            key += code
+        if char not in "hw":
+            previous = code
+    return (key + "000")[:4]
+
+
+class TeamMatcher:
+    """Local fuzzy matching of user text to Premier League clubs.
+    It's used to build clarification requests and to interpret user clarifications without calling the model.
+    """
+
+    def __init__(self, teams: list[str]):
+        """
+        Args:
+            teams: Premier League team names, lowercase with spaces
+        """
+        self._teams = teams
+        self._keys: dict[str, set[str]] = {}
+        """ key (token or alias phrase) -> team names """
+        for team in teams:
+            for token in team.split():
+                if token not in _GENERIC_TOKENS:
+                    self._keys.setdefault(token, set()).add(team)
+        for alias, team in TEAM_ALIASES.items():
+            if team in teams:
+                self._keys.setdefault(alias, set()).add(team)
+        self._phonetic_keys = {key: soundex(key) for key in self._keys if " " not in key}
+
+    def rank_candidates(self, text: str, limit: int = 3) -> list[TeamCandidate]:
+        """Rank the clubs which the text most likely refers to
+
+        Args:
+            text: user text, e.g. "What is the squad of Manshesterr?"
+            limit: maximum number of candidates
+
+        Returns:
+            list[TeamCandidate]: best candidates first, empty if nothing is similar enough
+        """
+        mentioned = find_team_mentions(text, self._teams)
+        if mentioned:
+            return [TeamCandidate(team_name=team, score=_EXACT_SCORE) for team in mentioned[:limit]]
+
+        tokens = [token for token in normalize_text(text).split()
+                  if len(token) >= _MIN_TOKEN_LENGTH and token not in _STOP_WORDS]
+        phrases = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+        scores: dict[str, float] = {}
+        for phrase in phrases:
+            for key, teams in self._keys.items():
+                score = self._score(phrase, key)
+                for team in teams:
+                    if score >= _MIN_SCORE and score > scores.get(team, 0.0):
+                        scores[team] = score
+
+        if not scores:
+            return []
+        best_score = max(scores.values())
+        candidates = [TeamCandidate(team_name=team, score=score) for team, score in scores.items()
+                      if score >= best_score - _TIE_MARGIN]
+        candidates.sort(key=lambda candidate: (-candidate.score, self._teams.index(candidate.team_name)))
+        return candidates[:limit]
+
+    def resolve_clarification(self, response: str, candidates: list[str]) -> str | None:
+        """Interpret the user response to a clarification request locally
+
+        Args:
+            response: user response, e.g. "yes", "2", "the second one", "Manchester City"
+            candidates: team names offered in the clarification request, in the presented order
+
+        Returns:
+            str | None: resolved team name, None if the response is not clear
+        """
+        tokens = normalize_text(response).split()
+        if not tokens:
+            return None
+
+        for token in tokens:
+            position = int(token) if token.isdigit() else _ORDINALS.get(token)
+            if position and 1 <= position <= len(candidates):
+                return candidates[position - 1]
+
+        mentioned = find_team_mentions(response, self._teams)
+        if len(mentioned) == 1:
+            return mentioned[0]
+
+        # e.g. "city" when asked about manchester united and manchester city
+        matching_candidates = [team for team in candidates if set(team.split()) & set(tokens)]
+        if len(matching_candidates) == 1:
+            return matching_candidates[0]
+
+        ranked = self.rank_candidates(response, limit=2)
+        if len(ranked) == 1:
+            return ranked[0].team_name
+        ranked_names = [candidate.team_name for candidate in ranked]
+        matching_candidates = [team for team in candidates if team in ranked_names]
+        if len(matching_candidates) == 1:
+            return matching_candidates[0]
+
+        if len(candidates) == 1 and any(token in _CONFIRMATIONS for token in tokens) and not self.is_rejection(response):
+            return candidates[0]
+        return None
+
+    def is_rejection(self, response: str) -> bool:
+        """Check if the user rejected all the offered candidates, e.g. "no" """
+        return any(token in _REJECTIONS for token in normalize_text(response).split())
+
+    def _score(self, phrase: str, key: str) -> float:
+        if phrase == key:
+            return _EXACT_SCORE
+        if " " in phrase or " " in key:
+            return 0.0
+        if len(phrase) >= _MIN_TOKEN_LENGTH and len(key) > len(phrase) and key.startswith(phrase):
+            return _PREFIX_SCORE
+        similarity = 1 - levenshtein_distance(phrase, key) / max(len(phrase), len(key))
+        is_similar_length = abs(len(phrase) - len(key)) <= 2
+        if similarity < _PHONETIC_SCORE and is_similar_length and soundex(phrase) == self._phonetic_keys[key]:
+            return _PHONETIC_SCORE
+        return similarity
@@ -0,0 +1,64 @@
+import unicodedata
+
+TEAM_ALIASES: dict[str, str] = {
+    "man utd": "manchester united",
+    "man united": "manchester united",
+    "man u": "manchester united",
+    "red devils": "manchester united",
+    "man city": "manchester city",
+    "citizens": "manchester city",
+    "gunners": "arsenal",
+    "spurs": "tottenham hotspur",
+    "tottenham": "tottenham hotspur",
+    "wolves": "wolverhampton wanderers",
+    "wolverhampton": "wolverhampton wanderers",
+    "villa": "aston villa",
+    "brighton": "brighton and hove albion",
+    "seagulls": "brighton and hove albion",
+    "palace": "crystal palace",
+    "eagles": "crystal palace",
+    "forest": "nottingham forest",
+    "nottm forest": "nottingham forest",
+    "newcastle": "newcastle united",
+    "magpies": "newcastle united",
+    "west ham": "west ham united",
+    "hammers": "west ham united",
+    "leeds": "leeds united",
+    "toffees": "everton",
+    "cherries": "bournemouth",
+    "afc bournemouth": "bournemouth",
+    "bees": "brentford",
+    "black cats": "sunderland",
+    "clarets": "burnley",
+    "cottagers": "fulham",
+}
+""" common short names and nicknames of Premier League clubs, alias -> team name """
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase the text, remove accents and punctuation and collapse whitespaces
+
+    Example:
+        "Who are Man. City's players?" -> "who are man city s players"
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    chars = [char if char.isalnum() else " " for char in decomposed if not unicodedata.combining(char)]
+    return " ".join("".join(chars).split())
+
+
+def find_team_mentions(text: str, teams: list[str]) -> list[str]:
+    """Find teams mentioned in the text by their full names or aliases
+
+    Args:
+        text: user text
+        teams: team names, lowercase with spaces
+
+    Returns:
+        list[str]: mentioned team names without duplicates
+    """
+    padded = f" {normalize_text(text)} "
+    found = [team for team in teams if f" {team} " in padded]
+    for alias, team in TEAM_ALIASES.items():
+        if team in teams and team not in found and f" {alias} " in padded:
+            found.append(team)
+    return found
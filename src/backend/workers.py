@@ -0,0 +1,325 @@
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass
+import itertools
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+import os
+from pathlib import Path
+import pickle
+import queue
+import threading
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+from loguru import logger
+
+from src.backend.agent import CANCELLED_ANSWER, DEADLINE_EXCEEDED_ANSWER, AgentState, GraphTopology, PremierLeagueAgent
+from src.backend.answer_store import AnswerStore
+from src.backend.premier_league_api.sportdb import SportDBApi
+from src.backend.rate_limiter import get_shared_rate_limiter
+from src.backend.request_context import CancellationToken, remaining_seconds, request_deadline
+from src.configuration import Configuration
+
+AgentFactory = Callable[[Path], PremierLeagueAgent]
+""" builds the agent of a worker process from the path of the shared store, it has to be picklable """
+
+_DEFAULT_CONCURRENCY_PER_WORKER = 8
+""" requests handled at once by a worker, they wait mostly for the model and the squad API """
+_DEFAULT_REPLY_GRACE_SECONDS = 5.0
+""" time after the request deadline for the worker to send the deadline answer, e.g. to save the checkpoint """
+_WORKER_CHECK_INTERVAL_SECONDS = 0.5
+""" how often the reply reader checks that the workers are alive """
+
+
+class WorkerError(Exception):
+    """The worker process handling the request exited, e.g. it crashed or the agent factory failed"""
+
+
+@dataclass(frozen=True)
+class _Request:
+    request_id: int
+    session_id: str
+    content: str
+    deadline_at: float | None
+    """ time.time() deadline, the time spent in the queue counts into the request deadline """
+
+
+@dataclass(frozen=True)
+class _Started:
+    """ sent by the worker which took the request """
+    request_id: int
+    pid: int
+
+
+@dataclass(frozen=True)
+class _Reply:
+    request_id: int
+    answer: str = ""
+    state: AgentState | None = None
+    error: Exception | None = None
+
+
+def build_agent(config: Configuration, store_path: Path | None = None, worker_count: int = 1) -> PremierLeagueAgent:
+    """Build the agent of the application, e.g. functools.partial(build_agent, config) is the factory of the workers
+
+    Args:
+        config: application configuration
+        store_path: SQLite file shared by the workers, None keeps the conversations and squads in memory
+        worker_count: number of processes sharing the model quota
+    """
+    squad_api = SportDBApi(config.THE_SPORT_API_KEY.get_secret_value())
+    # the limits are shared by all sessions of the process, every worker gets its part of the quota
+    rate_limiter = get_shared_rate_limiter(config.LLM_REQUESTS_PER_MINUTE // worker_count,
+                                           config.LLM_TOKENS_PER_MINUTE // worker_count)
+    answer_store = AnswerStore(Path(config.ANSWER_STORE_PATH)) if config.ANSWER_STORE_PATH else None
+    checkpointer, squad_cache = None, None
+    if store_path:
+        # langgraph-checkpoint-sqlite is needed only by the workers
+        from src.backend.shared_store import SharedCheckpointSaver, SharedSquadCache
+        checkpointer, squad_cache = SharedCheckpointSaver.open(store_path), SharedSquadCache(squad_api, store_path)
+    return PremierLeagueAgent(config.MODEL_NAME, squad_api, rate_limiter=rate_limiter,
+                              topology=GraphTopology(config.GRAPH_TOPOLOGY), node_models=config.NODE_MODELS,
+                              answer_store=answer_store, checkpointer=checkpointer, squad_cache=squad_cache)
+
+
+class WorkerPool:
+    """Runs the agents in many processes behind one entry point, so the answers use all the cores.
+    The workers share the conversations and the squads through a SQLite store and take the requests
+    from one queue, a conversation isn't bound to a worker, e.g. a clarification asked by one worker
+    is resumed by any other. The materialized answers are shared through the AnswerStore file.
+
+    Example:
+        with WorkerPool(functools.partial(build_agent, config), Path("shared_store.sqlite"), 4) as pool:
+            session = pool.session()
+            answer, _ = await session.send_message(HumanMessage(content="Who is the manager of Arsenal?"))
+    """
+
+    def __init__(self, agent_factory: AgentFactory, store_path: Path, worker_count: int | None = None,
+                 concurrency_per_worker: int = _DEFAULT_CONCURRENCY_PER_WORKER,
+                 reply_grace_seconds: float = _DEFAULT_REPLY_GRACE_SECONDS):
+        """
+        Args:
+            agent_factory: builds the agent of a worker, it has to be picklable, e.g. a module level function
+            store_path: SQLite file shared by the workers
+            worker_count: number of worker processes, by default one per core
+            concurrency_per_worker: requests handled at once by a worker
+            reply_grace_seconds: time after the request deadline to wait for the reply of a stuck worker
+        """
+        self._agent_factory = agent_factory
+        self._store_path = store_path
+        self._worker_count = worker_count or os.cpu_count() or 1
+        self._concurrency_per_worker = concurrency_per_worker
+        self._reply_grace_seconds = reply_grace_seconds
+        # spawn doesn't copy the threads and the locks of the parent, e.g. of the Streamlit server
+        self._context = multiprocessing.get_context("spawn")
+        self._requests: Queue = self._context.Queue()
+        self._replies: Queue = self._context.Queue()
+        self._workers: list[BaseProcess] = []
+        self._reply_reader: threading.Thread | None = None
+        self._request_ids = itertools.count()
+        self._pending: dict[int, tuple[asyncio.AbstractEventLoop, asyncio.Future[_Reply]]] = {}
+        self._pending_lock = threading.Lock()
+
+    @property
+    def worker_count(self) -> int:
+        return self._worker_count
+
+    def start(self) -> "WorkerPool":
+        for _ in range(self._worker_count):
+            worker = self._context.Process(
+                target=_run_worker, daemon=True,
+                args=(self._agent_factory, self._store_path, self._requests, self._replies,
+                      self._concurrency_per_worker))
+            worker.start()
+            self._workers.append(worker)
+        self._reply_reader = threading.Thread(target=self._read_replies, name="worker-replies", daemon=True)
+        self._reply_reader.start()
+        logger.info('started {} agent workers, shared store: {}', self._worker_count, self._store_path)
+        return self
+
+    def close(self) -> None:
+        """Stop the workers after they finish the requests they are handling"""
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._replies.put(None)
+        if self._reply_reader:
+            self._reply_reader.join()
+        self._workers.clear()
+
+    def __enter__(self) -> "WorkerPool":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def session(self, session_id: str | None = None) -> "WorkerSession":
+        """Conversation served by the pool, a new one if session_id is None"""
+        return WorkerSession(self, session_id or uuid.uuid4().hex)
+
+    async def send_message(self, session_id: str, user_message: HumanMessage,
+                           deadline_seconds: float | None = None) -> tuple[str, AgentState]:
+        """Send a message to any free worker, see PremierLeagueAgent.send_message
+
+        Args:
+            session_id: conversation to continue
+            user_message: user message
+            deadline_seconds: time limit of the whole request including the time spent in the queue
+
+        Raises:
+            WorkerError: If the worker handling the request exited or no worker is alive
+        """
+        request_id = next(self._request_ids)
+        future: asyncio.Future[_Reply] = asyncio.get_running_loop().create_future()
+        with self._pending_lock:
+            self._pending[request_id] = (asyncio.get_running_loop(), future)
+        deadline_at = None if deadline_seconds is None else time.time() + deadline_seconds
+        content = str(user_message.content)
+        self._requests.put(_Request(request_id, session_id, content, deadline_at))
+        try:
+            # the worker answers by the deadline, a worker which doesn't is stuck
+            async with asyncio.timeout(None if deadline_seconds is None
+                                       else deadline_seconds + self._reply_grace_seconds):
+                reply = await future
+        except TimeoutError:
+            logger.error('no reply of the workers to request {} after its deadline', request_id)
+            return DEADLINE_EXCEEDED_ANSWER, AgentState(user_query=content, answer=DEADLINE_EXCEEDED_ANSWER)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+        if reply.error:
+            raise reply.error
+        assert reply.state is not None
+        return reply.answer, reply.state
+
+    def _read_replies(self) -> None:
+        started: dict[int, int] = {}
+        """ request id -> pid of the worker handling it """
+        checked_at = time.monotonic()
+        while True:
+            try:
+                reply = self._replies.get(timeout=_WORKER_CHECK_INTERVAL_SECONDS)
+                if reply is None:
+                    break
+                if isinstance(reply, _Started):
+                    started[reply.request_id] = reply.pid
+                else:
+                    started.pop(reply.request_id, None)
+                    self._resolve(reply)
+            except queue.Empty:
+                pass
+            if time.monotonic() - checked_at >= _WORKER_CHECK_INTERVAL_SECONDS:
+                self._fail_requests_of_exited_workers(started)
+                checked_at = time.monotonic()
+
+    def _fail_requests_of_exited_workers(self, started: dict[int, int]) -> None:
+        exited = {worker.pid for worker in self._workers if worker.exitcode is not None}
+        if not exited:
+            return
+        if len(exited) == len(self._workers):
+            # nobody takes the queued requests anymore
+            with self._pending_lock:
+                failed = list(self._pending)
+        else:
+            failed = [request_id for request_id, pid in started.items() if pid in exited]
+        for request_id in failed:
+            started.pop(request_id, None)
+            self._resolve(_Reply(request_id, error=WorkerError(f"worker of request {request_id} exited")))
+        if failed:
+            logger.error('{} of {} workers exited, {} requests failed', len(exited), len(self._workers), len(failed))
+
+    def _resolve(self, reply: _Reply) -> None:
+        with self._pending_lock:
+            pending = self._pending.get(reply.request_id)
+        if pending is None:
+            # the caller stopped waiting, e.g. its task was cancelled
+            return
+        loop, future = pending
+        loop.call_soon_threadsafe(_set_reply, future, reply)
+
+
+class WorkerSession:
+    """Conversation of one user served by the WorkerPool, it has the send_message of the PremierLeagueAgent
+    so it can be admitted by the AdmissionController"""
+
+    def __init__(self, pool: WorkerPool, session_id: str):
+        self._pool = pool
+        self.session_id = session_id
+
+    async def answer_from_cache(self, user_query: str, session_id: str | None = None) -> str | None:
+        """The cached answers live in the workers, so under overload the requests are only queued or shed"""
+        return None
+
+    async def send_message(self, user_message: HumanMessage,
+                           deadline_seconds: float | None = None,
+                           cancellation: CancellationToken | None = None,
+                           session_id: str | None = None) -> tuple[str, AgentState]:
+        """See PremierLeagueAgent.send_message, session_id None means the conversation of this session.
+        A cancelled request isn't waited for, the worker still finishes it"""
+        with request_deadline(deadline_seconds):
+            task = asyncio.ensure_future(self._pool.send_message(session_id or self.session_id, user_message,
+                                                                 remaining_seconds()))
+            if cancellation:
+                cancellation.bind(task)
+            try:
+                return await task
+            except asyncio.CancelledError:
+                current_task = asyncio.current_task()
+                if not cancellation or not cancellation.cancelled or (current_task and current_task.cancelling()):
+                    raise
+                return CANCELLED_ANSWER, AgentState(user_query=str(user_message.content), answer=CANCELLED_ANSWER)
+
+
+def _set_reply(future: asyncio.Future[_Reply], reply: _Reply) -> None:
+    if not future.done():
+        future.set_result(reply)
+
+
+def _run_worker(agent_factory: AgentFactory, store_path: Path, requests: Queue, replies: Queue,
+                concurrency: int) -> None:
+    asyncio.run(_serve(agent_factory(store_path), requests, replies, concurrency))
+
+
+async def _serve(agent: PremierLeagueAgent, requests: Queue, replies: Queue, concurrency: int) -> None:
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    handling: set[asyncio.Task] = set()
+
+    async def handle(request: _Request) -> None:
+        try:
+            deadline_seconds = None if request.deadline_at is None else request.deadline_at - time.time()
+            answer, state = await agent.send_message(HumanMessage(content=request.content),
+                                                     deadline_seconds=deadline_seconds,
+                                                     session_id=request.session_id)
+            replies.put(_Reply(request.request_id, answer=answer, state=state))
+        except Exception as e:
+            logger.exception('worker failed to handle request {}', request.request_id)
+            replies.put(_Reply(request.request_id, error=_picklable(e)))
+        finally:
+            slots.release()
+
+    logger.info('agent worker {} started', os.getpid())
+    while True:
+        # a busy worker doesn't take requests it can't start, they are left to the free workers
+        await slots.acquire()
+        request = await loop.run_in_executor(None, requests.get)
+        if request is None:
+            break
+        replies.put(_Started(request.request_id, os.getpid()))
+        task = asyncio.create_task(handle(request))
+        handling.add(task)
+        task.add_done_callback(handling.discard)
+    await asyncio.gather(*handling)
+
+
+def _picklable(error: Exception) -> Exception:
+    """The error is sent to the caller process, errors which can't be pickled are replaced by RuntimeError"""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
@@ -1,11 +1,32 @@
+import json
 import os
 
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel, Field, SecretStr
 import yaml
 from loguru import logger
 
 DEFUALT_CONFIG_PATH = "config.yaml"
 
+class NodeModelConfig(BaseModel):
+    """Model settings of a single agent node"""
+    
+    MODEL_NAME: str | None = None
+    """ if None, Configuration.MODEL_NAME is used"""
+    MAX_TOKENS: int | None = None
+    """ maximum number of completion tokens, None means no limit"""
+    TIMEOUT_SECONDS: float | None = None
+    """ timeout of a single model request, None means the client default"""
+
+ROUTED_NODE_MODELS: dict[str, NodeModelConfig] = {
+    "Validate": NodeModelConfig(MODEL_NAME="gpt-4.1-nano", MAX_TOKENS=3, TIMEOUT_SECONDS=10),
+    "ExtractTeam": NodeModelConfig(MODEL_NAME="gpt-4.1-mini", MAX_TOKENS=16, TIMEOUT_SECONDS=10),
+    "Clarify": NodeModelConfig(MODEL_NAME="gpt-4.1-mini", MAX_TOKENS=96, TIMEOUT_SECONDS=15),
+    "UserClarify": NodeModelConfig(MODEL_NAME="gpt-4.1-mini", MAX_TOKENS=16, TIMEOUT_SECONDS=10),
+    "FormulateResponse": NodeModelConfig(TIMEOUT_SECONDS=60),
+}
+""" small and fast models with short answers for the classification nodes, MODEL_NAME for the final answer.
+It's opt-in, compare it with the single model on your queries first (python -m tests.evaluate_routing_profiles)"""
+
 class Configuration(BaseModel):
     """Application configuration Check example_config.yaml"""
     
@@ -15,6 +36,30 @@ class Configuration(BaseModel):
     """ avaible levels: trace, debug, info, success, warning, error, critical"""
     LANGRAPH_DEBUG: bool = False
     """ enable langgraph debug"""
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    """ limit of model requests per minute shared by all sessions, it's adapted to 429 responses"""
+    LLM_TOKENS_PER_MINUTE: int = 30_000
+    """ limit of model tokens per minute shared by all sessions, it's adapted to 429 responses"""
+    GRAPH_TOPOLOGY: str = "sequential"
+    """ sequential or parallel, parallel fetches the squad while the query is still being validated"""
+    NODE_MODELS: dict[str, NodeModelConfig] = Field(default_factory=dict)
+    """ model settings per graph node (Validate, ExtractTeam, Clarify, UserClarify, FormulateResponse), 
+    nodes which are not listed use MODEL_NAME, e.g. ROUTED_NODE_MODELS"""
+    REQUEST_TIMEOUT_SECONDS: float | None = 90
+    """ deadline of a single user message, its model and API calls are cancelled after it, None means no limit"""
+    ANSWER_STORE_PATH: str | None = None
+    """ JSON file of the materialized answers (tests/one_time/download_all_teams.py), None disables them"""
+    MAX_IN_FLIGHT_REQUESTS: int = 16
+    """ user messages answered at once, the others wait in the admission queue"""
+    MAX_QUEUED_REQUESTS: int = 64
+    """ user messages waiting in the admission queue, the cached answers skip it when it's half full,
+    the rest is rejected with a busy answer when it's full"""
+    MAX_QUEUED_REQUESTS_PER_USER: int = 2
+    """ user messages of a single session waiting in the admission queue"""
+    WORKERS: int = 0
+    """ number of agent worker processes, 0 runs the agent in the UI process"""
+    SHARED_STORE_PATH: str = "shared_store.sqlite"
+    """ SQLite file of the conversations and squads shared by the workers"""
     
     OPENAI_API_KEY: SecretStr
     """https://platform.openai.com/"""
@@ -26,7 +71,7 @@ class Configuration(BaseModel):
     
     @classmethod
     def load(cls, path: str = DEFUALT_CONFIG_PATH) -> "Configuration":
-        """load configuration from yaml file
+        """load configuration from yaml file, the top-level keys are case-insensitive, e.g. workers or WORKERS
         
         Args:
             path: path to the configuration file
@@ -38,13 +83,25 @@ class Configuration(BaseModel):
         
         try:
             with open(path, "r") as f:
-                return cls(**yaml.safe_load(f))
+                return cls(**{key.upper(): value for key, value in yaml.safe_load(f).items()})
         except Exception as e:
             logger.warning(f"Failed to load config from {path}: {e}. Loading from environment variables.")
             env_vars = {
                 "MODEL_NAME": os.getenv("MODEL_NAME", "gpt-4.1"),
                 "LOGGING_LEVEL": os.getenv("LOGGING_LEVEL", "info"),
                 "LANGRAPH_DEBUG": os.getenv("LANGRAPH_DEBUG", "False") in ("True", "true", "1"),
+                "LLM_REQUESTS_PER_MINUTE": int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+                "LLM_TOKENS_PER_MINUTE": int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000")),
+                "GRAPH_TOPOLOGY": os.getenv("GRAPH_TOPOLOGY", "sequential"),
+                # JSON e.g. {"Validate": {"MODEL_NAME": "gpt-4.1-nano", "MAX_TOKENS": 3}}
+                "NODE_MODELS": json.loads(os.getenv("NODE_MODELS", "{}")),
+                "REQUEST_TIMEOUT_SECONDS": float(os.getenv("REQUEST_TIMEOUT_SECONDS", "90")),
+                "ANSWER_STORE_PATH": os.getenv("ANSWER_STORE_PATH"),
+                "MAX_IN_FLIGHT_REQUESTS": int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "16")),
+                "MAX_QUEUED_REQUESTS": int(os.getenv("MAX_QUEUED_REQUESTS", "64")),
+                "MAX_QUEUED_REQUESTS_PER_USER": int(os.getenv("MAX_QUEUED_REQUESTS_PER_USER", "2")),
+                "WORKERS": int(os.getenv("WORKERS", "0")),
+                "SHARED_STORE_PATH": os.getenv("SHARED_STORE_PATH", "shared_store.sqlite"),
                 "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
                 "THE_SPORT_API_KEY": os.getenv("THE_SPORT_API_KEY"),
             }
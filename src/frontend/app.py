@@ -1,16 +1,29 @@
 import asyncio
+import atexit
+import functools
+from pathlib import Path
+from typing import TYPE_CHECKING
+import uuid
 
 from langchain.globals import set_verbose, set_debug
 from langchain_core.messages import HumanMessage
 import streamlit as st
 
+from src.backend.admission import get_shared_admission_controller
 from src.backend.agent import PremierLeagueAgent
-from src.backend.premier_league_api.sportdb import SportDBApi
 from src.backend.premier_league_api.exceptions import APIError
+from src.backend.workers import WorkerError, build_agent
+from src.frontend.chat_history import ChatHistory, ChatMessage
 from src.utils.logger import setup_logger
 from src.configuration import Configuration
 
+if TYPE_CHECKING:
+    from src.backend.workers import WorkerPool, WorkerSession
+
 _AGENT_SESSION_KEY = "agent"
+_REQUEST_TIMEOUT_SESSION_KEY = "request_timeout_seconds"
+_USER_ID_SESSION_KEY = "user_id"
+_HISTORY_SESSION_KEY = "history"
 
 # TODO extract hardcoded strings to constants
 class ChatUI:
@@ -21,7 +34,7 @@ class ChatUI:
             
     EXAMPLE_MESSAGES: str = 'You can start with "What is the squad of the Manchester United?" or What are defenders of the Manchester United?"'
 
-    def __init__(self, agent: PremierLeagueAgent):
+    def __init__(self, agent: "PremierLeagueAgent | WorkerSession", request_timeout_seconds: float | None = None):
         """Initialize the UI and save agent to session state if not already present
             and prepare initial messages
         """
@@ -30,23 +43,27 @@ class ChatUI:
         if _AGENT_SESSION_KEY not in st.session_state:
             
             st.session_state[_AGENT_SESSION_KEY] = agent
-            st.session_state.messages = [
-                {"role": "assistant", "content": self.WELCOME_MESSAGE},
-                {"role": "assistant", "content": self.EXAMPLE_MESSAGES}
-            ]
+            st.session_state[_REQUEST_TIMEOUT_SESSION_KEY] = request_timeout_seconds
+            st.session_state[_USER_ID_SESSION_KEY] = uuid.uuid4().hex
+            history = ChatHistory()
+            history.append("assistant", self.WELCOME_MESSAGE)
+            history.append("assistant", self.EXAMPLE_MESSAGES)
+            st.session_state[_HISTORY_SESSION_KEY] = history
         
     async def run(self):
         st.title("Premier League Chat")
+        history: ChatHistory = st.session_state[_HISTORY_SESSION_KEY]
 
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+        # only the last page is rendered on every rerun, so long conversations don't slow the UI down
+        if history.hidden_count:
+            st.button(f"Show earlier messages ({history.hidden_count})", on_click=history.show_more)
+        elif history.removed_count:
+            st.caption(f"{history.removed_count} oldest messages were removed from the history")
+        for message in history.visible:
+            self._render_message(history, message)
 
         if prompt := st.chat_input("What is the squad of the Manchester United?"):
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
-            with st.chat_message("user"):
-                st.markdown(prompt)
+            self._render_message(history, history.append("user", prompt))
 
             with st.chat_message("assistant"):
                 message = HumanMessage(content=prompt)
@@ -54,13 +71,33 @@ class ChatUI:
                 with st.spinner("Assitant is searching for the squad..."):
                     response = ""
                     try:
-                        response, _ = await st.session_state.agent.send_message(message)
+                        response = await self._send_message(message)
                     except APIError:
                         response = "Sorry, I cannot connect to the API. Please try again later."
+                    except WorkerError:
+                        response = "Sorry, something went wrong. Please try again later."
                     finally:
                         st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
-    
+                        history.append("assistant", response)
+
+    @staticmethod
+    def _render_message(history: ChatHistory, message: ChatMessage):
+        with st.chat_message(message.role):
+            st.markdown(history.markdown(message))
+            if history.is_collapsed(message):
+                st.button("Show the full message", key=f"expand-{message.id}",
+                          on_click=history.expand, args=(message.id,))
+
+    async def _send_message(self, message: HumanMessage) -> str:
+        agent = st.session_state[_AGENT_SESSION_KEY]
+        # the model and API calls of a slow answer are cancelled, they don't waste the quota
+        deadline_seconds = st.session_state.get(_REQUEST_TIMEOUT_SESSION_KEY)
+        # under overload the session gets a cached or a busy answer instead of waiting for the model,
+        # the worker sessions share the limits of the process too
+        response, _ = await get_shared_admission_controller().send_message(
+            agent, st.session_state[_USER_ID_SESSION_KEY], message, deadline_seconds=deadline_seconds)
+        return response
+
 def main():
     """streamlit run src/frontend/streamlit_app.py"""
     ui = None
@@ -74,15 +111,30 @@ def main():
             set_verbose(True)
             set_debug(True)
             
-        squad_api = SportDBApi(config.THE_SPORT_API_KEY.get_secret_value())
-        agent = PremierLeagueAgent(config.MODEL_NAME, squad_api)
-        ui = ChatUI(agent)
+        # the limits are set by the first session
+        get_shared_admission_controller(config.MAX_IN_FLIGHT_REQUESTS, config.MAX_QUEUED_REQUESTS,
+                                        config.MAX_QUEUED_REQUESTS_PER_USER)
+        # the sessions share the worker processes or the rate limiter of the model calls of this process
+        agent = _get_worker_pool(config).session() if config.WORKERS else build_agent(config)
+        ui = ChatUI(agent, config.REQUEST_TIMEOUT_SECONDS)
         # agnet is saved to session state in PrototypeUI constructor
     else:
         ui = ChatUI(st.session_state[_AGENT_SESSION_KEY])
     
     asyncio.run(ui.run())
 
+
+@st.cache_resource
+def _get_worker_pool(_config: Configuration) -> "WorkerPool":
+    """The workers are started once per Streamlit server and shared by all sessions"""
+    # imported only when the workers are enabled, they need langgraph-checkpoint-sqlite
+    from src.backend.workers import WorkerPool
+    store_path = Path(_config.SHARED_STORE_PATH)
+    agent_factory = functools.partial(build_agent, _config, worker_count=_config.WORKERS)
+    pool = WorkerPool(agent_factory, store_path, _config.WORKERS).start()
+    atexit.register(pool.close)
+    return pool
+
 if __name__ == "__main__":
     main()
     
\ No newline at end of file
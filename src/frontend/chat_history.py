@@ -0,0 +1,92 @@
+from collections import deque
+from dataclasses import dataclass
+
+_MAX_MESSAGES = 200
+""" older messages are removed from the session state """
+_PAGE_SIZE = 10
+""" messages rendered on every rerun, older ones are shown page by page on request """
+_PREVIEW_LINES = 12
+""" long messages outside of the last answer are collapsed to this many lines """
+
+
+@dataclass(frozen=True)
+class ChatMessage:
+    id: int
+    """ unique in the session, used as the key of the message widgets """
+    role: str
+    content: str
+    preview: str | None
+    """ collapsed markdown of a long message, rendered once when the message is added, None for short messages """
+
+
+class ChatHistory:
+    """Bounded chat history kept in the Streamlit session state.
+    Only the last page of the messages is rendered on every rerun and long messages are collapsed to a preview,
+    so the cost of an interaction doesn't grow with the conversation, e.g. with many squad listings.
+    """
+
+    def __init__(self, max_messages: int = _MAX_MESSAGES, page_size: int = _PAGE_SIZE,
+                 preview_lines: int = _PREVIEW_LINES):
+        """
+        Args:
+            max_messages: maximum number of messages kept in the history
+            page_size: number of the latest messages rendered on every rerun
+            preview_lines: number of lines of a collapsed message
+        """
+        self._messages: deque[ChatMessage] = deque(maxlen=max_messages)
+        self._page_size = page_size
+        self._preview_lines = preview_lines
+        self._visible_count = page_size
+        self._expanded: set[int] = set()
+        self._next_id = 0
+        self.removed_count = 0
+        """ number of messages removed from the full history """
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, role: str, content: str) -> ChatMessage:
+        """Add a message, the history is collapsed to the last page again"""
+        if len(self._messages) == self._messages.maxlen:
+            self._expanded.discard(self._messages[0].id)
+            self.removed_count += 1
+        message = ChatMessage(id=self._next_id, role=role, content=content, preview=self._render_preview(content))
+        self._messages.append(message)
+        self._next_id += 1
+        self._visible_count = self._page_size
+        return message
+
+    @property
+    def visible(self) -> list[ChatMessage]:
+        """Messages to render, the oldest first"""
+        start = max(0, len(self._messages) - self._visible_count)
+        return [self._messages[i] for i in range(start, len(self._messages))]
+
+    @property
+    def hidden_count(self) -> int:
+        """Number of older messages which are not rendered"""
+        return max(0, len(self._messages) - self._visible_count)
+
+    def show_more(self) -> None:
+        """Render one more page of the older messages"""
+        self._visible_count += self._page_size
+
+    def expand(self, message_id: int) -> None:
+        """Render the full content of a collapsed message"""
+        self._expanded.add(message_id)
+
+    def markdown(self, message: ChatMessage) -> str:
+        """Markdown of the message to render, the preview if the message is collapsed"""
+        return message.preview if message.preview is not None and self.is_collapsed(message) else message.content
+
+    def is_collapsed(self, message: ChatMessage) -> bool:
+        """Long messages are collapsed, except the last one and the ones expanded by the user"""
+        return (message.preview is not None and message.id not in self._expanded
+                and message.id != self._messages[-1].id)
+
+    def _render_preview(self, content: str) -> str | None:
+        lines = content.splitlines()
+        if len(lines) <= self._preview_lines:
+            return None
+        hidden_lines = len(lines) - self._preview_lines
+        return "\n".join(lines[:self._preview_lines] + ["", f"*... {hidden_lines} more lines*"])
@@ -1,18 +1,41 @@
 from pathlib import Path
+import random
 import sys
 
 from loguru import logger
 
-def setup_logger(level: str = "INFO", file_path: Path | None = None) -> None:
+SAMPLE_RATE_KEY = "sample_rate"
+
+
+def sampled(rate: float):
+    """
+    Logger for high volume events, only the given fraction of its records is written.
+    Args:
+        rate: fraction of the records to write, e.g. 0.1 writes every 10th record on average.
+    """
+    return logger.bind(**{SAMPLE_RATE_KEY: rate})
+
+
+def _sampling_filter(record) -> bool:
+    rate = record["extra"].get(SAMPLE_RATE_KEY)
+    return rate is None or random.random() < rate
+
+
+def setup_logger(level: str = "INFO", file_path: Path | None = None, enqueue: bool = False) -> None:
     """
-    Setup logger to output to console with specified level. 
+    Setup logger to output to console with specified level.
     It's configure to work with streamlit and use loguru.
+    Use loguru formatting in hot paths e.g. logger.debug("squad: {}", squad) instead of f-strings,
+    the message is formatted only if the level is enabled.
     Args:
         level: The logging level (e.g., "INFO", "DEBUG", "WARNING").
         file_path: The path to the log file. If None, logging to file is disabled.
+        enqueue: If True, the records are written by a background thread and logging doesn't block on I/O.
+            Pickling the records costs more than writing them to stdout or a local file,
+            use it only for slow sinks (see tests/benchmarks/logging_overhead.py).
     """
-    logger.remove() 
-    logger.add(sys.stdout, level=level.upper())
+    logger.remove()
+    logger.add(sys.stdout, level=level.upper(), enqueue=enqueue, filter=_sampling_filter)
     if file_path:
         file_path.parent.mkdir(exist_ok=True)
-        logger.add(file_path, level=level.upper())
+        logger.add(file_path, level=level.upper(), enqueue=enqueue, filter=_sampling_filter)
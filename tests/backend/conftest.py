@@ -0,0 +1,44 @@
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+from src.backend.agent import GraphTopology, PremierLeagueAgent
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
+from src.backend.rate_limiter import AdaptiveRateLimiter
+from tests.fakes import FakeChatModel, local_squad_api
+
+
+@pytest.fixture
+def squad_api() -> LocalPremierLeagueApi:
+    return local_squad_api()
+
+
+@pytest.fixture
+def fake_model(squad_api) -> FakeChatModel:
+    return FakeChatModel(teams=squad_api.get_teams())
+
+
+@pytest.fixture
+def rate_limiter() -> AdaptiveRateLimiter:
+    # the fake model has no quota, don't slow the tests down with the default limits
+    return AdaptiveRateLimiter(requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+
+
+@pytest.fixture
+def make_agent(squad_api, fake_model, rate_limiter) -> Callable[..., PremierLeagueAgent]:
+    """Builds agents with the fake model, the keyword arguments are passed to PremierLeagueAgent,
+    e.g. make_agent(answer_store=store)"""
+    def make(**kwargs: Any) -> PremierLeagueAgent:
+        return PremierLeagueAgent("fake-model", squad_api, model=fake_model, rate_limiter=rate_limiter, **kwargs)
+    return make
+
+
+@pytest.fixture
+def agent(make_agent) -> PremierLeagueAgent:
+    return make_agent()
+
+
+@pytest.fixture
+def parallel_agent(make_agent) -> PremierLeagueAgent:
+    return make_agent(topology=GraphTopology.PARALLEL)
@@ -0,0 +1,201 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.backend.admission import BUSY_ANSWER, AdmissionController
+from src.backend.agent import DEADLINE_EXCEEDED_ANSWER, AgentState, PremierLeagueAgent
+
+_MODEL_QUESTION = "Who are the Arsenal players born in 2000?"
+""" needs the model, it's never answered from the cache """
+_CACHED_QUESTION = "Who is the manager of Arsenal?"
+
+
+class GatedAgent(PremierLeagueAgent):
+    """Agent whose admitted requests wait until the test opens the gate, so the tests don't depend on timing"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = asyncio.Event()
+
+    async def send_message(self, user_message: HumanMessage, *args, **kwargs) -> tuple[str, AgentState]:
+        await self.gate.wait()
+        return await super().send_message(user_message, *args, **kwargs)
+
+
+@pytest.fixture
+def gated_agent(squad_api, fake_model, rate_limiter) -> GatedAgent:
+    return GatedAgent("fake-model", squad_api, model=fake_model, rate_limiter=rate_limiter)
+
+
+async def _warm_up(agent: GatedAgent) -> None:
+    """ the squad of Arsenal is cached by the first question """
+    agent.gate.set()
+    await agent.send_message(HumanMessage(content=_MODEL_QUESTION), session_id="warm-up")
+    agent.gate.clear()
+
+
+async def _until(condition: Callable[[], bool]) -> None:
+    """ let the started requests run until the condition holds, e.g. until they are queued """
+    while not condition():
+        await asyncio.sleep(0)
+
+
+async def _send(controller: AdmissionController, agent: PremierLeagueAgent, user_id: str, query: str,
+                session_id: str, deadline_seconds: float | None = None) -> str:
+    answer, _ = await controller.send_message(agent, user_id, HumanMessage(content=query),
+                                              deadline_seconds=deadline_seconds, session_id=session_id)
+    return answer
+
+
+@pytest.mark.asyncio
+async def test_requests_over_capacity_wait_in_queue(gated_agent):
+    controller = AdmissionController(max_in_flight=2, max_queued=4)
+
+    requests = [asyncio.create_task(_send(controller, gated_agent, f"user-{i}", _MODEL_QUESTION, f"session-{i}"))
+                for i in range(4)]
+    await _until(lambda: controller.stats().queue_depth == 2)
+    gated_agent.gate.set()
+    answers = await asyncio.gather(*requests)
+
+    assert all(answer.startswith("Squad answer:") for answer in answers)
+    stats = controller.stats()
+    assert stats.admitted_count == 4
+    assert stats.max_queue_depth == 2
+    assert stats.in_flight == stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_is_round_robin_between_users(gated_agent):
+    controller = AdmissionController(max_in_flight=1, max_queued=10, max_queued_per_user=10)
+    finished: list[str] = []
+
+    async def send(user_id: str, request: int):
+        await _send(controller, gated_agent, user_id, _MODEL_QUESTION, f"{user_id}-{request}")
+        finished.append(f"{user_id}-{request}")
+
+    flooding = [asyncio.create_task(send("flooding", request)) for request in range(4)]
+    await _until(lambda: controller.stats().queue_depth == 3)
+    other = asyncio.create_task(send("other", 0))
+    await _until(lambda: controller.stats().queue_depth == 4)
+    gated_agent.gate.set()
+    await asyncio.gather(*flooding, other)
+
+    # FIFO would serve the other user last
+    assert finished.index("other-0") == 2
+
+
+@pytest.mark.asyncio
+async def test_overload_serves_cached_answers_then_sheds(gated_agent):
+    controller = AdmissionController(max_in_flight=1, max_queued=2, degrade_queue_depth=0)
+    await _warm_up(gated_agent)
+
+    in_flight = asyncio.create_task(_send(controller, gated_agent, "user-1", _MODEL_QUESTION, "session-1"))
+    await _until(lambda: controller.stats().in_flight == 1)
+    queued = asyncio.create_task(_send(controller, gated_agent, "user-2", _MODEL_QUESTION, "session-2"))
+    await _until(lambda: controller.stats().queue_depth == 1)
+    cached = await _send(controller, gated_agent, "user-3", _CACHED_QUESTION, "session-3")
+    queued_last = asyncio.create_task(_send(controller, gated_agent, "user-4", _MODEL_QUESTION, "session-4"))
+    await _until(lambda: controller.stats().queue_depth == 2)
+    shed = await _send(controller, gated_agent, "user-5", _MODEL_QUESTION, "session-5")
+    gated_agent.gate.set()
+
+    assert cached == "The manager of Arsenal is Mikel Arteta."
+    assert shed == BUSY_ANSWER
+    assert all(answer.startswith("Squad answer:") for answer in await asyncio.gather(in_flight, queued, queued_last))
+    stats = controller.stats()
+    assert (stats.admitted_count, stats.cached_count, stats.shed_count) == (3, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_cached_answer_is_context_of_follow_up(agent):
+    await agent.send_message(HumanMessage(content=_MODEL_QUESTION), session_id="warm-up")
+    await agent.send_message(HumanMessage(content="What is the squad of Chelsea?"), session_id="user-1")
+    # nothing is admitted, only the cached answers are served
+    overloaded = AdmissionController(max_in_flight=0, max_queued=0)
+
+    cached = await _send(overloaded, agent, "user-1", _CACHED_QUESTION, "user-1")
+    _, state = await agent.send_message(HumanMessage(content="And who are their defenders?"), session_id="user-1")
+
+    assert cached == "The manager of Arsenal is Mikel Arteta."
+    assert state.success
+    assert state.team_name == "arsenal"
+
+
+@pytest.mark.asyncio
+async def test_pending_clarification_is_not_answered_from_cache(agent):
+    await agent.send_message(HumanMessage(content=_MODEL_QUESTION), session_id="warm-up")
+    await agent.send_message(HumanMessage(content="What is the squad of Crystal?"), session_id="user-1")
+    overloaded = AdmissionController(max_in_flight=0, max_queued=0)
+
+    answer = await _send(overloaded, agent, "user-1", _CACHED_QUESTION, "user-1")
+    _, state = await agent.send_message(HumanMessage(content="yes"), session_id="user-1")
+
+    assert answer == BUSY_ANSWER
+    assert state.team_name == "crystal palace"
+
+
+@pytest.mark.asyncio
+async def test_user_over_queue_limit_is_shed(gated_agent):
+    controller = AdmissionController(max_in_flight=1, max_queued=10, max_queued_per_user=1)
+
+    requests = [asyncio.create_task(_send(controller, gated_agent, "user", _MODEL_QUESTION, f"session-{i}"))
+                for i in range(3)]
+    await _until(lambda: controller.stats().shed_count == 1)
+    gated_agent.gate.set()
+    answers = await asyncio.gather(*requests)
+
+    assert answers.count(BUSY_ANSWER) == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_passes_in_queue(gated_agent):
+    controller = AdmissionController(max_in_flight=1, max_queued=10)
+
+    in_flight = asyncio.create_task(_send(controller, gated_agent, "user-1", _MODEL_QUESTION, "session-1"))
+    await _until(lambda: controller.stats().in_flight == 1)
+    # the gate is closed, the request can't leave the queue before its deadline
+    answer = await _send(controller, gated_agent, "user-2", _MODEL_QUESTION, "session-2", deadline_seconds=0.01)
+    gated_agent.gate.set()
+    await in_flight
+
+    assert answer == DEADLINE_EXCEEDED_ANSWER
+    stats = controller.stats()
+    assert stats.in_flight == stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_load_past_saturation(gated_agent):
+    """200 requests of 50 users at once, 8 times more than the controller admits.
+    Only max_in_flight requests reach the agent, the cached questions are answered and the rest is shed.
+    The latency of the shed requests is measured by tests/benchmarks/admission_load.py."""
+    max_in_flight = 4
+    controller = AdmissionController(max_in_flight=max_in_flight, max_queued=16, max_queued_per_user=1)
+    await _warm_up(gated_agent)
+    in_flight_samples: list[int] = []
+
+    async def send(request: int) -> str:
+        query = _CACHED_QUESTION if request % 2 else _MODEL_QUESTION
+        answer = await _send(controller, gated_agent, f"user-{request % 50}", query, f"session-{request}")
+        in_flight_samples.append(controller.stats().in_flight)
+        return answer
+
+    requests = [asyncio.create_task(send(request)) for request in range(200)]
+
+    def all_handled() -> bool:
+        stats = controller.stats()
+        return stats.in_flight + stats.queue_depth + stats.cached_count + stats.shed_count == 200
+
+    await _until(all_handled)
+    gated_agent.gate.set()
+    answers = await asyncio.gather(*requests)
+
+    stats = controller.stats()
+    assert len(answers) == 200
+    assert stats.shed_count > 0
+    assert stats.cached_count > 0
+    assert stats.admitted_count + stats.cached_count + stats.shed_count == 200
+    assert stats.max_queue_depth == 16
+    assert max(in_flight_samples) <= max_in_flight
+    assert stats.in_flight == stats.queue_depth == 0
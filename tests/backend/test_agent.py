@@ -0,0 +1,242 @@
+import threading
+import time
+from typing import cast
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from src.backend.agent import (CANCELLED_ANSWER, DEADLINE_EXCEEDED_ANSWER, AgentNode, GraphTopology,
+                               PremierLeagueAgent)
+from src.backend.request_context import CancellationToken
+from src.configuration import NodeModelConfig
+
+
+@pytest.mark.asyncio
+async def test_send_message_answers_squad_question(agent):
+    """A valid question about a known team is answered from the squad."""
+    answer, state = await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    assert state.success
+    assert state.team_name == "arsenal"
+    assert answer.startswith("Squad answer:")
+
+
+@pytest.mark.asyncio
+async def test_state_keeps_only_squad_reference(agent):
+    """The checkpointed state stores the user query as a string and a squad version instead of the squad."""
+    _, state = await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    assert isinstance(state.user_query, str)
+    assert state.squad_version is not None
+    assert not hasattr(state, "squad")
+
+
+@pytest.mark.asyncio
+async def test_irrelevant_question_is_rejected(agent):
+    answer, state = await agent.send_message(HumanMessage(content="How are you?"))
+
+    assert not state.success
+    assert answer.startswith("I cannot help you with that")
+
+
+@pytest.mark.asyncio
+async def test_answer_batch_deduplicates_and_groups_queries(agent, fake_model, squad_api):
+    """Identical queries are answered once and every squad is fetched once per batch."""
+    fetched_teams = []
+    get_team_squad = squad_api.get_team_squad
+
+    async def counting_get_team_squad(team_name):
+        fetched_teams.append(team_name)
+        return await get_team_squad(team_name)
+
+    squad_api.get_team_squad = counting_get_team_squad
+    queries = [
+        "What is the squad of Arsenal?",
+        "What is the squad of Arsenal?",
+        "Who are the defenders of Arsenal?",
+        "What is the squad of Chelsea?",
+        "How are you?",
+    ]
+
+    answers = [answer async for answer in agent.answer_batch(queries, max_concurrency=2)]
+
+    assert sorted(answer.query for answer in answers) == sorted(set(queries))
+    assert sorted(fetched_teams) == ["arsenal", "chelsea"]
+    by_query = {answer.query: answer for answer in answers}
+    assert by_query["What is the squad of Chelsea?"].success
+    assert not by_query["How are you?"].success
+    # validations are decided locally, 3 extractions and 3 answers
+    assert len(fake_model.prompts) == 6
+
+
+@pytest.mark.asyncio
+async def test_clear_queries_skip_validation_model_call(agent, fake_model):
+    await agent.send_message(HumanMessage(content="How are you?"))
+    await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    assert not any("Answer only YES or NO" in prompt for prompt in fake_model.prompts)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, clarification_response, expected_team", [
+    ("What is the squad of Manshesterr?", "2", "manchester city"),
+    ("What is the squad of Crystal?", "yes", "crystal palace"),
+    ("What is the squad of Man?", "United", "manchester united"),
+])
+async def test_clarification_is_resolved_locally(agent, fake_model, query, clarification_response, expected_team):
+    """The clarification request and the user confirmation don't need a model call."""
+    clarification_request, state = await agent.send_message(HumanMessage(content=query))
+    assert expected_team in clarification_request
+    assert state.clarification_candidates
+
+    prompts_before = len(fake_model.prompts)
+    _, state = await agent.send_message(HumanMessage(content=clarification_response))
+
+    assert state.success
+    assert state.team_name == expected_team
+    # only the final answer was formulated by the model
+    assert len(fake_model.prompts) == prompts_before + 1
+    assert not any("clarification" in prompt for prompt in fake_model.prompts)
+
+
+@pytest.mark.asyncio
+async def test_rejected_clarification_finishes_the_flow(agent):
+    await agent.send_message(HumanMessage(content="What is the squad of Crystal?"))
+
+    answer, state = await agent.send_message(HumanMessage(content="no"))
+
+    assert not state.success
+    assert answer == "Sorry, I could not find the team you were asking about."
+
+
+@pytest.mark.asyncio
+async def test_parallel_topology_prefetches_squad(parallel_agent, fake_model):
+    answer, state = await parallel_agent.send_message(HumanMessage(content="Tell me about Arsenal"))
+
+    assert state.success
+    assert state.squad_version is not None
+    assert answer.startswith("Squad answer:")
+    # validation and extraction ran in parallel, GetSquad was skipped
+    assert len(fake_model.prompts) == 3
+
+
+@pytest.mark.asyncio
+async def test_parallel_topology_discards_speculative_work(parallel_agent, fake_model):
+    """The extraction runs before the validation finishes, its result is dropped for invalid queries."""
+    query = "Is Arsenal a nice club to visit?"
+    fake_model.invalid_queries.append(query)
+    answer, state = await parallel_agent.send_message(HumanMessage(content=query))
+
+    assert not state.valid
+    assert state.team_name is None
+    assert state.squad_version is None
+    assert answer.startswith("I cannot help you with that")
+
+
+@pytest.mark.asyncio
+async def test_parallel_topology_asks_for_clarification(parallel_agent):
+    clarification_request, _ = await parallel_agent.send_message(HumanMessage(content="What is the squad of Crystal?"))
+    _, state = await parallel_agent.send_message(HumanMessage(content="yes"))
+
+    assert "crystal palace" in clarification_request
+    assert state.success
+
+
+def test_node_models_share_clients(squad_api, rate_limiter, monkeypatch):
+    """Nodes with the same settings share a client, classification nodes get their own small models."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    node_models = {
+        "Validate": NodeModelConfig(MODEL_NAME="gpt-4.1-nano", MAX_TOKENS=3),
+        "ExtractTeam": NodeModelConfig(MODEL_NAME="gpt-4.1-nano", MAX_TOKENS=3),
+    }
+    agent = PremierLeagueAgent("gpt-4.1", squad_api, rate_limiter=rate_limiter, node_models=node_models)
+
+    validate_model = cast(ChatOpenAI, agent._models[AgentNode.VALIDATE])
+    assert validate_model is agent._models[AgentNode.EXTRACT_TEAM]
+    assert validate_model.model_name == "gpt-4.1-nano"
+    assert validate_model.max_tokens == 3
+    assert cast(ChatOpenAI, agent._models[AgentNode.FORMULATE_RESPONSE]).model_name == "gpt-4.1"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("topology", list(GraphTopology))
+async def test_follow_up_reuses_previous_team(make_agent, fake_model, topology):
+    """A follow-up question without a team name is answered about the previous team with a single model call."""
+    agent = make_agent(topology=topology)
+    await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    prompts_before = len(fake_model.prompts)
+    _, state = await agent.send_message(HumanMessage(content="And who are their defenders?"))
+
+    assert state.success
+    assert state.team_name == "arsenal"
+    assert len(fake_model.prompts) == prompts_before + 1
+    assert "football squad expert" in fake_model.prompts[-1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["How many goalkeepers does the team have?", "Who is the oldest player in their team?"])
+async def test_team_question_is_follow_up_not_league_question(agent, query):
+    await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    _, state = await agent.send_message(HumanMessage(content=query))
+
+    assert not state.league_question
+    assert state.team_name == "arsenal"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["And how are you?", "who are the players of real madrid?"])
+async def test_not_follow_up_is_validated(agent, query):
+    await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    _, state = await agent.send_message(HumanMessage(content=query))
+
+    assert not state.success
+    assert state.team_name != "arsenal"
+
+
+@pytest.mark.asyncio
+async def test_new_team_is_not_a_follow_up(agent):
+    await agent.send_message(HumanMessage(content="What is the squad of Arsenal?"))
+
+    _, state = await agent.send_message(HumanMessage(content="Who are the defenders of Chelsea?"))
+    assert state.team_name == "chelsea"
+
+    _, state = await agent.send_message(HumanMessage(content="How are you?"))
+    assert not state.valid
+    assert state.last_team_name == "chelsea"
+
+
+@pytest.mark.asyncio
+async def test_deadline_stops_request_and_next_message_starts_new_query(agent, fake_model):
+    fake_model.latency_seconds = 5.0
+    start = time.perf_counter()
+
+    answer, _ = await agent.send_message(HumanMessage(content="Who are the youngest Arsenal players?"),
+                                         deadline_seconds=0.2)
+
+    assert answer == DEADLINE_EXCEEDED_ANSWER
+    assert time.perf_counter() - start < 1.0
+    fake_model.latency_seconds = 0.0
+    answer, state = await agent.send_message(HumanMessage(content="What is the squad of Chelsea?"))
+    assert state.success
+    assert state.team_name == "chelsea"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_clarification_stays_pending(agent, fake_model):
+    await agent.send_message(HumanMessage(content="What is the squad of Manshesterr?"))
+    fake_model.latency_seconds = 5.0
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel).start()
+
+    # not resolved locally, the model is asked to interpret it
+    answer, _ = await agent.send_message(HumanMessage(content="the one with Haaland"), cancellation=token)
+
+    assert answer == CANCELLED_ANSWER
+    fake_model.latency_seconds = 0.0
+    answer, state = await agent.send_message(HumanMessage(content="2"))
+    assert state.success
+    assert state.team_name == "manchester city"
@@ -0,0 +1,104 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.backend.agent import PremierLeagueAgent
+from src.backend.answer_store import AnswerStore, AnswerTemplate, match_template, materialize_answers
+
+
+@pytest.fixture
+def answer_store(squad_api) -> AnswerStore:
+    store = AnswerStore()
+    asyncio.run(materialize_answers(squad_api, store, version=squad_api.get_squads_version()))
+    return store
+
+
+@pytest.fixture
+def materialized_agent(make_agent, answer_store) -> PremierLeagueAgent:
+    return make_agent(answer_store=answer_store)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What is the squad of Arsenal?", (AnswerTemplate.SQUAD, "arsenal")),
+    ("Please list all the current senior squad members for the Manchester United men's team",
+     (AnswerTemplate.SQUAD, "manchester united")),
+    ("Who are the defenders of Arsenal?", (AnswerTemplate.DEFENDERS, "arsenal")),
+    ("Who is the manager of Man City?", (AnswerTemplate.MANAGER, "manchester city")),
+    ("Who is the oldest player in Spurs?", (AnswerTemplate.OLDEST, "tottenham hotspur")),
+    ("How many players does Liverpool have?", (AnswerTemplate.PLAYER_COUNT, "liverpool")),
+])
+def test_match_template(squad_api, query, expected):
+    assert match_template(query, squad_api.get_teams()) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "Who are the defenders of Arsenal born after 2000?",
+    "Who are the defenders and midfielders of Arsenal?",
+    "What is the average age of Arsenal players?",
+    "Compare the squads of Arsenal and Chelsea",
+    "Arsenal",
+])
+def test_not_template_question(squad_api, query):
+    assert match_template(query, squad_api.get_teams()) is None
+
+
+def test_materialization_is_skipped_for_the_same_version(squad_api, answer_store):
+    assert not asyncio.run(materialize_answers(squad_api, answer_store, version=squad_api.get_squads_version()))
+    assert asyncio.run(materialize_answers(squad_api, answer_store, version=2))
+    assert answer_store.version == 2
+
+
+def test_store_file_is_reloaded_after_materialization(squad_api, tmp_path: Path):
+    path = tmp_path / "answers.json"
+    reader = AnswerStore(path)
+    assert reader.get("arsenal", AnswerTemplate.MANAGER) is None
+
+    asyncio.run(materialize_answers(squad_api, AnswerStore(path), version=3))
+
+    assert reader.version == 3
+    assert reader.get("arsenal", AnswerTemplate.MANAGER) == "The manager of Arsenal is Mikel Arteta."
+
+
+@pytest.mark.asyncio
+async def test_agent_serves_materialized_answer_without_model(materialized_agent, fake_model):
+    answer, state = await materialized_agent.send_message(HumanMessage(content="Who is the manager of Arsenal?"))
+
+    assert state.success
+    assert answer == "The manager of Arsenal is Mikel Arteta."
+    assert fake_model.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_answers_of_other_squads_are_not_served(squad_api, fake_model, make_agent):
+    stale_store = AnswerStore()
+    await materialize_answers(squad_api, stale_store, version=squad_api.get_squads_version() + 1)
+    agent = make_agent(answer_store=stale_store)
+
+    _, state = await agent.send_message(HumanMessage(content="Who is the manager of Arsenal?"))
+
+    assert state.success
+    assert fake_model.prompts
+
+
+@pytest.mark.asyncio
+async def test_answers_are_not_served_without_squads_version(squad_api, fake_model, materialized_agent):
+    # e.g. a live API, it can't prove the squads are the ones the answers were rendered from
+    squad_api.get_squads_version = lambda: None
+
+    _, state = await materialized_agent.send_message(HumanMessage(content="Who is the manager of Arsenal?"))
+
+    assert state.success
+    assert fake_model.prompts
+
+
+@pytest.mark.asyncio
+async def test_follow_up_after_materialized_answer_fetches_squad(materialized_agent, fake_model):
+    await materialized_agent.send_message(HumanMessage(content="Who is the manager of Arsenal?"))
+
+    answer, state = await materialized_agent.send_message(HumanMessage(content="And who are their players born in 2000?"))
+
+    assert state.success
+    assert state.team_name == "arsenal"
+    assert answer.startswith("Squad answer:")
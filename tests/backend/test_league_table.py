@@ -0,0 +1,86 @@
+import asyncio
+from datetime import date
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.backend.league_table import LeagueMetric, LeagueQuestion, LeagueTable, parse_league_question
+from src.backend.squad import Player, PlayersGroup, Squad
+
+_TODAY = date(2025, 10, 1)
+
+
+@pytest.fixture
+def teams(squad_api) -> list[str]:
+    return squad_api.get_teams()
+
+
+@pytest.fixture
+def league_table(squad_api, teams) -> LeagueTable:
+    return LeagueTable([asyncio.run(squad_api.get_team_squad(team)) for team in teams])
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Which clubs have the most goalkeepers?", LeagueQuestion(LeagueMetric.PLAYER_COUNT, PlayersGroup.Goalkeepers)),
+    ("Which club has the fewest defenders?",
+     LeagueQuestion(LeagueMetric.PLAYER_COUNT, PlayersGroup.Defenders, ascending=True)),
+    ("Average squad age per club", LeagueQuestion(LeagueMetric.AVERAGE_AGE)),
+    ("Which team has the youngest squad?", LeagueQuestion(LeagueMetric.AVERAGE_AGE, ascending=True)),
+    ("What is the age distribution of forwards across the league?",
+     LeagueQuestion(LeagueMetric.AGE_DISTRIBUTION, PlayersGroup.Forwards)),
+    ("Who is the youngest player in the league?", LeagueQuestion(LeagueMetric.YOUNGEST)),
+    ("Who are the oldest managers in the Premier League?", LeagueQuestion(LeagueMetric.OLDEST, PlayersGroup.Manager)),
+])
+def test_parse_league_question(teams, query, expected):
+    assert parse_league_question(query, teams) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "What is the squad of Arsenal?",
+    "How many goalkeepers does the Chelsea team have?",
+    "Who is the youngest player?",
+    "Which team is the best?",
+    "Who is the oldest player in their team?",
+    "How many goalkeepers does the team have?",
+    "And how many defenders does the club have?",
+    "What is the average age of players in Serie A teams?",
+    "How many players in the Premier League were born after 2000?",
+    "Which club has the most defenders over 30?",
+    "Which team has the most English players?",
+    "Who are the youngest players of Real Madrid and Barcelona teams?",
+])
+def test_not_league_question(teams, query):
+    assert parse_league_question(query, teams) is None
+
+
+def test_average_age_matches_python(league_table, squad_api):
+    squad = asyncio.run(squad_api.get_team_squad("arsenal"))
+    ages = [(_TODAY - player.date_of_birth).days / 365.2425 for player in squad.players
+            if player.position != "Manager" and player.date_of_birth]
+
+    assert league_table.average_age(_TODAY)["arsenal"] == pytest.approx(sum(ages) / len(ages))
+
+
+def test_aggregates_skip_unknown_dates_and_managers():
+    squads = [
+        Squad(name="a", players=[Player(name="Keeper", date_of_birth=date(2000, 10, 1), position="Goalkeeper"),
+                                 Player(name="Unknown", date_of_birth=None, position="Goalkeeper"),
+                                 Player(name="Boss", date_of_birth=date(1960, 1, 1), position="Manager")]),
+        Squad(name="b", players=[Player(name="Striker", date_of_birth=date(2005, 10, 1), position="Centre-Forward")]),
+    ]
+    table = LeagueTable(squads)
+
+    assert table.player_count(PlayersGroup.Goalkeepers) == {"a": 2, "b": 0}
+    assert table.average_age(_TODAY) == {"a": pytest.approx(25, abs=0.01), "b": pytest.approx(20, abs=0.01)}
+    assert table.age_distribution(_TODAY)["under 21"] == 1
+    assert [name for name, _, _ in table.extreme_ages(_TODAY, limit=1)] == ["Striker"]
+    assert [name for name, _, _ in table.extreme_ages(_TODAY, youngest=False, limit=1)] == ["Keeper"]
+
+
+@pytest.mark.asyncio
+async def test_agent_answers_league_question_without_model(agent, fake_model):
+    answer, state = await agent.send_message(HumanMessage(content="Which clubs have the most goalkeepers?"))
+
+    assert state.success
+    assert answer.startswith("**Number of goalkeepers per club**")
+    assert fake_model.prompts == []
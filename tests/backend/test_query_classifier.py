@@ -0,0 +1,51 @@
+import pytest
+
+from src.backend.query_classifier import QueryDecision, QueryPreClassifier
+from tests.evaluate_pre_classifier import IRRELEVANT_QUERIES, RELEVANT_QUERIES
+
+
+@pytest.fixture
+def classifier(squad_api) -> QueryPreClassifier:
+    return QueryPreClassifier(squad_api.get_teams())
+
+
+@pytest.mark.parametrize("query", RELEVANT_QUERIES)
+def test_relevant_queries_are_never_rejected(classifier, query):
+    assert classifier.classify(query) != QueryDecision.IRRELEVANT
+
+
+@pytest.mark.parametrize("query", IRRELEVANT_QUERIES)
+def test_irrelevant_queries_are_never_accepted(classifier, query):
+    assert classifier.classify(query) != QueryDecision.RELEVANT
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What is the squad of Man City?", QueryDecision.RELEVANT),
+    ("Who are the defenders of Spurs?", QueryDecision.RELEVANT),
+    ("How are you?", QueryDecision.IRRELEVANT),
+    ("My name is John.", QueryDecision.IRRELEVANT),
+    ("What is the squad of Manshesterr?", QueryDecision.UNSURE),
+    ("Tell me about Arsenl", QueryDecision.UNSURE),
+])
+def test_confident_decisions(classifier, query, expected):
+    assert classifier.classify(query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("And who are their defenders?", True),
+    ("Who is the manager?", True),
+    ("What about the goalkeepers?", True),
+    ("How are you?", False),
+    ("Who are the defenders of Chelsea?", False),
+    ("Please tell me the squad of the Chico Bulls", False),
+    ("What is the squad of Man?", False),
+    ("And how are you?", False),
+    ("who are the players of real madrid?", False),
+    ("Who plays for barcelona?", False),
+    ("what about the real madrid squad?", False),
+    ("who are the bayern players?", False),
+    ("Who is the oldest player in their team?", True),
+    ("Which players were born in 2000?", True),
+])
+def test_is_follow_up(classifier, query, expected):
+    assert classifier.is_follow_up(query) == expected
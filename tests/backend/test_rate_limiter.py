@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+from src.backend.rate_limiter import AdaptiveRateLimiter, Priority, background_traffic
+from tests.fakes import QuotaChatModel
+
+
+@pytest.mark.asyncio
+async def test_requests_are_paced():
+    """With 600 requests per minute and no burst, 6 calls take at least half a second."""
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000, burst_seconds=0.1)
+
+    async def call():
+        return await limiter.call(lambda: asyncio.sleep(0), estimated_tokens=10)
+
+    start = time.monotonic()
+    await asyncio.gather(*[call() for _ in range(6)])
+
+    assert time.monotonic() - start >= 0.45
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_limited():
+    """A call larger than the remaining tokens waits for the bucket refill."""
+    limiter = AdaptiveRateLimiter(requests_per_minute=60_000, tokens_per_minute=6_000, burst_seconds=1)
+
+    start = time.monotonic()
+    await limiter.call(lambda: asyncio.sleep(0), estimated_tokens=100)
+    await limiter.call(lambda: asyncio.sleep(0), estimated_tokens=50)
+
+    assert time.monotonic() - start >= 0.45
+
+
+@pytest.mark.asyncio
+async def test_high_priority_is_served_first():
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000, burst_seconds=0.1)
+    served = []
+
+    async def call(name, priority):
+        async def record():
+            served.append(name)
+        await limiter.call(record, estimated_tokens=10, priority=priority)
+
+    async def background_call(name):
+        with background_traffic():
+            await call(name, Priority.HIGH)
+
+    # the first call takes the only burst token, the rest waits in the queue
+    first = asyncio.create_task(call("first", Priority.NORMAL))
+    low = [asyncio.create_task(background_call(f"low-{i}")) for i in range(3)]
+    await asyncio.sleep(0.01)
+    high = asyncio.create_task(call("high", Priority.HIGH))
+    await asyncio.gather(first, high, *low)
+
+    assert served[:2] == ["first", "high"]
+
+
+@pytest.mark.asyncio
+async def test_rate_adapts_to_429_responses(squad_api):
+    """The limiter allows more than the fake server quota, it backs off after 429s and all calls succeed."""
+    model = QuotaChatModel(teams=squad_api.get_teams(), max_requests=5, window_seconds=0.5)
+    limiter = AdaptiveRateLimiter(requests_per_minute=6_000, tokens_per_minute=10_000_000,
+                                  burst_seconds=0.1, max_retries=10)
+
+    async def call():
+        return await limiter.call(lambda: model.ainvoke("hello"), estimated_tokens=10)
+
+    responses = await asyncio.gather(*[call() for _ in range(20)])
+
+    assert len(responses) == 20
+    assert model.rejected == limiter.rate_limited_count
+    assert 0 < model.rejected < 20
+    assert limiter.rate_fraction < 1.0
@@ -1,9 +1,14 @@
+from datetime import date
+
 import pytest
 
 from src.configuration import Configuration
 
+from src.backend.premier_league_api.decoder import decode_squad
 from src.backend.premier_league_api.sportdb import SportDBApi
 from src.backend.premier_league_api.exceptions import APIError, TeamNotFound
+from src.backend.request_context import DeadlineExceeded, request_deadline
+from src.backend.squad import Player, Squad
 
 _SKIP_INTEGRATION_TEST = True
 """Turn the integration tests manually"""
@@ -51,5 +56,48 @@ async def test_get_team_squad_api_error():
         await api.get_team_squad("manchester united")
 
 
+
+@pytest.mark.asyncio
+async def test_get_team_squad_after_deadline():
+    """No request is sent when the request deadline already passed."""
+    api = SportDBApi(api_key="wrong key")
+
+    with request_deadline(0), pytest.raises(DeadlineExceeded):
+        await api.get_team_squad("manchester united")
+
+def test_decode_squad_reads_needed_fields():
+    """The decoded squad is the same as the validated one, the other fields of the response are ignored."""
+    content = (b'{"list": [{"idPlayer": "1", "strPlayer": "Andre Onana", "dateBorn": "1996-04-02", '
+               b'"strPosition": "Goalkeeper", "strDescriptionEN": "Long description", "intLoved": null}]}')
+
+    squad = decode_squad("manchester united", content)
+
+    expected = Squad(name="manchester united",
+                     players=[Player(name="Andre Onana", date_of_birth=date(1996, 4, 2), position="Goalkeeper")])
+    assert squad == expected
+
+
+@pytest.mark.parametrize("date_born", ['""', "null", '"0000-00-00"'])
+def test_decode_squad_missing_date_of_birth(date_born):
+    """Players without a known date of birth are kept with an empty date instead of failing the whole squad."""
+    content = f'{{"list": [{{"strPlayer": "Young Player", "dateBorn": {date_born}, "strPosition": "Defender"}}]}}'
+
+    squad = decode_squad("arsenal", content.encode())
+
+    assert squad.players == [Player(name="Young Player", date_of_birth=None, position="Defender")]
+
+
+@pytest.mark.parametrize("content", [b'{"list": null}', b'{"message": "No data found"}'])
+def test_decode_squad_without_players(content):
+    assert decode_squad("arsenal", content).players == []
+
+
+@pytest.mark.parametrize("content", [b"<html>Service Unavailable</html>", b'[]', b'{"list": [{"strPlayer": null}]}',
+                                     b'{"list": [{"strPlayer": "Player", "dateBorn": "2000-13-45", "strPosition": "Defender"}]}'])
+def test_decode_squad_invalid_response(content):
+    with pytest.raises(APIError):
+        decode_squad("arsenal", content)
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
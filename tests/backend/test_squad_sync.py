@@ -0,0 +1,164 @@
+from collections.abc import Iterator
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import threading
+from typing import Any
+
+import pytest
+
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
+from src.backend.premier_league_api.sportdb import SportDBApi
+from src.backend.squad_cache import SquadCache
+from src.backend.squad_sync import SquadSync, read_squads_version, state_path_for
+
+
+class StubSportDB:
+    """Local HTTP stub of TheSportsDB list/players endpoint supporting ETags"""
+
+    def __init__(self, teams: dict[str, str]):
+        """
+        Args:
+            teams: team id -> player name, every team has one player
+        """
+        self.players = dict(teams)
+        self.send_etags = True
+        self.requests: list[tuple[str, str | None]] = []
+        """ (team id, If-None-Match header) """
+
+    def etag(self, team_id: str) -> str:
+        return f'"{team_id}-{self.players[team_id]}"'
+
+    def body(self, team_id: str) -> bytes:
+        player = {"strPlayer": self.players[team_id], "dateBorn": "2000-01-01", "strPosition": "Goalkeeper",
+                  "intLoved": None}
+        return json.dumps({"list": [player]}).encode()
+
+
+@pytest.fixture
+def stub() -> Iterator[tuple[StubSportDB, str]]:
+    teams = {team_id: f"Player {team_id}" for team_id in SportDBApi._PREMIERE_LEAGUE_TEAMS_TO_ID.values()}
+    stub = StubSportDB(teams)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            team_id = self.path.rsplit("/", 1)[-1]
+            if_none_match = self.headers.get("If-None-Match")
+            stub.requests.append((team_id, if_none_match))
+            if stub.send_etags and if_none_match == stub.etag(team_id):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.end_headers()
+                return
+            body = stub.body(team_id)
+            self.send_response(HTTPStatus.OK)
+            if stub.send_etags:
+                self.send_header("ETag", stub.etag(team_id))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield stub, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def squads_path(tmp_path: Path) -> Path:
+    return tmp_path / "squads.json"
+
+
+def _sync(base_url: str, squads_path: Path) -> SquadSync:
+    return SquadSync(SportDBApi(api_key="test", base_url=base_url, max_retries=0), squads_path)
+
+
+@pytest.mark.asyncio
+async def test_first_sync_downloads_all_teams(stub, squads_path):
+    _, base_url = stub
+
+    result = await _sync(base_url, squads_path).sync()
+
+    assert len(result.changed) == 20
+    assert result.version == 1 == read_squads_version(squads_path)
+    squad = await LocalPremierLeagueApi(str(squads_path)).get_team_squad("arsenal")
+    assert squad.players[0].name == "Player 133604"
+
+
+@pytest.mark.asyncio
+async def test_sync_sends_conditional_requests(stub, squads_path):
+    stub_api, base_url = stub
+    await _sync(base_url, squads_path).sync()
+    modified_at = squads_path.stat().st_mtime_ns
+    stub_api.requests.clear()
+
+    result = await _sync(base_url, squads_path).sync()
+
+    assert len(result.not_modified) == 20
+    assert result.version == 1
+    assert all(if_none_match == stub_api.etag(team_id) for team_id, if_none_match in stub_api.requests)
+    assert squads_path.stat().st_mtime_ns == modified_at
+
+
+@pytest.mark.asyncio
+async def test_sync_rewrites_only_changed_teams(stub, squads_path):
+    stub_api, base_url = stub
+    await _sync(base_url, squads_path).sync()
+    stub_api.players["133604"] = "New Arsenal Player"
+
+    result = await _sync(base_url, squads_path).sync()
+
+    assert result.changed == ["arsenal"]
+    assert result.version == 2
+    state = json.loads(state_path_for(squads_path).read_text())
+    assert state["teams"]["arsenal"]["version"] == 2
+    assert state["teams"]["chelsea"]["version"] == 1
+    squad = await LocalPremierLeagueApi(str(squads_path)).get_team_squad("arsenal")
+    assert squad.players[0].name == "New Arsenal Player"
+
+
+@pytest.mark.asyncio
+async def test_sync_without_etags_compares_content(stub, squads_path):
+    stub_api, base_url = stub
+    stub_api.send_etags = False
+    await _sync(base_url, squads_path).sync()
+    modified_at = squads_path.stat().st_mtime_ns
+
+    result = await _sync(base_url, squads_path).sync()
+
+    assert len(result.unchanged) == 20
+    assert result.version == 1
+    assert squads_path.stat().st_mtime_ns == modified_at
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_squads_of_failed_teams(stub, squads_path):
+    _, base_url = stub
+    await _sync(base_url, squads_path).sync()
+    squads_before = squads_path.read_text()
+
+    result = await _sync("http://127.0.0.1:1", squads_path).sync()
+
+    assert len(result.failed) == 20
+    assert result.version == 1
+    assert squads_path.read_text() == squads_before
+
+
+@pytest.mark.asyncio
+async def test_squad_cache_serves_synced_squads(stub, squads_path):
+    stub_api, base_url = stub
+    await _sync(base_url, squads_path).sync()
+    cache = SquadCache(LocalPremierLeagueApi(str(squads_path)))
+    old_version, _ = await cache.get("arsenal")
+    stub_api.players["133604"] = "New Arsenal Player"
+
+    await _sync(base_url, squads_path).sync()
+    new_version, squad = await cache.get("arsenal")
+
+    assert new_version != old_version
+    assert squad.players[0].name == "New Arsenal Player"
@@ -0,0 +1,39 @@
+import pytest
+
+from src.backend.team_matcher import TeamMatcher, levenshtein_distance
+
+
+@pytest.fixture
+def matcher(squad_api) -> TeamMatcher:
+    return TeamMatcher(squad_api.get_teams())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("What is the squad of Manchester?", ["manchester united", "manchester city"]),
+    ("What is the squad of Manshesterr?", ["manchester united", "manchester city"]),
+    ("What is the squad of Crystal?", ["crystal palace"]),
+    ("What is the squad of Man City?", ["manchester city"]),
+    ("Who plays for Tottenam?", ["tottenham hotspur"]),
+    ("Please tell me the squad of the Chico Bulls", []),
+    ("List the current roster of senior players for Real Madrid men's football team.", []),
+])
+def test_rank_candidates(matcher, text, expected):
+    assert [candidate.team_name for candidate in matcher.rank_candidates(text)] == expected
+
+
+@pytest.mark.parametrize("response, candidates, expected", [
+    ("yes", ["crystal palace"], "crystal palace"),
+    ("2", ["manchester united", "manchester city"], "manchester city"),
+    ("the first one", ["manchester united", "manchester city"], "manchester united"),
+    ("City", ["manchester united", "manchester city"], "manchester city"),
+    ("no, I meant Chelsea", ["arsenal"], "chelsea"),
+    ("no", ["crystal palace"], None),
+    ("yes", ["manchester united", "manchester city"], None),
+])
+def test_resolve_clarification(matcher, response, candidates, expected):
+    assert matcher.resolve_clarification(response, candidates) == expected
+
+
+def test_levenshtein_distance():
+    assert levenshtein_distance("manshesterr", "manchester") == 2
+    assert levenshtein_distance("", "abc") == 3
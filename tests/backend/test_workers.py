@@ -0,0 +1,209 @@
+import asyncio
+from pathlib import Path
+import sqlite3
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.backend.admission import BUSY_ANSWER, AdmissionController
+from src.backend.agent import DEADLINE_EXCEEDED_ANSWER, AgentState, PremierLeagueAgent
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
+from src.backend.shared_store import SharedCheckpointSaver, SharedSquadCache
+from src.backend.squad import Squad
+from src.backend.workers import WorkerError, WorkerPool
+from tests.fakes import SQUADS_JSON_PATH, FakeChatModel, local_squad_api, shared_fake_agent
+
+
+class CountingSquadApi(LocalPremierLeagueApi):
+    def __init__(self):
+        super().__init__(json_path=SQUADS_JSON_PATH)
+        self.fetched: list[str] = []
+
+    async def get_team_squad(self, team_name: str) -> Squad:
+        self.fetched.append(team_name)
+        return await super().get_team_squad(team_name)
+
+
+class StuckAgent(PremierLeagueAgent):
+    """Agent which never answers, like a worker blocked by a call without a timeout"""
+
+    async def send_message(self, *args, **kwargs) -> tuple[str, AgentState]:
+        await asyncio.Event().wait()
+        raise AssertionError("unreachable")
+
+
+def failing_agent(store_path: Path) -> PremierLeagueAgent:
+    raise RuntimeError("the agent can't be built, e.g. the API key is missing")
+
+
+def stuck_agent(store_path: Path) -> PremierLeagueAgent:
+    squad_api = local_squad_api()
+    return StuckAgent("fake-model", squad_api, model=FakeChatModel(teams=squad_api.get_teams()))
+
+
+@pytest.fixture
+def store_path(tmp_path: Path) -> Path:
+    return tmp_path / "shared_store.sqlite"
+
+
+@pytest.mark.asyncio
+async def test_clarification_is_resumed_by_another_worker(store_path):
+    first_worker, second_worker = shared_fake_agent(store_path), shared_fake_agent(store_path)
+
+    clarification_request, _ = await first_worker.send_message(
+        HumanMessage(content="What is the squad of Crystal?"), session_id="user-1")
+    answer, state = await second_worker.send_message(HumanMessage(content="yes"), session_id="user-1")
+
+    assert "crystal palace" in clarification_request
+    assert state.success
+    assert state.team_name == "crystal palace"
+    assert answer.startswith("Squad answer:")
+
+
+@pytest.mark.asyncio
+async def test_sessions_of_one_worker_are_separate(store_path):
+    worker = shared_fake_agent(store_path)
+
+    await worker.send_message(HumanMessage(content="What is the squad of Crystal?"), session_id="user-1")
+    _, other_state = await worker.send_message(HumanMessage(content="What is the squad of Arsenal?"), session_id="user-2")
+    _, state = await worker.send_message(HumanMessage(content="yes"), session_id="user-1")
+
+    assert other_state.team_name == "arsenal"
+    assert state.team_name == "crystal palace"
+
+
+@pytest.mark.asyncio
+async def test_squad_is_fetched_once_for_all_workers(store_path):
+    squad_api = CountingSquadApi()
+    first_cache, second_cache = SharedSquadCache(squad_api, store_path), SharedSquadCache(squad_api, store_path)
+
+    first_version, _ = await first_cache.get("arsenal")
+    second_version, squad = await second_cache.get("arsenal")
+
+    assert squad_api.fetched == ["arsenal"]
+    assert first_version == second_version
+    assert squad == await squad_api.get_team_squad("arsenal")
+
+
+@pytest.mark.asyncio
+async def test_invalidated_squad_gets_a_new_version(store_path):
+    squad_api = CountingSquadApi()
+    first_cache, second_cache = SharedSquadCache(squad_api, store_path), SharedSquadCache(squad_api, store_path)
+    old_version, _ = await first_cache.get("arsenal")
+
+    first_cache.invalidate("arsenal")
+    new_version, _ = await second_cache.get("arsenal")
+
+    assert squad_api.fetched == ["arsenal", "arsenal"]
+    assert new_version > old_version
+
+
+@pytest.mark.asyncio
+async def test_expired_squad_is_fetched_again(store_path):
+    squad_api = CountingSquadApi()
+    first_cache = SharedSquadCache(squad_api, store_path, max_age_seconds=60)
+    old_version, _ = await first_cache.get("arsenal")
+    with sqlite3.connect(store_path) as conn:
+        conn.execute("UPDATE squads SET fetched_at = ?", (time.time() - 120,))
+
+    # a restarted worker doesn't serve the expired squad from the table
+    new_version, _ = await SharedSquadCache(squad_api, store_path, max_age_seconds=60).get("arsenal")
+
+    assert squad_api.fetched == ["arsenal", "arsenal"]
+    assert new_version > old_version
+
+
+@pytest.mark.asyncio
+async def test_only_latest_checkpoint_of_conversation_is_kept(store_path):
+    worker = shared_fake_agent(store_path)
+
+    for question in ("What is the squad of Arsenal?", "Who is the manager?", "What is the squad of Chelsea?"):
+        await worker.send_message(HumanMessage(content=question), session_id="user-1")
+
+    with sqlite3.connect(store_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = 'user-1'").fetchone() == (1,)
+    _, state = await worker.send_message(HumanMessage(content="Who is the manager?"), session_id="user-1")
+    assert state.team_name == "chelsea"
+
+
+@pytest.mark.asyncio
+async def test_idle_conversations_are_pruned(store_path):
+    worker = shared_fake_agent(store_path)
+    await worker.send_message(HumanMessage(content="What is the squad of Crystal?"), session_id="idle")
+    await worker.send_message(HumanMessage(content="What is the squad of Crystal?"), session_id="active")
+    with sqlite3.connect(store_path) as conn:
+        conn.execute("UPDATE thread_activity SET updated_at = ? WHERE thread_id = 'idle'", (time.time() - 120,))
+
+    saver = SharedCheckpointSaver.open(store_path, conversation_max_age_seconds=60)
+
+    assert saver.get_tuple({"configurable": {"thread_id": "idle"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "active"}}) is not None
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_serves_conversations_on_any_worker(store_path):
+    async def converse(pool: WorkerPool) -> tuple[str, str | None]:
+        session = pool.session()
+        clarification_request, _ = await session.send_message(HumanMessage(content="What is the squad of Crystal?"))
+        _, state = await session.send_message(HumanMessage(content="yes"), deadline_seconds=30)
+        return clarification_request, state.team_name
+
+    with WorkerPool(shared_fake_agent, store_path, worker_count=2, concurrency_per_worker=2) as pool:
+        results = await asyncio.gather(*(converse(pool) for _ in range(4)))
+
+    for clarification_request, team_name in results:
+        assert "crystal palace" in clarification_request
+        assert team_name == "crystal palace"
+
+
+@pytest.mark.asyncio
+async def test_requests_fail_when_agent_factory_fails(store_path):
+    with WorkerPool(failing_agent, store_path, worker_count=2) as pool:
+        with pytest.raises(WorkerError):
+            await asyncio.wait_for(pool.session().send_message(HumanMessage(content="Who is the manager?")), 30)
+
+
+@pytest.mark.asyncio
+async def test_request_fails_when_its_worker_is_killed(store_path):
+    with WorkerPool(stuck_agent, store_path, worker_count=1) as pool:
+        request = asyncio.create_task(pool.session().send_message(HumanMessage(content="Who is the manager?")))
+        await asyncio.sleep(0)
+        pool._workers[0].kill()
+
+        with pytest.raises(WorkerError):
+            await asyncio.wait_for(request, 30)
+
+
+@pytest.mark.asyncio
+async def test_stuck_worker_is_not_waited_for_after_deadline(store_path):
+    pool = WorkerPool(stuck_agent, store_path, worker_count=1, reply_grace_seconds=0.1).start()
+    try:
+        answer, state = await asyncio.wait_for(
+            pool.session().send_message(HumanMessage(content="Who is the manager?"), deadline_seconds=0.1), 30)
+    finally:
+        for worker in pool._workers:
+            worker.kill()
+        pool.close()
+
+    assert answer == state.answer == DEADLINE_EXCEEDED_ANSWER
+
+
+@pytest.mark.asyncio
+async def test_worker_sessions_are_shed_by_admission_controller(store_path):
+    controller = AdmissionController(max_in_flight=1, max_queued=0)
+    pool = WorkerPool(stuck_agent, store_path, worker_count=1, reply_grace_seconds=0.1).start()
+    try:
+        session = pool.session()
+        first = asyncio.create_task(controller.send_message(
+            session, "user-1", HumanMessage(content="Who is the manager?"), deadline_seconds=5))
+        await asyncio.sleep(0)
+        answer, _ = await controller.send_message(pool.session(), "user-2", HumanMessage(content="Who is the manager?"))
+        first.cancel()
+    finally:
+        for worker in pool._workers:
+            worker.kill()
+        pool.close()
+
+    assert answer == BUSY_ANSWER
+    assert controller.stats().shed_count == 1
@@ -0,0 +1,88 @@
+"""Drive the agent past saturation with and without the admission controller.
+The model quota is limited by the rate limiter, without admission control every request waits for it
+and the latency of all users grows with the load.
+
+python -m tests.benchmarks.admission_load
+"""
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from src.backend.admission import BUSY_ANSWER, AdmissionController
+from src.backend.agent import PremierLeagueAgent
+from src.backend.rate_limiter import AdaptiveRateLimiter
+from src.utils.logger import setup_logger
+from tests.fakes import FakeChatModel, SlowSquadApi
+
+_MODEL_LATENCY_SECONDS = 0.2
+_SQUAD_API_LATENCY_SECONDS = 0.1
+_MODEL_REQUESTS_PER_MINUTE = 1_200
+""" 20 model calls per second, a squad question needs one """
+_BURSTS = (20, 80, 320)
+""" requests sent at once """
+_USERS = 40
+_QUERIES = (
+    "Who are the Arsenal players born in 2000?",
+    "Which Chelsea players are older than 30?",
+    "Who is the manager of Arsenal?",
+    "Who are the defenders of Chelsea?",
+)
+""" half of them can be answered from the cached squads """
+_MAX_SHED_LATENCY_SECONDS = 0.05
+""" a rejected request is answered right away, it never waits for the model """
+
+
+def _create_agent() -> PremierLeagueAgent:
+    squad_api = SlowSquadApi(_SQUAD_API_LATENCY_SECONDS)
+    model = FakeChatModel(teams=squad_api.get_teams(), latency_seconds=_MODEL_LATENCY_SECONDS)
+    rate_limiter = AdaptiveRateLimiter(requests_per_minute=_MODEL_REQUESTS_PER_MINUTE, tokens_per_minute=1_000_000_000)
+    return PremierLeagueAgent("fake-model", squad_api, model=model, rate_limiter=rate_limiter)
+
+
+async def _measure(burst: int, controller: AdmissionController | None) -> None:
+    agent = _create_agent()
+    # warm up the squad cache of both teams
+    for query in _QUERIES[:2]:
+        await agent.send_message(HumanMessage(content=query), session_id="warm-up")
+
+    async def send(request: int) -> tuple[str, float]:
+        message = HumanMessage(content=_QUERIES[request % len(_QUERIES)])
+        session_id = f"session-{request}"
+        start = time.perf_counter()
+        if controller:
+            answer, _ = await controller.send_message(agent, f"user-{request % _USERS}", message, session_id=session_id)
+        else:
+            answer, _ = await agent.send_message(message, session_id=session_id)
+        return answer, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(send(request) for request in range(burst)))
+    duration = time.perf_counter() - start
+
+    served = [latency for answer, latency in results if answer != BUSY_ANSWER]
+    shed_latencies = [latency for answer, latency in results if answer == BUSY_ANSWER]
+    shed = len(shed_latencies)
+    percentiles = statistics.quantiles(served, n=20)
+    name = "admission" if controller else "no admission"
+    counters = ""
+    if controller:
+        stats = controller.stats()
+        counters = f", cached: {stats.cached_count:3}, shed: {shed:3}, max queue: {stats.max_queue_depth:2}"
+        if shed_latencies:
+            counters += f", max shed latency: {max(shed_latencies) * 1000:3.0f} ms"
+    print(f"{burst:4} requests {name:<13} p50: {statistics.median(served) * 1000:6.0f} ms, "
+          f"p95: {percentiles[18] * 1000:6.0f} ms, total: {duration:5.1f} s{counters}")
+    assert all(latency < _MAX_SHED_LATENCY_SECONDS for latency in shed_latencies), "shedding is too slow"
+
+
+async def main() -> None:
+    setup_logger("ERROR")
+    for burst in _BURSTS:
+        await _measure(burst, None)
+        await _measure(burst, AdmissionController(max_in_flight=8, max_queued=16, max_queued_per_user=1))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
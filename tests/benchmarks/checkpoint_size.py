@@ -0,0 +1,59 @@
+"""Compare the size and serialization time of the checkpointed agent state.
+
+python -m tests.benchmarks.checkpoint_size
+"""
+import asyncio
+from dataclasses import dataclass
+import time
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.backend.agent import AgentState
+from src.backend.squad import Squad
+from tests.fakes import local_squad_api
+
+_REPEATS = 1000
+_QUERY = "Please list all the current senior squad members for the Manchester United men's team"
+
+
+@dataclass(kw_only=True)
+class LegacyAgentState:
+    """Agent state before slimming it down, it holds the whole squad and the HumanMessage"""
+    user_query: HumanMessage
+    team_name: str | None = None
+    squad: Squad | None = None
+    answer: str | None = None
+    clarification_request: str | None = None
+    clarification_response: str | None = None
+    team_found: bool = False
+    valid: bool = False
+    success: bool = False
+
+
+def _measure(name: str, values: dict) -> tuple[int, float]:
+    """Serialize every state channel the way MemorySaver does after each node"""
+    serde = MemorySaver().serde
+    size = sum(len(serde.dumps_typed(value)[1]) for value in values.values())
+    start = time.perf_counter()
+    for _ in range(_REPEATS):
+        for value in values.values():
+            serde.dumps_typed(value)
+    elapsed_us = (time.perf_counter() - start) / _REPEATS * 1e6
+    print(f"{name:<8} checkpoint size: {size:>6} B, serialization: {elapsed_us:>8.1f} us/step")
+    return size, elapsed_us
+
+
+async def main() -> None:
+    squad = await local_squad_api().get_team_squad("manchester united")
+    legacy = LegacyAgentState(user_query=HumanMessage(content=_QUERY), team_name=squad.name, squad=squad,
+                              team_found=True, valid=True)
+    lean = AgentState(user_query=_QUERY, team_name=squad.name, squad_version=1, team_found=True, valid=True)
+
+    legacy_size, legacy_time = _measure("legacy", vars(legacy))
+    lean_size, lean_time = _measure("lean", vars(lean))
+    print(f"size reduction: {legacy_size / lean_size:.1f}x, serialization speedup: {legacy_time / lean_time:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""Compare end-to-end latency of the sequential and the parallel agent graph with a latency-injected fake model.
+
+python -m tests.benchmarks.graph_topology
+"""
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from src.backend.agent import GraphTopology, PremierLeagueAgent
+from src.backend.rate_limiter import AdaptiveRateLimiter
+from src.utils.logger import setup_logger
+from tests.evaluation_queries import BASE_USER_QUERIES, DIFFRENT_LANGUAGES_QUERIES, PRECISE_USER_QUERIES
+from tests.fakes import FakeChatModel, SlowSquadApi
+
+_MODEL_LATENCY_SECONDS = 0.3
+_SQUAD_API_LATENCY_SECONDS = 0.2
+_JITTER_SECONDS = 0.2
+_ROUNDS = 3
+_LOCALLY_VALIDATED_QUERIES = BASE_USER_QUERIES + PRECISE_USER_QUERIES
+_MODEL_VALIDATED_QUERIES = DIFFRENT_LANGUAGES_QUERIES[1:2] + [
+    "Tell me about Arsenal",
+    "Who is in the Chelsea team?",
+    "Which Liverpool guys were born after 2000?",
+]
+""" queries which the pre-classifier leaves to the model, here the parallel validation pays off the most """
+
+
+async def _measure(topology: GraphTopology, queries: list[str]) -> list[float]:
+    latencies = []
+    for _ in range(_ROUNDS):
+        for query in queries:
+            # a new agent for every query so the squad cache is cold
+            squad_api = SlowSquadApi(_SQUAD_API_LATENCY_SECONDS, _JITTER_SECONDS)
+            model = FakeChatModel(teams=squad_api.get_teams(), latency_seconds=_MODEL_LATENCY_SECONDS,
+                                  latency_jitter_seconds=_JITTER_SECONDS)
+            rate_limiter = AdaptiveRateLimiter(requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+            agent = PremierLeagueAgent("fake-model", squad_api, model=model, rate_limiter=rate_limiter,
+                                       topology=topology)
+            start = time.perf_counter()
+            await agent.send_message(HumanMessage(content=query))
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main() -> None:
+    setup_logger("WARNING")
+    for name, queries in (("locally validated", _LOCALLY_VALIDATED_QUERIES),
+                          ("model validated", _MODEL_VALIDATED_QUERIES)):
+        for topology in GraphTopology:
+            latencies = await _measure(topology, queries)
+            percentiles = statistics.quantiles(latencies, n=20)
+            print(f"{name:<18} {topology:<10} p50: {statistics.median(latencies) * 1000:6.0f} ms, "
+                  f"p95: {percentiles[18] * 1000:6.0f} ms ({len(latencies)} requests)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
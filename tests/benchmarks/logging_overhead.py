@@ -0,0 +1,82 @@
+"""Compare the per request logging overhead at INFO level: eager f-strings vs deferred loguru formatting,
+and a blocking file sink vs an enqueued one.
+
+python -m tests.benchmarks.logging_overhead
+"""
+import asyncio
+from contextlib import redirect_stdout
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from loguru import logger
+
+from src.backend.agent import AgentState
+from src.utils.logger import setup_logger
+from tests.fakes import local_squad_api
+
+_REQUESTS = 2000
+_QUERY = "Please list all the current senior squad members for the Manchester United men's team"
+
+
+def _eager_request(squad, state: AgentState) -> None:
+    """Debug statements of a single request as they were written before, formatted even when disabled"""
+    logger.debug(f'user_message: {state.user_query}')
+    logger.debug(f'clarification_needed: {None}')
+    logger.debug(f'user_query: {state.user_query}')
+    logger.debug(f'response: {state.valid}')
+    logger.debug(f'team_name: {state.team_name}')
+    logger.debug(f'is_found: {state.team_found}')
+    logger.trace(f'squad: {squad}')
+    logger.debug(f'result: {state}')
+    logger.debug(f'answer: {state.answer}')
+    logger.info(f'answered query about {state.team_name}')
+
+
+def _lazy_request(squad, state: AgentState) -> None:
+    """The same statements with deferred formatting"""
+    logger.debug('user_message: {}', state.user_query)
+    logger.debug('clarification_needed: {}', None)
+    logger.debug('user_query: {}', state.user_query)
+    logger.debug('response: {}', state.valid)
+    logger.debug('team_name: {}', state.team_name)
+    logger.debug('is_found: {}', state.team_found)
+    logger.trace('squad: {}', squad)
+    logger.debug('result: {}', state)
+    logger.debug('answer: {}', state.answer)
+    logger.info('answered query about {}', state.team_name)
+
+
+def _measure(request, squad, state: AgentState) -> float:
+    start = time.perf_counter()
+    for _ in range(_REQUESTS):
+        request(squad, state)
+    elapsed_us = (time.perf_counter() - start) / _REQUESTS * 1e6
+    return elapsed_us
+
+
+async def main() -> None:
+    squad = await local_squad_api().get_team_squad("manchester united")
+    state = AgentState(user_query=_QUERY, team_name=squad.name, squad_version=1, team_found=True, valid=True,
+                       answer="Squad answer: " + ", ".join(player.name for player in squad.players), success=True)
+
+    results: dict[str, float] = {}
+    # the console sink writes to devnull, the benchmark results are printed at the end
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        log_path = Path(directory) / "logs" / "benchmark.log"
+        for enqueue in (False, True):
+            setup_logger("INFO", log_path, enqueue=enqueue)
+            sink = "enqueued" if enqueue else "blocking"
+            results[f"eager, {sink}"] = _measure(_eager_request, squad, state)
+            results[f"lazy, {sink}"] = _measure(_lazy_request, squad, state)
+            await logger.complete()
+        logger.remove()
+
+    for name, elapsed_us in results.items():
+        print(f"{name:<16} {elapsed_us:>8.1f} us/request")
+    print(f"deferred formatting speedup: {results['eager, blocking'] / results['lazy, blocking']:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
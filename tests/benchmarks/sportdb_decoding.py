@@ -0,0 +1,67 @@
+"""Compare decoding of TheSportsDB list/players responses: json + validated pydantic models vs the fast decoder.
+
+The payloads are built from tests/data/squads.json in the shape of the real responses,
+every player has the ~50 fields returned by the API, including long descriptions.
+
+python -m tests.benchmarks.sportdb_decoding
+"""
+from datetime import date
+import json
+import time
+
+from src.backend.premier_league_api.decoder import decode_squad
+from src.backend.squad import Player, Squad
+from tests.fakes import SQUADS_JSON_PATH
+
+_REPEATS = 20
+_SQUAD_SIZES = (30, 300, 3000)
+_DESCRIPTION = ("A professional footballer who plays for the club in the Premier League and for his national team. "
+                "He started his career in the youth academy and made his senior debut at the age of eighteen. ") * 10
+_UNUSED_FIELDS = {f"str{name}": None for name in (
+    "Nationality", "Team", "Team2", "Sport", "Number", "Signing", "Wage", "Outfitter", "Kit", "Agent",
+    "BirthLocation", "Ethnicity", "Status", "Side", "College", "Facebook", "Website", "Twitter", "Instagram",
+    "Youtube", "Height", "Weight", "Thumb", "Poster", "Cutout", "Cartoon", "Render", "Banner", "Fanart1",
+    "Fanart2", "Fanart3", "Fanart4", "Creativecommons", "Locked", "Gender", "Lastname", "Keywords")}
+
+
+def _build_payload(size: int) -> bytes:
+    with open(SQUADS_JSON_PATH, encoding="utf-8") as fp:
+        players = [player for squad in json.load(fp).values() for player in squad]
+    records = []
+    for i in range(size):
+        player = players[i % len(players)]
+        records.append({"idPlayer": str(i), "idTeam": "133612", "strPlayer": player["name"],
+                        "dateBorn": player["date_of_birth"], "strPosition": player["position"],
+                        "strDescriptionEN": _DESCRIPTION, **_UNUSED_FIELDS})
+    return json.dumps({"list": records}).encode()
+
+
+def _baseline_decode(team_name: str, content: bytes) -> Squad:
+    """The decoding before the fast path: httpx response.json() and validated models"""
+    players = json.loads(content).get("list", [])
+    return Squad(name=team_name, players=[Player(
+        name=player.get("strPlayer", ""),
+        date_of_birth=date.fromisoformat(player.get("dateBorn", "")),
+        position=player.get("strPosition", ""),
+    ) for player in players])
+
+
+def _measure(decode, content: bytes) -> float:
+    start = time.perf_counter()
+    for _ in range(_REPEATS):
+        decode("manchester united", content)
+    return (time.perf_counter() - start) / _REPEATS * 1e3
+
+
+def main() -> None:
+    for size in _SQUAD_SIZES:
+        content = _build_payload(size)
+        assert _baseline_decode("manchester united", content) == decode_squad("manchester united", content)
+        baseline_ms = _measure(_baseline_decode, content)
+        fast_ms = _measure(decode_squad, content)
+        print(f"{size:>5} players, {len(content) / 1024:>7.0f} KiB: baseline {baseline_ms:>7.2f} ms, "
+              f"fast {fast_ms:>7.2f} ms, speedup {baseline_ms / fast_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
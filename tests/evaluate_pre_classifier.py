@@ -0,0 +1,48 @@
+"""Evaluate the local query pre-classifier on the evaluation queries, it doesn't call the model.
+The lexicon of the classifier was written looking at these queries, so the figures are training set numbers,
+they overstate the precision and recall on unseen queries.
+
+python -m tests.evaluate_pre_classifier
+"""
+from src.backend.query_classifier import QueryDecision, QueryPreClassifier
+from tests.evaluation_queries import (BASE_USER_QUERIES, DIFFRENT_LANGUAGES_QUERIES, IRRELEVANT_USER_QUERIES,
+                                     NOT_PREMIER_LEAGUE_TEAMS_QUERIES, PRECISE_USER_QUERIES, UNCLEAR_TEAMS_QUERIES)
+from tests.fakes import local_squad_api
+
+RELEVANT_QUERIES = BASE_USER_QUERIES + PRECISE_USER_QUERIES + UNCLEAR_TEAMS_QUERIES + DIFFRENT_LANGUAGES_QUERIES
+""" queries which should pass the validation, unclear ones need a clarification later """
+IRRELEVANT_QUERIES = IRRELEVANT_USER_QUERIES + NOT_PREMIER_LEAGUE_TEAMS_QUERIES
+
+
+def _ratio(numerator: int, denominator: int) -> str:
+    return f"{numerator / denominator:.2f}" if denominator else "n/a"
+
+
+def evaluate_pre_classifier() -> dict[QueryDecision, dict[str, int]]:
+    """Print precision and recall of the confident decisions and the number of avoided model calls
+
+    Returns:
+        dict[QueryDecision, dict[str, int]]: decision -> {"relevant": count, "irrelevant": count}
+    """
+    classifier = QueryPreClassifier(local_squad_api().get_teams())
+    counts = {decision: {"relevant": 0, "irrelevant": 0} for decision in QueryDecision}
+    for label, queries in (("relevant", RELEVANT_QUERIES), ("irrelevant", IRRELEVANT_QUERIES)):
+        for query in queries:
+            decision = classifier.classify(query)
+            counts[decision][label] += 1
+            print(f"{label:<10} -> {decision:<10} {query}")
+
+    accepted, rejected = counts[QueryDecision.RELEVANT], counts[QueryDecision.IRRELEVANT]
+    total = len(RELEVANT_QUERIES) + len(IRRELEVANT_QUERIES)
+    avoided = sum(accepted.values()) + sum(rejected.values())
+    print("\nfigures on the queries the lexicon was built from (training set)")
+    print(f"accept precision: {_ratio(accepted['relevant'], sum(accepted.values()))}, "
+          f"recall: {_ratio(accepted['relevant'], len(RELEVANT_QUERIES))}")
+    print(f"reject precision: {_ratio(rejected['irrelevant'], sum(rejected.values()))}, "
+          f"recall: {_ratio(rejected['irrelevant'], len(IRRELEVANT_QUERIES))}")
+    print(f"validation model calls avoided: {avoided}/{total} ({avoided / total:.0%})")
+    return counts
+
+
+if __name__ == "__main__":
+    evaluate_pre_classifier()
@@ -0,0 +1,65 @@
+"""Compare accuracy and latency of the model routing profiles, it calls the OpenAI API.
+
+python -m tests.evaluate_routing_profiles
+"""
+import asyncio
+from pathlib import Path
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+from loguru import logger
+
+from src.backend.agent import PremierLeagueAgent
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
+from src.backend.rate_limiter import background_traffic
+from src.configuration import ROUTED_NODE_MODELS, Configuration, NodeModelConfig
+from src.utils.logger import setup_logger
+from tests.evaluation_queries import (BASE_USER_QUERIES, IRRELEVANT_USER_QUERIES, NOT_PREMIER_LEAGUE_TEAMS_QUERIES,
+                                     PRECISE_USER_QUERIES)
+
+ROUTING_PROFILES: dict[str, dict[str, NodeModelConfig]] = {
+    "single-model": {},
+    "routed": ROUTED_NODE_MODELS,
+    "all-mini": {node: NodeModelConfig(MODEL_NAME="gpt-4.1-mini", MAX_TOKENS=settings.MAX_TOKENS)
+                 for node, settings in ROUTED_NODE_MODELS.items()},
+}
+""" profile name -> node models, nodes which are not listed use Configuration.MODEL_NAME """
+
+LABELED_QUERIES = [(query, True) for query in BASE_USER_QUERIES + PRECISE_USER_QUERIES] + \
+    [(query, False) for query in IRRELEVANT_USER_QUERIES + NOT_PREMIER_LEAGUE_TEAMS_QUERIES]
+""" (query, expected success), the queries don't need a clarification """
+
+
+async def evaluate_profile(config: Configuration, node_models: dict[str, NodeModelConfig]) -> tuple[float, list[float]]:
+    """Answer the labeled queries with the profile
+
+    Returns:
+        tuple[float, list[float]]: accuracy and latencies in seconds
+    """
+    squad_api = LocalPremierLeagueApi(json_path="tests/data/squads.json")
+    correct = 0
+    latencies = []
+    for query, expected_success in LABELED_QUERIES:
+        # a new agent for every query, so a failed query doesn't leave a pending clarification
+        agent = PremierLeagueAgent(config.MODEL_NAME, squad_api, node_models=node_models)
+        start = time.perf_counter()
+        with background_traffic():
+            _, state = await agent.send_message(HumanMessage(content=query))
+        latencies.append(time.perf_counter() - start)
+        correct += state.success == expected_success
+        logger.info(f"Query: {query}\n Answer: {state.answer}\n Success: {state.success}")
+    return correct / len(LABELED_QUERIES), latencies
+
+
+async def evaluate_routing_profiles() -> None:
+    config = Configuration.load()
+    setup_logger("INFO", Path("tests/routing_profiles_eval.log"))
+    for name, node_models in ROUTING_PROFILES.items():
+        accuracy, latencies = await evaluate_profile(config, node_models)
+        logger.info(f"profile: {name:<14} accuracy: {accuracy:.2f}, "
+                    f"latency p50: {statistics.median(latencies):.2f} s, max: {max(latencies):.2f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(evaluate_routing_profiles())
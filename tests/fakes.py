@@ -0,0 +1,141 @@
+import asyncio
+import random
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.backend.agent import PremierLeagueAgent
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
+from src.backend.rate_limiter import AdaptiveRateLimiter
+from src.backend.shared_store import SharedCheckpointSaver, SharedSquadCache
+from src.backend.squad import Squad
+
+SQUADS_JSON_PATH = "tests/data/squads.json"
+
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for ChatOpenAI.
+    It recognizes the agent prompts and answers them with simple string matching against the team list,
+    optionally sleeping to emulate the model latency.
+    """
+
+    teams: list[str]
+    latency_seconds: float = 0.0
+    latency_jitter_seconds: float = 0.0
+    """ random latency added to latency_seconds """
+    prompts: list[str] = []
+    invalid_queries: list[str] = []
+    """ queries rejected by the validation even if they mention a team """
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            time.sleep(self._latency())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self._latency())
+        return self._result(messages)
+
+    def _latency(self) -> float:
+        return self.latency_seconds + random.uniform(0, self.latency_jitter_seconds)
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        prompt = str(messages[-1].content)
+        self.prompts.append(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(prompt)))])
+
+    def _respond(self, prompt: str) -> str:
+        if "Answer only YES or NO" in prompt:
+            query = _after(prompt, "User Query:")
+            if query in self.invalid_queries:
+                return "NO"
+            return "YES" if "squad" in query.lower() or self._find_team(query) else "NO"
+        if "Extract the team names" in prompt:
+            return self._find_team(_after(prompt, "User Query:")) or "unknown"
+        if "identify the correct football club" in prompt:
+            team = self._find_team(prompt.split("The user has entered the following message:")[-1])
+            if team:
+                return f"I believe you mean: {team}. Can you please confirm?"
+            return "I'm sorry, I couldn't find a matching club. Could you please clarify?"
+        if "clarification request" in prompt:
+            match = re.search(r"I believe you mean: ([a-z ]+)\.", prompt)
+            return match.group(1) if match else "UNKNOWN"
+        if "football squad expert" in prompt:
+            players = re.findall(r"^\s*- (.+?) \(", prompt, flags=re.MULTILINE)
+            return f"Squad answer: {', '.join(players)}"
+        return "I don't know."
+
+    def _find_team(self, text: str) -> str | None:
+        text = text.lower()
+        # prefer the longest name, e.g. "manchester united" over "manchester"
+        for team in sorted(self.teams, key=len, reverse=True):
+            if team in text:
+                return team
+        return None
+
+
+class FakeRateLimitError(Exception):
+    """Error raised by QuotaChatModel, it looks like openai.RateLimitError for the rate limiter"""
+    status_code = 429
+
+
+class QuotaChatModel(FakeChatModel):
+    """Fake model server which enforces a requests quota in a sliding window, like the OpenAI API does"""
+
+    max_requests: int
+    window_seconds: float = 1.0
+    rejected: int = 0
+    accepted_at: list[float] = []
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        now = time.monotonic()
+        recent = [at for at in self.accepted_at if at > now - self.window_seconds]
+        if len(recent) >= self.max_requests:
+            self.rejected += 1
+            raise FakeRateLimitError("Rate limit reached for requests")
+        self.accepted_at.append(now)
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+class SlowSquadApi(LocalPremierLeagueApi):
+    """Local squad API with injected latency of the squad fetch"""
+
+    def __init__(self, latency_seconds: float, latency_jitter_seconds: float = 0.0):
+        super().__init__(json_path=SQUADS_JSON_PATH)
+        self._latency_seconds = latency_seconds
+        self._latency_jitter_seconds = latency_jitter_seconds
+
+    async def get_team_squad(self, team_name: str) -> Squad:
+        await asyncio.sleep(self._latency_seconds + random.uniform(0, self._latency_jitter_seconds))
+        return await super().get_team_squad(team_name)
+
+
+def local_squad_api() -> LocalPremierLeagueApi:
+    return LocalPremierLeagueApi(json_path=SQUADS_JSON_PATH)
+
+
+def shared_fake_agent(store_path: Path) -> PremierLeagueAgent:
+    """Agent of a worker process with the fake model, the conversations and squads are in the shared store"""
+    squad_api = local_squad_api()
+    return PremierLeagueAgent("fake-model", squad_api, model=FakeChatModel(teams=squad_api.get_teams()),
+                              rate_limiter=AdaptiveRateLimiter(1_000_000, 1_000_000_000),
+                              checkpointer=SharedCheckpointSaver.open(store_path),
+                              squad_cache=SharedSquadCache(squad_api, store_path))
+
+
+def _after(prompt: str, marker: str) -> str:
+    """Return the first line of the prompt after the marker"""
+    return prompt.split(marker, 1)[-1].strip().splitlines()[0]
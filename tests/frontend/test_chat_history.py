@@ -0,0 +1,73 @@
+from src.frontend.chat_history import ChatHistory
+
+_SQUAD_LISTING = "\n".join(f"- Player {i} (2000-01-01) - Defender" for i in range(30))
+
+
+def test_history_is_bounded():
+    history = ChatHistory(max_messages=5, page_size=3)
+
+    for i in range(8):
+        history.append("user", f"message {i}")
+
+    assert len(history) == 5
+    assert history.removed_count == 3
+    assert [message.content for message in history.visible] == ["message 5", "message 6", "message 7"]
+    assert history.hidden_count == 2
+
+
+def test_older_messages_are_shown_page_by_page():
+    history = ChatHistory(page_size=2)
+    for i in range(5):
+        history.append("user", f"message {i}")
+
+    history.show_more()
+
+    assert [message.content for message in history.visible] == [f"message {i}" for i in range(1, 5)]
+    assert history.hidden_count == 1
+
+
+def test_new_message_collapses_history_to_last_page():
+    history = ChatHistory(page_size=2)
+    for i in range(5):
+        history.append("user", f"message {i}")
+    history.show_more()
+
+    history.append("assistant", "answer")
+
+    assert len(history.visible) == 2
+
+
+def test_rendered_messages_dont_grow_with_conversation():
+    history = ChatHistory(page_size=4, preview_lines=5)
+
+    rendered_lines = []
+    for _ in range(50):
+        history.append("user", "What is the squad of Arsenal?")
+        history.append("assistant", _SQUAD_LISTING)
+        rendered_lines.append(sum(len(history.markdown(message).splitlines()) for message in history.visible))
+
+    assert max(rendered_lines[2:]) == rendered_lines[-1]
+
+
+def test_long_messages_are_collapsed_except_last_and_expanded():
+    history = ChatHistory(preview_lines=5)
+    first = history.append("assistant", _SQUAD_LISTING)
+    second = history.append("assistant", _SQUAD_LISTING)
+
+    assert history.is_collapsed(first)
+    assert history.markdown(first).endswith("*... 25 more lines*")
+    assert not history.is_collapsed(second)
+    assert history.markdown(second) == _SQUAD_LISTING
+
+    history.expand(first.id)
+
+    assert history.markdown(first) == _SQUAD_LISTING
+
+
+def test_short_messages_are_not_collapsed():
+    history = ChatHistory(preview_lines=5)
+    message = history.append("user", "What is the squad of Arsenal?")
+    history.append("assistant", "answer")
+
+    assert message.preview is None
+    assert not history.is_collapsed(message)
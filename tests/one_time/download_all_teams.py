@@ -1,60 +1,45 @@
 import asyncio
-import json
 from pathlib import Path
 
-from loguru import logger
-
 from src.configuration import Configuration
-from src.backend.premier_league_api.exceptions import APIError
+from src.backend.answer_store import AnswerStore, materialize_answers
+from src.backend.premier_league_api.local import LocalPremierLeagueApi
 from src.backend.premier_league_api.sportdb import SportDBApi
+from src.backend.squad_sync import SquadSync, SyncResult
+
 
-async def _fetch_squads_async(api_key: str) -> dict[str, list[dict]]:
-    """Fetch squads for all Premier League teams using the public SportDB API.
+def sync_squads(api_key: str, output_file: Path) -> SyncResult:
+    """Download squads of all Premier League teams which changed since the previous run.
+    Unchanged squads are not downloaded again (conditional requests) and not rewritten (content hashes).
 
     Args:
         api_key (str): API key
-
+        output_file (Path): Path to the squads JSON file, the sync state is stored next to it
+    
     Returns:
-        dict[str, list[dict]]: Squads for all Premier League teams
+        SyncResult: new squads version and changed teams
     """
-    api = SportDBApi(api_key)
-    teams = api.get_teams()
-    logger.info(f"Fetching squads for {len(teams)} teams")
-    
-    squads = {}
-    for team in teams:
-        logger.info(f"Fetching squad for team {team}")
-        try:
-            squad = await api.get_team_squad(team)
-            squads[team] = [
-                {
-                    "name": player.name,
-                    "date_of_birth": player.date_of_birth.isoformat(),
-                    "position": player.position,
-                }
-                for player in squad.players
-            ]
-        except APIError as e:
-            logger.error(f"Failed to fetch squad for team {team}: {e}")
-    return squads
-
-def fetch_squads(api_key: str, output_file: Path) -> None:
-    """Fetch squads for all Premier League teams and save to a JSON file.
+    return asyncio.run(SquadSync(SportDBApi(api_key), output_file).sync())
+
+def materialize(squads_file: Path, answers_file: Path, version: int) -> bool:
+    """Render the answers of the most common questions if the squads version changed.
 
     Args:
-        api_key (str): API key
-        output_file (Path): Path to the output JSON file
+        squads_file (Path): Path to the synced squads JSON file
+        answers_file (Path): Path to the answer store JSON file
+        version (int): Squads version after the sync
+    
+    Returns:
+        bool: True if the answers were rendered again
     """
-    squads = asyncio.run(_fetch_squads_async(api_key))
-    with output_file.open("w", encoding="utf-8") as f:
-        json.dump(squads, f, indent=4, ensure_ascii=False)
+    squad_api = LocalPremierLeagueApi(str(squads_file))
+    return asyncio.run(materialize_answers(squad_api, AnswerStore(answers_file), version))
 
 def main() -> None:
     config = Configuration.load()
-    output_dir = Path("tests/data")
-    output_dir.mkdir(exist_ok=True)
-    output_file = output_dir / "squads.json"
-    fetch_squads(config.THE_SPORT_API_KEY.get_secret_value(), output_file)
+    output_file = Path("tests/data") / "squads.json"
+    result = sync_squads(config.THE_SPORT_API_KEY.get_secret_value(), output_file)
+    materialize(output_file, Path(config.ANSWER_STORE_PATH or "tests/data/answers.json"), result.version)
 
 if __name__ == "__main__":
     main()
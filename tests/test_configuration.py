@@ -0,0 +1,15 @@
+from src.configuration import Configuration
+
+
+def test_example_config_keys_are_loaded(monkeypatch):
+    # the configuration exports the API key, it's restored after the test
+    monkeypatch.setenv("OPENAI_API_KEY", "")
+
+    config = Configuration.load("example_config.yaml")
+
+    assert config.LLM_REQUESTS_PER_MINUTE == 500
+    assert config.ANSWER_STORE_PATH is None
+    assert config.MAX_QUEUED_REQUESTS_PER_USER == 2
+    assert config.LOGGING_LEVEL == "INFO"
+    # every node uses MODEL_NAME unless the node models are configured
+    assert config.NODE_MODELS == {}